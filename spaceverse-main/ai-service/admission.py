@@ -0,0 +1,215 @@
+"""
+Admission Control
+-----------------
+
+Bounded in-flight work per endpoint class, load shedding and automatic
+degradation under overload.
+
+Every HTTP request is mapped (by path prefix) to a class: ``realtime``
+(interactive predictions), ``batch`` or ``retrain``; anything else (health,
+metrics, model listings) is not limited. Each class has its own in-flight
+limit. Once a limit is reached further requests of that class fail fast with
+503 and a Retry-After header instead of queueing.
+
+Streamed predictions (the real-time WebSocket) take a ``realtime`` slot per
+prediction through ``acquire`` / ``hold``, like HTTP requests.
+
+The controller is under pressure when real-time work in flight reaches
+``AI_ADMISSION_DEGRADE_AT``, or when the moving average of real-time latency
+exceeds ``AI_ADMISSION_LATENCY_SLO_MS`` while real-time requests are queued
+behind each other (a single slow request on an idle replica is not
+overload). Endpoints whose latency grows with the request size (long
+timelines, maneuver grids) are held in the ``realtime`` class but left out of
+the moving average. While under pressure:
+
+* batch and retrain requests are shed, so real-time traffic keeps the CPU;
+* the service answers real-time requests from the cheap tier only (compiled
+  random forest + linear model, no LSTM / debris / RL escalation) and flags
+  the responses with ``degraded: true`` and an ``X-Degraded`` header.
+
+Pressure clears with hysteresis (half the in-flight threshold and 80% of the
+SLO, or no real-time backlog) so the mode does not flap on every request.
+"""
+
+import json
+import logging
+import math
+import os
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from metrics import Counter, Gauge
+
+logger = logging.getLogger(__name__)
+
+ADMISSION_IN_FLIGHT = Gauge("ai_admission_in_flight", "Requests in flight per admission class", ("request_class",))
+ADMISSION_REJECTED = Counter(
+    "ai_admission_rejected_total", "Requests refused with 503 by admission control", ("request_class", "reason"),
+)
+DEGRADED_MODE = Gauge("ai_degraded_mode", "1 while the service serves degraded (cheap-tier) answers")
+DEGRADED_RESPONSES = Counter("ai_degraded_responses_total", "Responses served in degraded mode", ("request_class",))
+
+REQUEST_CLASSES = ("realtime", "batch", "retrain")
+# Shed first under pressure
+LOW_PRIORITY_CLASSES = ("batch", "retrain")
+# Fraction of the latency SLO below which pressure clears (with in-flight at half the threshold)
+RECOVERY_FRACTION = 0.8
+# Weight of the newest sample in the real-time latency moving average
+LATENCY_EWMA_ALPHA = 0.1
+
+# Whether the request currently being handled was admitted in degraded mode
+_request_degraded: ContextVar = ContextVar("request_degraded", default=False)
+
+
+def request_is_degraded():
+    """True when the current request must be answered from the cheap tier"""
+    return _request_degraded.get()
+
+
+class AdmissionController:
+    """In-flight accounting and pressure state; used from the event loop only"""
+
+    def __init__(self, limits=None, degrade_at=None, latency_slo=None, retry_after=None):
+        self.limits = limits or {
+            "realtime": int(os.getenv("AI_ADMISSION_REALTIME_LIMIT", "32")),
+            "batch": int(os.getenv("AI_ADMISSION_BATCH_LIMIT", "4")),
+            "retrain": int(os.getenv("AI_ADMISSION_RETRAIN_LIMIT", "1")),
+        }
+        self.degrade_at = degrade_at or int(os.getenv("AI_ADMISSION_DEGRADE_AT",
+                                                      str(max(1, self.limits["realtime"] // 2))))
+        self.latency_slo = (latency_slo if latency_slo is not None
+                            else float(os.getenv("AI_ADMISSION_LATENCY_SLO_MS", "250")) / 1000)
+        self.retry_after = retry_after or int(os.getenv("AI_ADMISSION_RETRY_AFTER", "1"))
+        self.in_flight = {request_class: 0 for request_class in REQUEST_CLASSES}
+        self.realtime_latency = 0.0
+        self.degraded = False
+
+    def try_acquire(self, request_class):
+        """Admit one request; returns the refusal reason or None"""
+        if request_class in LOW_PRIORITY_CLASSES and self.degraded:
+            return "shed"
+        if self.in_flight[request_class] >= self.limits[request_class]:
+            return "limit"
+        self.in_flight[request_class] += 1
+        ADMISSION_IN_FLIGHT.set(self.in_flight[request_class], request_class=request_class)
+        self._update_pressure()
+        return None
+
+    def acquire(self, request_class):
+        """``try_acquire`` that also counts refusals; returns the refusal reason or None"""
+        reason = self.try_acquire(request_class)
+        if reason is not None:
+            ADMISSION_REJECTED.inc(request_class=request_class, reason=reason)
+        return reason
+
+    def release(self, request_class, seconds=None):
+        """Free one slot; ``seconds`` (None for untimed endpoints) feeds the real-time latency average"""
+        self.in_flight[request_class] -= 1
+        ADMISSION_IN_FLIGHT.set(self.in_flight[request_class], request_class=request_class)
+        if request_class == "realtime" and seconds is not None:
+            self.realtime_latency += LATENCY_EWMA_ALPHA * (seconds - self.realtime_latency)
+        self._update_pressure()
+
+    @contextmanager
+    def hold(self, request_class, timed=True):
+        """Run a block in an acquired slot, flagged degraded if admitted under pressure; yields that flag"""
+        degraded = self.degraded
+        if degraded:
+            DEGRADED_RESPONSES.inc(request_class=request_class)
+        token = _request_degraded.set(degraded)
+        start = time.perf_counter()
+        try:
+            yield degraded
+        finally:
+            self.release(request_class, time.perf_counter() - start if timed else None)
+            _request_degraded.reset(token)
+
+    def _update_pressure(self):
+        in_flight = self.in_flight["realtime"]
+        # Slow answers only count while real-time requests queue behind each other;
+        # the request being admitted alone is no backlog
+        slow = in_flight > 1 and self.realtime_latency > self.latency_slo
+        if not self.degraded:
+            degraded = in_flight >= self.degrade_at or slow
+        else:
+            degraded = not (in_flight <= self.degrade_at // 2
+                            and (in_flight <= 1 or self.realtime_latency <= self.latency_slo * RECOVERY_FRACTION))
+        if degraded != self.degraded:
+            self.degraded = degraded
+            DEGRADED_MODE.set(1 if degraded else 0)
+            logger.warning(f"Degraded mode {'on' if degraded else 'off'} "
+                           f"(real-time in flight: {in_flight}, latency EWMA: {self.realtime_latency * 1000:.0f} ms)")
+
+    def retry_after_seconds(self):
+        # Roughly the time for the current real-time backlog to drain, at least the configured floor
+        backlog = self.realtime_latency * self.in_flight["realtime"] / max(1, self.limits["realtime"])
+        return max(self.retry_after, math.ceil(backlog))
+
+    def status(self):
+        return {
+            "degraded": self.degraded,
+            "inFlight": dict(self.in_flight),
+            "limits": dict(self.limits),
+            "degradeAt": self.degrade_at,
+            "realtimeLatencyMs": self.realtime_latency * 1000,
+            "latencySloMs": self.latency_slo * 1000,
+        }
+
+
+class AdmissionMiddleware:
+    """ASGI middleware applying an AdmissionController to HTTP requests
+
+    ``classes`` maps path prefixes to request classes; the first match wins.
+    Requests under an ``untimed`` prefix hold a slot but do not feed the
+    real-time latency average.
+    """
+
+    def __init__(self, app, controller, classes, untimed=()):
+        self.app = app
+        self.controller = controller
+        self.classes = tuple(classes.items())
+        self.untimed = tuple(untimed)
+
+    def _classify(self, path):
+        for prefix, request_class in self.classes:
+            if path.startswith(prefix):
+                return request_class
+        return None
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        request_class = self._classify(scope["path"])
+        if request_class is None:
+            await self.app(scope, receive, send)
+            return
+
+        reason = self.controller.acquire(request_class)
+        if reason is not None:
+            await self._reject(send)
+            return
+
+        with self.controller.hold(request_class, timed=not scope["path"].startswith(self.untimed)) as degraded:
+
+            async def send_wrapper(message):
+                if degraded and message["type"] == "http.response.start":
+                    message = dict(message)
+                    message["headers"] = list(message.get("headers", [])) + [(b"x-degraded", b"1")]
+                await send(message)
+
+            await self.app(scope, receive, send_wrapper)
+
+    async def _reject(self, send):
+        body = json.dumps({"detail": "Service overloaded, retry later"}).encode()
+        await send({
+            "type": "http.response.start",
+            "status": 503,
+            "headers": [
+                (b"content-type", b"application/json"),
+                (b"content-length", str(len(body)).encode()),
+                (b"retry-after", str(self.controller.retry_after_seconds()).encode()),
+            ],
+        })
+        await send({"type": "http.response.body", "body": body})
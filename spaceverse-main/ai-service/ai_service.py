@@ -7,9 +7,12 @@ including collision risk assessment, congestion analysis, and debris probability
 """
 
 import os
+import base64
 import numpy as np
 import pandas as pd
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, Header, HTTPException, Request, WebSocket
+from fastapi.responses import PlainTextResponse, Response
+from starlette.concurrency import run_in_threadpool
 from pydantic import BaseModel
 from typing import List, Optional
 from sklearn.ensemble import RandomForestRegressor
@@ -20,8 +23,42 @@ import joblib
 import uvicorn
 from dotenv import load_dotenv
 import logging
+import time
+from contextlib import contextmanager
 from datetime import datetime
 
+from wire_protocol import NegotiatedResponse, NegotiatedRoute, decode_request_body, encode_float32, read_body
+from metrics import (
+    PROMETHEUS_CONTENT_TYPE, MetricsMiddleware, record_fallback, render_metrics, set_model_version, time_model
+)
+from profiling import DebugTimingMiddleware, stage
+from tracing import TracingMiddleware, configure_logging, span, trace_event
+from columnar import (ARROW_MEDIA_TYPES, ColumnarTooLargeError, ColumnarValidationError, columns_to_features,
+                      read_arrow_columns)
+from model_registry import ModelRegistry, ModelRegistryError, ShadowScorer, evaluate_model, training_data_hash
+from training_data import TARGET_NAMES, generate_synthetic_training_data
+from model_heads import (
+    HEAD_MODELS, MODEL_FAMILIES, MultiHeadModel, fit_head, head_name, heads_from_multi_output, split_head_name
+)
+from cascade import (
+    BATCH_RESULT_COLUMNS, DEFAULT_SERVING_TIER, SERVING_TIERS, CascadeEnsemble, batch_results, target_matrix
+)
+from environment_data import EnvironmentCache, environment_source_from_env
+from streaming import PredictionStream
+from admission import AdmissionController, AdmissionMiddleware, request_is_degraded
+from density_index import CatalogError, DensityIndex, density_index_from_env
+from timeline import TimelineError, impact_scores, timeline_features
+from optimizer import OBJECTIVES, ConstellationOptimizer, ConstellationProblem
+from maneuvers import candidate_features, generate_candidates, propellant_mass, rank_candidates
+from drift import DriftMonitor
+from attributions import FEATURE_LABELS, ForestExplainer, top_contributions
+from heatmap import (
+    ALTITUDE_RANGE_KM, DEFAULT_MASS_KG, HEATMAP_COLUMNS, INCLINATION_RANGE_DEG, MAX_LEVEL, TILE_SIZE,
+    HeatmapError, HeatmapTileCache, tile_bounds, tile_etag, tile_features
+)
+from trajectory import TrajectoryError, generate_trajectories
+from prediction_journal import PredictionJournal, load_training_data
+
 # Deep learning imports
 import tensorflow as tf
 from tensorflow import keras
@@ -29,28 +66,51 @@ from tensorflow.keras.models import Sequential
 from tensorflow.keras.layers import LSTM, Dense, Dropout
 from tensorflow.keras.optimizers import Adam
 
-# Reinforcement learning imports
-try:
-    from stable_baselines3 import PPO
-    from stable_baselines3.common.env_util import make_vec_env
-    RL_AVAILABLE = True
-except ImportError:
-    RL_AVAILABLE = False
-    print("Stable-Baselines3 not available, RL features disabled")
+# Reinforcement learning (vectorized environment, NumPy policy export)
+from traffic_policy import RL_AVAILABLE, features_to_observations, train_policy_in_subprocess
 
 # Load environment variables
 load_dotenv()
 
-# Configure logging
-logging.basicConfig(level=logging.INFO)
+# Configure logging (non-blocking, trace-tagged; see tracing.py)
+configure_logging(logging.INFO)
 logger = logging.getLogger(__name__)
 
 # Initialize FastAPI app
 app = FastAPI(
     title="Space Traffic Simulator AI Service",
     description="AI-powered predictions for space traffic simulations",
-    version="1.0.0"
+    version="1.0.0",
+    default_response_class=NegotiatedResponse
 )
+# Encode responses per the Accept header (orjson / MessagePack / float32)
+app.router.route_class = NegotiatedRoute
+# Bounded in-flight work per endpoint class, 503 + Retry-After and degraded
+# (cheap-tier) answers under overload (innermost, so rejections are still measured)
+admission_controller = AdmissionController()
+app.add_middleware(AdmissionMiddleware, controller=admission_controller, classes={
+    "/ai/simulate-impact": "realtime",
+    "/ai/predict-risk": "realtime",
+    "/ai/real-time-prediction": "realtime",
+    "/ai/personalized-recommendations": "realtime",
+    "/ai/timeline": "realtime",
+    "/ai/evaluate-maneuvers": "realtime",
+    # Cached tiles cost nothing and misses are one cheap-tier pass: not shed under pressure
+    "/ai/heatmap": "realtime",
+    "/ai/batch-predict": "batch",
+    "/ai/optimize-constellation": "batch",
+    "/ai/trajectories": "batch",
+    "/ai/retrain": "retrain",
+}, untimed=(
+    # Latency grows with the number of events / candidates; kept out of the real-time latency average
+    "/ai/timeline", "/ai/evaluate-maneuvers",
+))
+# Request counts and latency per endpoint, exposed on /metrics
+app.add_middleware(MetricsMiddleware)
+# Opt-in stage timing / CPU profiling for internal callers (X-Debug-Timing)
+app.add_middleware(DebugTimingMiddleware)
+# Trace-ID propagation and sampled span export (outermost middleware)
+app.add_middleware(TracingMiddleware)
 
 # Pydantic models for request/response validation
 class SimulationParameters(BaseModel):
@@ -77,6 +137,7 @@ class AISimulateImpactRequest(BaseModel):
     beforeState: SimulationState
     afterState: SimulationState
     changes: dict
+    includeAttributions: bool = False  # Add the random forest's per-feature attributions
 
 class AISimulateImpactResponse(BaseModel):
     predictionId: str
@@ -86,6 +147,8 @@ class AISimulateImpactResponse(BaseModel):
     confidenceLevel: float  # 0-100
     explanation: str
     recommendations: List[str]
+    degraded: bool = False  # Answered from the cheap tier under overload
+    featureAttributions: Optional[dict] = None  # Only when requested (see attributions.py)
 
 class AIRiskPredictionRequest(BaseModel):
     eventType: str  # "launch" | "adjustment" | "breakup"
@@ -98,11 +161,98 @@ class AIRiskPredictionResponse(BaseModel):
     longTermImpactScore: float  # Scale of 1-10
     riskFactors: List[dict]
     mitigationStrategies: List[str]
+    degraded: bool = False  # Answered from the cheap tier under overload
+
+class StateDelta(BaseModel):
+    """Explicit additive change of a timeline state (see timeline.STATE_KEYS)"""
+    model_config = {"extra": "forbid"}
+    objectsInLEO: Optional[float] = None
+    objectsInMEO: Optional[float] = None
+    objectsInGEO: Optional[float] = None
+    averageCongestion: Optional[float] = None
+
+class TimelineEvent(BaseModel):
+    eventType: str  # "launch" | "adjustment" | "breakup"
+    parameters: SimulationParameters
+    count: int = 1  # Objects placed by a launch (e.g. one constellation plane), 1 to timeline.MAX_LAUNCH_COUNT
+    stateDelta: Optional[StateDelta] = None  # Explicit additive state change instead of the derived one
+
+class TimelineRequest(BaseModel):
+    timelineId: str
+    initialState: SimulationState
+    events: List[TimelineEvent]
+
+class TimelineResponse(BaseModel):
+    timelineId: str
+    initial: dict  # Scores of the initial state
+    steps: List[dict]  # Per event: resulting state, cumulative scores and marginal impact
+    totalImpact: dict  # Final minus initial scores
+    degraded: bool = False  # Answered from the cheap tier under overload
+
+class ConstellationOptimizationRequest(BaseModel):
+    altitudeRange: List[float]  # [min, max] km
+    inclinationRange: List[float]  # [min, max] degrees
+    planes: int
+    satellitesPerPlane: int
+    satelliteMass: float = 500  # kg
+    minPlaneSeparationKm: float = 25  # Closer planes (within 5 degrees) crowd each other
+    timeBudgetSeconds: float = 2.0
+    populationSize: int = 128
+    seed: int = 0
+
+class ManeuverEvaluationRequest(BaseModel):
+    parameters: SimulationParameters
+    currentState: Optional[SimulationState] = None  # Default: density index or baselines
+    maxDeltaV: float = 30.0  # m/s
+    isp: float = 220.0  # s, specific impulse of the thrusters (hydrazine monopropellant)
+    top: int = 20  # Rows of the ranked table to return
 
 
 class RetrainRequest(BaseModel):
-    trainingData: List[dict]
+    trainingData: List[dict] = []
     targetVariable: str  # Which target to train for: 'collision', 'congestion', or 'debris'
+    promote: bool = False  # Make the new versions live immediately instead of shadowing them
+    # Also train on journaled traffic. Its labels are the ensemble's own outputs, so this distills
+    # the served ensemble into the new heads; it does not improve on it
+    fromJournal: bool = False
+    journalSince: Optional[float] = None  # Unix time; only rows journaled from then on
+    journalMaxSamples: int = 100000  # Most recent journaled rows to use
+    journalTiers: List[str] = ["full"]  # Rows scored by these tiers (cascade rows count as full when escalated)
+
+
+class PromoteModelRequest(BaseModel):
+    version: str
+
+
+class TrajectoryObject(BaseModel):
+    id: Optional[str] = None
+    altitude: Optional[float] = None  # km, circular orbit
+    semiMajorAxis: Optional[float] = None  # km, instead of altitude
+    eccentricity: float = 0.0
+    inclination: float = 0.0  # degrees
+    raan: float = 0.0  # degrees
+    argumentOfPerigee: float = 0.0  # degrees
+    trueAnomaly: float = 0.0  # degrees, at time 0
+    position: Optional[List[float]] = None  # ECI km, with velocity instead of the elements
+    velocity: Optional[List[float]] = None  # ECI km/s
+
+class TrajectoryRequest(BaseModel):
+    objects: List[TrajectoryObject]
+    duration: float = 5400.0  # s
+    step: float = 10.0  # s between propagated samples, before decimation
+    tolerancePixels: float = 1.0  # Allowed on-screen deviation of the drawn path
+    kmPerPixel: float = 20.0  # Scale of the view (Earth about 640 px across)
+    deltaEncoding: bool = False
+
+
+class DensityUpdateRequest(BaseModel):
+    add: List[dict] = []  # Catalog records (see density_index.py); an existing id is moved
+    remove: List[str] = []  # Object ids
+
+
+class ShadowModelRequest(BaseModel):
+    version: Optional[str] = None  # None stops shadowing this model
+    sampleRate: Optional[float] = None
 
 
 class RealTimePredictionRequest(BaseModel):
@@ -110,8 +260,9 @@ class RealTimePredictionRequest(BaseModel):
     currentState: SimulationState
     userId: str
     userHistory: List[dict]  # Previous simulation data for personalization
-    environmentalFactors: dict  # Real-time space weather, debris, etc.
+    environmentalFactors: dict = {}  # Real-time space weather, debris, etc. (default: the service's cache)
     timeHorizon: int = 24  # Hours into the future to predict
+    includeAttributions: bool = False  # Add the random forest's per-feature attributions
 
 
 class PersonalizedRecommendationRequest(BaseModel):
@@ -128,112 +279,234 @@ linear_model = None
 lstm_model = None
 debris_prediction_model = None
 rl_model = None
+student_model = None
 
-def initialize_models():
-    """Initialize ML models with synthetic training data"""
-    global random_forest_model, linear_model, lstm_model, debris_prediction_model, rl_model
-    
-    logger.info("Initializing AI models with synthetic training data...")
-    
-    # Try to load saved models first
-    try:
-        random_forest_model = joblib.load('models/random_forest_model.pkl')
-        linear_model = joblib.load('models/linear_model.pkl')
-        logger.info("Loaded saved models successfully")
-        return
-    except FileNotFoundError:
-        logger.info("Saved models not found, training new models...")
-    except Exception as e:
-        logger.warning(f"Failed to load saved models: {str(e)}, training new models...")
-    
-    # Generate synthetic training data
-    np.random.seed(42)  # For reproducible results
-    
-    # Create realistic synthetic data for space traffic
-    n_samples = 1000
-    
-    # Features: altitude, inclination, velocity, mass, objects_in_orbit, congestion_level
-    altitude = np.random.uniform(200, 2000, n_samples)  # km
-    inclination = np.random.uniform(0, 180, n_samples)  # degrees
-    velocity = np.random.uniform(6, 8, n_samples)  # km/s (typical orbital velocities)
-    mass = np.random.uniform(100, 5000, n_samples)  # kg
-    
-    # Derived features
-    objects_in_orbit = np.random.randint(1000, 5000, n_samples)
-    congestion_level = np.random.uniform(0, 1, n_samples)
-    
-    # Combine features
-    X = np.column_stack([
-        altitude,
-        inclination,
-        velocity,
-        mass,
-        objects_in_orbit,
-        congestion_level
-    ])
-    
-    # Target variables (synthetic but realistic relationships)
-    # Collision risk increases with congestion and mass, decreases with altitude
-    collision_risk = (
-        0.3 * congestion_level +
-        0.2 * (mass / 5000) +
-        0.1 * (1 - altitude / 2000) +
-        0.1 * np.random.normal(0, 0.1, n_samples)
-    )
-    
-    # Congestion increase depends on objects added and current congestion
-    congestion_increase = (
-        0.4 * (objects_in_orbit / 5000) +
-        0.3 * congestion_level +
-        0.2 * (mass / 5000) +
-        0.1 * np.random.normal(0, 0.1, n_samples)
-    )
-    
-    # Debris probability increases with mass and velocity (kinetic energy)
-    debris_probability = (
-        0.5 * (mass / 5000) +
-        0.3 * ((velocity - 6) / 2) +
-        0.2 * np.random.normal(0, 0.1, n_samples)
-    )
-    
-    # Clip to valid ranges
-    collision_risk = np.clip(collision_risk, 0, 1)
-    congestion_increase = np.clip(congestion_increase, 0, 1)
-    debris_probability = np.clip(debris_probability, 0, 1)
-    
-    # Train Random Forest model
-    random_forest_model = RandomForestRegressor(
+# Versioned model storage; the "live" version of each model serves traffic
+model_registry = ModelRegistry(os.getenv("AI_MODEL_REGISTRY_DIR", "models/registry"))
+# Candidate versions scored on a sample of live traffic, off the request path
+shadow_scorer = ShadowScorer(sample_rate=float(os.getenv("AI_SHADOW_SAMPLE_RATE", "0.1")))
+# Live feature and prediction distributions against the training data (see drift.py)
+drift_monitor = DriftMonitor()
+# Every scored row with its outputs, appended to binary segments for retraining (see prediction_journal.py)
+prediction_journal = PredictionJournal(tiers=SERVING_TIERS)
+# One registry model per target head, e.g. random_forest.collision (see model_heads.py)
+REGISTERED_MODELS = HEAD_MODELS
+# Unfitted estimator each head of a family is cloned from
+BASE_ESTIMATORS = {
+    'random_forest': RandomForestRegressor(
         n_estimators=100,
         max_depth=10,
         min_samples_split=5,
         min_samples_leaf=2,
         random_state=42,
         n_jobs=-1
-    )
+    ),
+    'linear': LinearRegression()
+}
+# Served only when a version is live (see distillation.py, traffic_env.py)
+OPTIONAL_MODELS = ('student', 'ppo')
+LEGACY_MODEL_FILES = {
+    'random_forest': 'models/random_forest_model.pkl',
+    'linear': 'models/linear_model.pkl'
+}
+live_model_versions = {}
+# Cheap-first serving ensemble over the live models (see cascade.py)
+cascade = None
+# Incremented on every cascade rebuild; versions in-memory models in cache keys
+cascade_generation = 0
+# TreeSHAP attributions of the live random forest (see attributions.py)
+forest_explainer = None
+# Space weather refreshed in the background; requests only read the last snapshot
+refresh_interval = float(os.getenv("AI_ENVIRONMENT_REFRESH_SECONDS", "300"))
+environment_cache = EnvironmentCache(
+    environment_source_from_env(),
+    impact_fn=lambda factors: assess_environmental_impact(factors),
+    refresh_seconds=refresh_interval,
+    stale_seconds=float(os.getenv("AI_ENVIRONMENT_STALE_SECONDS", str(3 * refresh_interval))),
+)
+# Altitude x inclination object density from the catalog (see density_index.py);
+# loaded at startup, empty until then
+density_index = DensityIndex()
+# Longest event sequence accepted by /ai/timeline
+MAX_TIMELINE_EVENTS = int(os.getenv("AI_TIMELINE_MAX_EVENTS", "1000"))
+# Island search for /ai/optimize-constellation over a pool of worker processes
+constellation_optimizer = ConstellationOptimizer(
+    int(os.getenv("AI_OPTIMIZER_PROCESSES", str(min(4, os.cpu_count() or 1))))
+)
+MAX_OPTIMIZER_BUDGET_SECONDS = float(os.getenv("AI_OPTIMIZER_MAX_BUDGET_SECONDS", "30"))
+# Bounds on /ai/trajectories requests: objects, and propagated samples over all objects
+MAX_TRAJECTORY_OBJECTS = int(os.getenv("AI_TRAJECTORY_MAX_OBJECTS", "1000"))
+MAX_TRAJECTORY_SAMPLES = int(os.getenv("AI_TRAJECTORY_MAX_SAMPLES", "2000000"))
+# Most rows one /ai/batch-predict request may score (larger jobs belong in bulk_score.py)
+MAX_BATCH_ROWS = int(os.getenv("AI_BATCH_MAX_ROWS", "100000"))
+# Scored altitude x inclination tiles for /ai/heatmap (see heatmap.py)
+heatmap_tiles = HeatmapTileCache()
+# Congestion features used when no catalog is loaded
+BASELINE_STATE = {
+    'objectsInLEO': 3000,
+    'objectsInMEO': 500,
+    'objectsInGEO': 2000,
+    'averageCongestion': 0.5
+}
+
+def register_model(name, model, X=None, y=None, source="retrain", train_seconds=None, validation=None):
+    """Store a fitted model as a new immutable registry version"""
+    metadata = {
+        "source": source,
+        "trainingDataHash": training_data_hash(X, y) if X is not None else None,
+        "trainingSamples": int(len(X)) if X is not None else None,
+        "timings": {"trainSeconds": train_seconds},
+        "parentVersion": live_model_versions.get(name)
+    }
+    if validation is not None:
+        metadata["metrics"] = evaluate_model(model, *validation)
+    return model_registry.register(name, model, metadata)
+
+def set_live_model(name, model, version):
+    """Swap the in-memory model (or one target head) serving traffic"""
+    global random_forest_model, linear_model, student_model, rl_model
+    if name in HEAD_MODELS:
+        family, target = split_head_name(name)
+        # Copy-on-write: requests holding the previous family object are unaffected
+        if family == 'random_forest':
+            random_forest_model = (random_forest_model or MultiHeadModel({})).with_head(target, model)
+        else:
+            linear_model = (linear_model or MultiHeadModel({})).with_head(target, model)
+    elif name == 'ppo':
+        rl_model = model
+    else:
+        student_model = model
+    live_model_versions[name] = version
+
+def load_optional_models():
+    """Load the live version of each optional model, if one has been promoted"""
+    for name in OPTIONAL_MODELS:
+        try:
+            model, metadata = model_registry.load(name)
+        except ModelRegistryError:
+            continue
+        except Exception as e:
+            logger.warning(f"Failed to load {name} model: {str(e)}")
+            record_fallback("model_load")
+            continue
+        set_live_model(name, model, metadata["version"])
+        logger.info(f"Loaded live {name} model {metadata['version']}")
+
+def load_saved_multi_output_model(family):
+    """A pre-split multi-output model of ``family``: live registry version, else legacy file
+
+    Returns (model, source) or (None, None).
+    """
+    try:
+        model, metadata = model_registry.load(family)
+        return model, f"registry:{family}@{metadata['version']}"
+    except ModelRegistryError:
+        pass
+    try:
+        return joblib.load(LEGACY_MODEL_FILES[family]), "legacy-file"
+    except FileNotFoundError:
+        return None, None
+
+def load_live_models():
+    """Load the live version of every head; returns the heads still without a model
+
+    Each head is loaded on its own: a missing or unloadable head does not
+    affect the heads that loaded. A missing head is split from its family's
+    saved multi-output model when one exists (registered and promoted for
+    that head only); whatever remains must be trained.
+    """
+    missing = []
+    for name in REGISTERED_MODELS:
+        try:
+            model, metadata = model_registry.load(name)
+        except ModelRegistryError:
+            missing.append(name)
+            continue
+        except Exception as e:
+            logger.warning(f"Failed to load live {name} head: {str(e)}")
+            record_fallback("model_load")
+            missing.append(name)
+            continue
+        set_live_model(name, model, metadata["version"])
+    if not missing:
+        logger.info(f"Loaded live models from registry: {live_model_versions}")
+        return []
+    logger.info(f"No loadable live version of {missing}, checking for saved multi-output models...")
     
-    # For simplicity, we'll train one model to predict all targets
-    # In a real implementation, we'd have separate models for each target
-    y_combined = np.column_stack([
-        collision_risk,
-        congestion_increase,
-        debris_probability
-    ])
+    # Models saved before the per-target split serve each of their outputs as a head
+    for family in MODEL_FAMILIES:
+        family_missing = [name for name in missing if split_head_name(name)[0] == family]
+        if not family_missing:
+            continue
+        try:
+            model, source = load_saved_multi_output_model(family)
+        except Exception as e:
+            logger.warning(f"Failed to load saved {family} model: {str(e)}")
+            record_fallback("model_load")
+            continue
+        if model is None:
+            continue
+        heads = heads_from_multi_output(model)
+        if heads is None:
+            # A single-output model can't be attributed to a target: retrain instead of mirroring it
+            logger.info(f"Saved {family} model ({source}) is not a three-target model")
+            continue
+        for name in family_missing:
+            head = heads[split_head_name(name)[1]]
+            try:
+                version = register_model(name, head, source=f"split:{source}")
+                model_registry.promote(name, version)
+            except Exception as e:
+                logger.warning(f"Failed to register saved {name} head: {str(e)}")
+                record_fallback("model_save")
+                version = source
+            set_live_model(name, head, version)
+            missing.remove(name)
+    if missing:
+        logger.info(f"Training new heads for {missing}...")
+    return missing
+
+def train_head(name, X, y, source, validation=None, promote=True):
+    """Fit, validate and register one target head; returns (model, version)
+
+    ``y`` (and the validation targets) hold only this head's target column.
+    """
+    family, target = split_head_name(name)
+    model, train_seconds = fit_head(BASE_ESTIMATORS[family], X, y)
+    version = register_model(name, model, X, y, source, train_seconds, validation)
+    if promote:
+        model_registry.promote(name, version)
+    return model, version
+
+def initialize_models():
+    """Initialize ML models with synthetic training data"""
+    global random_forest_model, linear_model, lstm_model, debris_prediction_model, rl_model
     
-    random_forest_model.fit(X, y_combined)
+    logger.info("Initializing AI models with synthetic training data...")
     
-    # Train Linear Regression model as baseline
-    linear_model = LinearRegression()
-    linear_model.fit(X, y_combined)
+    # Generate synthetic training data
+    n_samples = 1000
+    X, y_combined = generate_synthetic_training_data(n_samples, seed=42)
+    debris_probability = y_combined[:, 2]
     
-    # Save models for future use
-    try:
-        import os
-        os.makedirs('models', exist_ok=True)
-        joblib.dump(random_forest_model, 'models/random_forest_model.pkl')
-        joblib.dump(linear_model, 'models/linear_model.pkl')
-        logger.info("Models saved successfully")
-    except Exception as e:
-        logger.warning(f"Failed to save models: {str(e)}")
+    # Serve the live registry heads, falling back to saved models; otherwise
+    # train a Random Forest / Linear Regression head for each target still missing
+    missing_heads = load_live_models()
+    if missing_heads:
+        # Held-out set (different seed) for the metrics recorded in the registry
+        X_validation, y_validation = generate_synthetic_training_data(200, seed=7)
+        for name in missing_heads:
+            target = TARGET_NAMES.index(split_head_name(name)[1])
+            try:
+                model, version = train_head(name, X, y_combined[:, target], "synthetic",
+                                            (X_validation, y_validation[:, target]))
+            except Exception as e:
+                logger.warning(f"Failed to register {name} head: {str(e)}")
+                record_fallback("model_save")
+                model, _ = fit_head(BASE_ESTIMATORS[split_head_name(name)[0]], X, y_combined[:, target])
+                version = "in-memory"
+            set_live_model(name, model, version)
+        logger.info("Model heads trained and registered")
     
     # Create LSTM model for trajectory prediction
     try:
@@ -260,6 +533,7 @@ def initialize_models():
         logger.info("LSTM model initialized successfully")
     except Exception as e:
         logger.error(f"Failed to initialize LSTM model: {str(e)}")
+        record_fallback("lstm_init")
         lstm_model = None
     
     # Create debris prediction model
@@ -283,59 +557,56 @@ def initialize_models():
         logger.info("Debris prediction model initialized successfully")
     except Exception as e:
         logger.error(f"Failed to initialize debris prediction model: {str(e)}")
+        record_fallback("debris_init")
         debris_prediction_model = None
     
-    # Initialize reinforcement learning model for traffic control
-    if RL_AVAILABLE:
+    load_optional_models()
+    
+    # Initialize reinforcement learning model for traffic control: a registered
+    # policy (trained to convergence with traffic_env.py) or a short run now.
+    # The default is one PPO update (256 environments x 64 steps), a rough policy
+    # in seconds that keeps startup fast; 0 starts without one
+    timesteps = int(os.getenv("AI_RL_STARTUP_TIMESTEPS", "16384"))
+    if rl_model is not None:
+        logger.info("Using registered traffic-control policy")
+    elif RL_AVAILABLE and timesteps > 0:
         try:
-            # Create a simple environment for demonstration
-            # In a real implementation, this would be a complex space traffic environment
-            from gym import Env
-            from gym.spaces import Box, Discrete
-            
-            class SimpleTrafficEnv(Env):
-                def __init__(self):
-                    super(SimpleTrafficEnv, self).__init__()
-                    self.action_space = Discrete(3)  # 0: do nothing, 1: increase altitude, 2: change inclination
-                    self.observation_space = Box(low=0, high=1, shape=(6,), dtype=np.float32)
-                    self.state = np.random.rand(6)
-                    self.step_count = 0
-                
-                def step(self, action):
-                    # Simplified reward function
-                    reward = -np.sum(np.abs(self.state - 0.5))  # Reward for being close to optimal state
-                    self.step_count += 1
-                    done = self.step_count >= 100
-                    
-                    # Update state based on action
-                    if action == 1:  # Increase altitude
-                        self.state[0] = min(1.0, self.state[0] + 0.1)
-                    elif action == 2:  # Change inclination
-                        self.state[1] = np.abs(self.state[1] - 0.1)
-                    
-                    return self.state, reward, done, {}
-                
-                def reset(self):
-                    self.state = np.random.rand(6)
-                    self.step_count = 0
-                    return self.state
-            
-            # Create and train RL model
-            env = SimpleTrafficEnv()
-            rl_model = PPO("MlpPolicy", env, verbose=0)
-            # Train for a few steps (in reality, this would be much more)
-            rl_model.learn(total_timesteps=100)
-            
-            logger.info("Reinforcement learning model initialized successfully")
+            # Train in a separate interpreter (torch and TensorFlow crash when
+            # loaded together) and serve the exported NumPy actor
+            rl_model = train_policy_in_subprocess(timesteps)
+            logger.info(f"Reinforcement learning model trained for {timesteps} steps")
         except Exception as e:
             logger.error(f"Failed to initialize RL model: {str(e)}")
+            record_fallback("rl_init")
             rl_model = None
+    elif RL_AVAILABLE:
+        logger.info("No registered traffic-control policy and startup training disabled; "
+                    "train one with traffic_env.py")
     else:
         rl_model = None
         logger.info("RL model not available due to missing dependencies")
     
+    refresh_cascade()
+    record_model_versions()
     logger.info("All AI models initialized successfully")
 
+def record_model_versions():
+    """Publish the version of every loaded model on the metrics endpoint"""
+    loaded_models = {name: (random_forest_model if split_head_name(name)[0] == 'random_forest' else linear_model)
+                     for name in REGISTERED_MODELS}
+    loaded_models.update({
+        'lstm': lstm_model,
+        'debris': debris_prediction_model,
+        'ppo': rl_model,
+        'student': student_model
+    })
+    for name, model in loaded_models.items():
+        if model is None:
+            version = "unavailable"
+        else:
+            version = live_model_versions.get(name, "in-memory")
+        set_model_version(name, version)
+
 def prepare_features(simulation_data):
     """Prepare features for model prediction"""
     # Extract features from simulation data
@@ -352,8 +623,147 @@ def prepare_features(simulation_data):
     
     return features
 
-def generate_explanation(collision_risk, congestion_increase, debris_probability, parameters):
-    """Generate natural language explanation of results"""
+@contextmanager
+def pipeline_stage(name):
+    """Time a request stage for the debug breakdown and the active trace"""
+    with stage(name), span(name):
+        yield
+
+@contextmanager
+def model_stage(model, batch_size=1):
+    """Time one model call for /metrics, the debug breakdown and the active trace"""
+    with time_model(model, batch_size), stage(f"model.{model}"), span(f"model.{model}", batch_size=batch_size):
+        yield
+
+def _lstm_targets(features):
+    """LSTM targets for an (m, 6) feature matrix, or None when unavailable"""
+    if lstm_model is None:
+        return None
+    try:
+        # Repeat each feature row over 10 time steps: (m, 10, 6)
+        features_lstm = np.repeat(features[:, np.newaxis, :], 10, axis=1)
+        with model_stage("lstm", features.shape[0]):
+            return target_matrix(lstm_model.predict(features_lstm, batch_size=1024, verbose=0), features.shape[0])
+    except Exception as e:
+        logger.warning(f"LSTM prediction failed: {str(e)}")
+        record_fallback("lstm")
+        return None
+
+def _debris_probabilities(features):
+    """Debris model probability per row, or None when unavailable"""
+    if debris_prediction_model is None:
+        return None
+    try:
+        with model_stage("debris", features.shape[0]):
+            return np.asarray(
+                debris_prediction_model.predict(features, batch_size=1024, verbose=0), dtype=np.float64
+            ).reshape(features.shape[0])
+    except Exception as e:
+        logger.warning(f"Debris prediction failed: {str(e)}")
+        record_fallback("debris")
+        return None
+
+def stale_student_heads():
+    """Live heads whose version differs from the one the live student was distilled from"""
+    try:
+        teachers = model_registry.metadata('student', live_model_versions['student']).get("teacherVersions", {})
+    except (KeyError, ModelRegistryError):
+        # No registry record of what it was distilled from
+        return list(REGISTERED_MODELS)
+    return [name for name in REGISTERED_MODELS if teachers.get(name) != live_model_versions.get(name)]
+
+def refresh_cascade():
+    """Rebuild the serving cascade for the current live models and learn its stacking weights"""
+    global cascade, cascade_generation, forest_explainer
+    updated = CascadeEnsemble(random_forest_model, linear_model, _lstm_targets, _debris_probabilities, model_stage)
+    # Held-out synthetic data, disjoint from the training seed
+    updated.calibrate(*generate_synthetic_training_data(1000, seed=11))
+    # A student distilled from other heads no longer imitates what is served: the student tier
+    # falls back to cheap until one is distilled from the live heads
+    stale = stale_student_heads() if student_model is not None else []
+    if stale:
+        logger.warning(f"Student {live_model_versions.get('student')} was not distilled from the live {stale}; "
+                       f"student tier disabled")
+        record_fallback("student_stale")
+    updated.student = student_model if not stale else None
+    cascade = updated
+    cascade_generation += 1
+    # Drift is measured against the training features and the cheap tier's predictions on them;
+    # live traffic is compared on the same tier whichever one served it
+    X_reference, _ = generate_synthetic_training_data(1000, seed=42)
+    drift_monitor.set_reference(X_reference, updated.cheap_predict(X_reference))
+    prediction_journal.set_model_versions(live_model_versions)
+    try:
+        # Seconds to build; heads are swapped copy-on-write, so an unchanged forest is the same object
+        if forest_explainer is None or forest_explainer.forest_model is not random_forest_model:
+            forest_explainer = ForestExplainer(random_forest_model)
+    except Exception as e:
+        logger.warning(f"Feature attributions unavailable: {str(e)}")
+        record_fallback("attributions_init")
+        forest_explainer = None
+    logger.info(f"Serving cascade ready (default tier: {DEFAULT_SERVING_TIER})")
+
+def resolve_serving_tier(requested, degraded=None):
+    """Serving tier from the X-Serving-Tier header, else the configured default
+
+    Requests admitted in degraded mode (see admission.py) are capped at the
+    cheap tier.
+    """
+    tier = requested.strip().lower() if requested else DEFAULT_SERVING_TIER
+    if tier not in SERVING_TIERS:
+        raise HTTPException(status_code=422, detail=f"Unknown serving tier: {requested}")
+    if degraded is None:
+        degraded = request_is_degraded()
+    if degraded and tier not in ("cheap", "student"):
+        return "cheap"
+    return tier
+
+def predict_ensemble(features, tier=DEFAULT_SERVING_TIER, journal=True):
+    """Score a feature matrix through the serving cascade
+
+    Returns a dict with the (n, 3) target matrix of each model, the stacked
+    ensemble under "ensemble", the debris model probability per row under
+    "debris" (None when that model did not run, NaN for rows it skipped) and
+    the rows that were escalated to the expensive models under "escalated".
+    ``journal=False`` keeps synthetic rows (e.g. timeline intermediate states)
+    out of the prediction journal.
+    """
+    predictions = cascade.predict(features, tier)
+    # Shadowed heads are compared with the live column of their own target
+    for name in list(shadow_scorer.candidates):
+        family, target = split_head_name(name)
+        if family in predictions:
+            column = TARGET_NAMES.index(target)
+            shadow_scorer.maybe_submit(name, features, predictions[family][:, column:column + 1])
+    if drift_monitor.enabled:
+        cheap = predictions["cheap"] if predictions["cheap"] is not None else cascade.cheap_predict(features)
+        drift_monitor.observe(features, cheap)
+    if journal:
+        # The tier that actually scored each row (escalated cascade rows ran every model)
+        served_tier = predictions["tier"]
+        if served_tier == "cascade":
+            served_tier = np.where(predictions["escalated"], "full", "cheap")
+        prediction_journal.record(features, predictions["ensemble"], served_tier)
+    return predictions
+
+def explain_features(features):
+    """The live random forest's (rows, targets, features) attributions, or None when unavailable"""
+    if forest_explainer is None:
+        return None
+    try:
+        with pipeline_stage("attributions"):
+            return forest_explainer.explain(features)
+    except Exception as e:
+        logger.warning(f"Feature attribution failed: {str(e)}")
+        record_fallback("attributions")
+        return None
+
+def generate_explanation(collision_risk, congestion_increase, debris_probability, parameters, attributions=None):
+    """Generate natural language explanation of results
+
+    ``attributions`` (one row of ``explain_features``) adds the parameters
+    that actually drove the collision estimate.
+    """
     explanations = []
     
     if collision_risk > 0.7:
@@ -377,6 +787,11 @@ def generate_explanation(collision_risk, congestion_increase, debris_probability
     else:
         explanations.append(f"Low debris generation risk ({debris_probability*100:.1f}%).")
     
+    if attributions is not None:
+        drivers = ", ".join(f"{FEATURE_LABELS[name]} ({value*100:+.1f} pts)"
+                            for name, value in top_contributions(attributions[0], limit=2))
+        explanations.append(f"Main drivers of the collision estimate: {drivers}.")
+    
     # Add parameter-specific insights
     if parameters.altitude < 300:
         explanations.append("Very low altitude increases atmospheric drag and reentry risk.")
@@ -598,131 +1013,109 @@ def get_skill_level_tips(skill_level):
 
 @app.on_event("startup")
 async def startup_event():
-    """Initialize models when service starts"""
+    """Initialize models, environmental data and the density index when service starts"""
+    global density_index
     initialize_models()
+    environment_cache.start()
+    density_index = density_index_from_env()
+    constellation_optimizer.start()
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    environment_cache.stop()
+    constellation_optimizer.shutdown()
+    prediction_journal.close()
 
 @app.post("/ai/simulate-impact", response_model=AISimulateImpactResponse)
-async def simulate_impact(request: AISimulateImpactRequest):
+def simulate_impact(request: AISimulateImpactRequest, x_serving_tier: Optional[str] = Header(None)):
     """
     Analyze simulation results and predict impacts on space traffic.
     
     This endpoint takes the results of a space traffic simulation and provides
     AI-powered analysis of collision risks, congestion impacts, and debris probabilities.
     """
+    tier = resolve_serving_tier(x_serving_tier)
     try:
-        logger.info(f"Processing simulation impact for ID: {request.simulationId}")
+        logger.debug(f"Processing simulation impact for ID: {request.simulationId}")
         
         # Prepare features for prediction
         # Extract features from the request data
         # Since we don't have the original parameters, we'll use reasonable defaults
         # and derive some values from the state data
-        features = prepare_features({
-            'altitude': 500,  # Default altitude in km
-            'inclination': 45,  # Default inclination in degrees
-            'velocity': 7.8,  # Default velocity in km/s
-            'mass': 1000,  # Default mass in kg
-            'objectsInLEO': request.afterState.objectsInLEO,
-            'objectsInMEO': request.afterState.objectsInMEO,
-            'objectsInGEO': request.afterState.objectsInGEO,
-            'averageCongestion': request.afterState.averageCongestion
-        })
-        
-        # Make predictions using ensemble of models
-        rf_pred_raw = random_forest_model.predict(features)
-        rf_predictions = rf_pred_raw[0] if hasattr(rf_pred_raw, '__len__') and len(rf_pred_raw) > 0 else rf_pred_raw
-        
-        lr_pred_raw = linear_model.predict(features)
-        lr_predictions = lr_pred_raw[0] if hasattr(lr_pred_raw, '__len__') and len(lr_pred_raw) > 0 else lr_pred_raw
+        with pipeline_stage("feature_prep"):
+            features = prepare_features({
+                'altitude': 500,  # Default altitude in km
+                'inclination': 45,  # Default inclination in degrees
+                'velocity': 7.8,  # Default velocity in km/s
+                'mass': 1000,  # Default mass in kg
+                'objectsInLEO': request.afterState.objectsInLEO,
+                'objectsInMEO': request.afterState.objectsInMEO,
+                'objectsInGEO': request.afterState.objectsInGEO,
+                'averageCongestion': request.afterState.averageCongestion
+            })
         
-        # Use LSTM model if available
-        lstm_predictions = rf_predictions  # Default to RF if LSTM not available
-        if lstm_model is not None:
-            try:
-                # Reshape for LSTM (1 sample, 10 time steps, 6 features)
-                # For demo, we'll just repeat the features 10 times
-                features_lstm = np.tile(features, (1, 1, 1))
-                # Repeat to create 10 time steps
-                features_lstm = np.repeat(features_lstm, 10, axis=1)
-                lstm_pred = lstm_model.predict(features_lstm, verbose=0)
-                # Handle different possible return shapes
-                if len(lstm_pred.shape) > 1:
-                    lstm_predictions = lstm_pred[0]
-                else:
-                    lstm_predictions = lstm_pred
-            except Exception as e:
-                logger.warning(f"LSTM prediction failed: {str(e)}")
+        # Cheap models first; the LSTM / debris model only run if the cascade escalates
+        predictions = predict_ensemble(features, tier)
+        rf_predictions = predictions["random_forest"][0]
+        lr_predictions = predictions["linear"][0]
+        lstm_predictions = predictions["lstm"][0]
+        escalated = bool(predictions["escalated"][0])
         
-        # Ensemble prediction (simple average)
-        ensemble_predictions = (rf_predictions + lr_predictions + lstm_predictions) / 3
+        # Ensemble prediction (learned stacking weights)
+        ensemble_predictions = predictions["ensemble"][0]
         
-        # Handle case where predictions might be scalars or arrays
-        if hasattr(ensemble_predictions, '__len__') and len(ensemble_predictions) > 1:
-            pred_values = ensemble_predictions
-        else:
-            # If it's a scalar or single value, create array-like access
-            pred_values = [ensemble_predictions] * 3
-            
         # Extract predictions and ensure they are positive
-        collision_risk_percentage = max(0.0, min(100.0, float(abs(pred_values[0]) * 100)))
-        orbital_congestion_increase = max(0.0, min(100.0, float(abs(pred_values[1]) * 50)))
-        secondary_debris_probability = max(0.0, min(100.0, float(abs(pred_values[2]) * 25)))
-        
-        # Use debris prediction model if available
-        if debris_prediction_model is not None:
-            try:
-                debris_pred_raw = debris_prediction_model.predict(features, verbose=0)
-                # Handle different possible return shapes
-                if len(debris_pred_raw.shape) > 1 and debris_pred_raw.shape[1] > 0:
-                    debris_prob = debris_pred_raw[0][0]
-                elif len(debris_pred_raw.shape) > 0:
-                    debris_prob = debris_pred_raw[0]
-                else:
-                    debris_prob = debris_pred_raw
-                secondary_debris_probability = float(debris_prob * 100)
-            except Exception as e:
-                logger.warning(f"Debris prediction failed: {str(e)}")
+        collision_risk_percentage = max(0.0, min(100.0, float(abs(ensemble_predictions[0]) * 100)))
+        orbital_congestion_increase = max(0.0, min(100.0, float(abs(ensemble_predictions[1]) * 50)))
+        secondary_debris_probability = max(0.0, min(100.0, float(abs(ensemble_predictions[2]) * 25)))
         
-        # Calculate confidence based on model agreement
-        # Handle case where predictions might be scalars
-        rf_val = rf_predictions if isinstance(rf_predictions, (int, float)) else rf_predictions[0] if hasattr(rf_predictions, '__len__') and len(rf_predictions) > 0 else 0
-        lr_val = lr_predictions if isinstance(lr_predictions, (int, float)) else lr_predictions[0] if hasattr(lr_predictions, '__len__') and len(lr_predictions) > 0 else 0
-        lstm_val = lstm_predictions if isinstance(lstm_predictions, (int, float)) else lstm_predictions[0] if hasattr(lstm_predictions, '__len__') and len(lstm_predictions) > 0 else 0
+        # Use debris prediction model output if it ran
+        if predictions["debris"] is not None and not np.isnan(predictions["debris"][0]):
+            secondary_debris_probability = float(predictions["debris"][0] * 100)
         
-        model_std = np.std([rf_val, lr_val, lstm_val])
+        # Calculate confidence based on model agreement on collision risk
+        model_std = np.std([rf_predictions[0], lr_predictions[0], lstm_predictions[0]])
         confidence_level = max(70.0, 100.0 - model_std * 100)  # Higher agreement = higher confidence
         
+        # What drove the forest's estimate (cached per feature row)
+        attributions = explain_features(features)
+        
         # Generate explanation and recommendations
-        explanation = generate_explanation(
-            ensemble_predictions, 
-            ensemble_predictions, 
-            ensemble_predictions, 
-            SimulationParameters(
-                altitude=500,  # Placeholder
-                inclination=45,  # Placeholder
-                velocity=7.8,  # Placeholder
-                mass=1000,  # Placeholder
-                launchTime="2025-01-01T00:00:00Z"  # Placeholder
+        with pipeline_stage("explanation"):
+            explanation = generate_explanation(
+                ensemble_predictions[0], 
+                ensemble_predictions[1], 
+                secondary_debris_probability / 100,  # Served debris probability, in every tier
+                SimulationParameters(
+                    altitude=500,  # Placeholder
+                    inclination=45,  # Placeholder
+                    velocity=7.8,  # Placeholder
+                    mass=1000,  # Placeholder
+                    launchTime="2025-01-01T00:00:00Z"  # Placeholder
+                ),
+                attributions=None if attributions is None else attributions[0]
             )
-        )
         
-        recommendations = generate_recommendations(
-            ensemble_predictions, 
-            ensemble_predictions, 
-            SimulationParameters(
-                altitude=500,  # Placeholder
-                inclination=45,  # Placeholder
-                velocity=7.8,  # Placeholder
-                mass=1000,  # Placeholder
-                launchTime="2025-01-01T00:00:00Z"  # Placeholder
+        with pipeline_stage("recommendations"):
+            recommendations = generate_recommendations(
+                ensemble_predictions[0], 
+                ensemble_predictions[1], 
+                SimulationParameters(
+                    altitude=500,  # Placeholder
+                    inclination=45,  # Placeholder
+                    velocity=7.8,  # Placeholder
+                    mass=1000,  # Placeholder
+                    launchTime="2025-01-01T00:00:00Z"  # Placeholder
+                )
             )
-        )
         
-        # Add RL-based recommendations if available
-        if rl_model is not None:
+        # Add RL-based recommendations if available (escalated requests only)
+        if rl_model is not None and escalated:
             try:
                 # Create observation from features (normalized)
-                obs = np.clip(features.flatten() / np.array([2000, 180, 15, 10000, 10000, 1]), 0, 1)
-                action, _ = rl_model.predict(obs)
+                obs = features_to_observations(features)[0]
+                with model_stage("ppo"):
+                    action, _ = rl_model.predict(obs)
                 
                 if action == 1:
                     recommendations.append("RL recommendation: Consider increasing altitude to reduce congestion.")
@@ -730,6 +1123,7 @@ async def simulate_impact(request: AISimulateImpactRequest):
                     recommendations.append("RL recommendation: Consider adjusting inclination to optimize traffic flow.")
             except Exception as e:
                 logger.warning(f"RL recommendation failed: {str(e)}")
+                record_fallback("rl_recommendation")
         
         response = AISimulateImpactResponse(
             predictionId=f"pred_{request.simulationId}",
@@ -738,10 +1132,13 @@ async def simulate_impact(request: AISimulateImpactRequest):
             secondaryDebrisProbability=secondary_debris_probability,
             confidenceLevel=confidence_level,
             explanation=explanation,
-            recommendations=recommendations
+            recommendations=recommendations,
+            degraded=request_is_degraded(),
+            featureAttributions=(forest_explainer.to_dict(attributions[0])
+                                 if request.includeAttributions and attributions is not None else None)
         )
         
-        logger.info(f"Successfully processed simulation impact for ID: {request.simulationId}")
+        logger.debug(f"Successfully processed simulation impact for ID: {request.simulationId}")
         return response
         
     except Exception as e:
@@ -749,61 +1146,45 @@ async def simulate_impact(request: AISimulateImpactRequest):
         raise HTTPException(status_code=500, detail="Internal server error")
 
 @app.post("/ai/predict-risk", response_model=AIRiskPredictionResponse)
-async def predict_risk(request: AIRiskPredictionRequest):
+def predict_risk(request: AIRiskPredictionRequest, x_serving_tier: Optional[str] = Header(None)):
     """
     Provide detailed risk assessment for a specific scenario.
     
     This endpoint analyzes the parameters of a proposed space activity
     and provides a detailed risk assessment with mitigation strategies.
     """
+    tier = resolve_serving_tier(x_serving_tier)
     try:
-        logger.info(f"Processing risk prediction for event type: {request.eventType}")
-        
-        # Prepare features for prediction
-        features = prepare_features({
-            'altitude': request.parameters.altitude,
-            'inclination': request.parameters.inclination,
-            'velocity': request.parameters.velocity,
-            'mass': request.parameters.mass,
-            'objectsInLEO': 3000,  # Baseline
-            'objectsInMEO': 500,   # Baseline
-            'objectsInGEO': 2000,  # Baseline
-            'averageCongestion': 0.5  # Baseline
-        })
+        logger.debug(f"Processing risk prediction for event type: {request.eventType}")
         
-        # Make predictions using ensemble of models
-        rf_predictions = random_forest_model.predict(features)[0]
-        lr_predictions = linear_model.predict(features)[0]
+        # Prepare features for prediction; the congestion state comes from the
+        # catalog density index when one is loaded, otherwise the baselines
+        with pipeline_stage("feature_prep"):
+            state = (density_index.scenario_features(request.parameters.altitude, request.parameters.inclination)
+                     if density_index.loaded else BASELINE_STATE)
+            features = prepare_features({
+                'altitude': request.parameters.altitude,
+                'inclination': request.parameters.inclination,
+                'velocity': request.parameters.velocity,
+                'mass': request.parameters.mass,
+                **state
+            })
         
-        # Use LSTM model if available
-        lstm_predictions = rf_predictions  # Default to RF if LSTM not available
-        if lstm_model is not None:
-            try:
-                # Reshape for LSTM (1 sample, 10 time steps, 6 features)
-                # For demo, we'll just repeat the features 10 times
-                features_lstm = np.tile(features, (1, 1, 1))
-                # Repeat to create 10 time steps
-                features_lstm = np.repeat(features_lstm, 10, axis=1)
-                lstm_pred = lstm_model.predict(features_lstm, verbose=0)[0]
-                lstm_predictions = lstm_pred
-            except Exception as e:
-                logger.warning(f"LSTM prediction failed: {str(e)}")
+        # Cheap models first; the LSTM / debris model only run if the cascade escalates
+        predictions = predict_ensemble(features, tier)
+        escalated = bool(predictions["escalated"][0])
         
-        # Ensemble prediction (simple average)
-        ensemble_predictions = (rf_predictions + lr_predictions + lstm_predictions) / 3
+        # Ensemble prediction (learned stacking weights)
+        ensemble_predictions = predictions["ensemble"][0]
         
         # Convert to risk scores (1-10 scale) and ensure they are positive
         collision_risk_score = max(1.0, min(10.0, float(abs(ensemble_predictions[0]) * 10)))
         congestion_risk_score = max(1.0, min(10.0, float(abs(ensemble_predictions[1]) * 10)))
         long_term_impact_score = max(1.0, min(10.0, float(abs(ensemble_predictions[2]) * 10)))
         
-        # Use debris prediction model if available for long-term impact
-        if debris_prediction_model is not None:
-            try:
-                debris_prob = debris_prediction_model.predict(features, verbose=0)[0][0]
-                long_term_impact_score = float(debris_prob * 10)
-            except Exception as e:
-                logger.warning(f"Debris prediction failed: {str(e)}")
+        # Use debris prediction model output for long-term impact if it ran
+        if predictions["debris"] is not None and not np.isnan(predictions["debris"][0]):
+            long_term_impact_score = float(predictions["debris"][0] * 10)
         
         # Identify risk factors
         risk_factors = []
@@ -823,18 +1204,20 @@ async def predict_risk(request: AIRiskPredictionRequest):
             })
         
         # Generate mitigation strategies
-        mitigation_strategies = generate_recommendations(
-            ensemble_predictions[0], 
-            ensemble_predictions[1], 
-            request.parameters
-        )
+        with pipeline_stage("recommendations"):
+            mitigation_strategies = generate_recommendations(
+                ensemble_predictions[0], 
+                ensemble_predictions[1], 
+                request.parameters
+            )
         
-        # Add RL-based mitigation strategies if available
-        if rl_model is not None:
+        # Add RL-based mitigation strategies if available (escalated requests only)
+        if rl_model is not None and escalated:
             try:
                 # Create observation from features (normalized)
-                obs = np.clip(features.flatten() / np.array([2000, 180, 15, 10000, 10000, 1]), 0, 1)
-                action, _ = rl_model.predict(obs)
+                obs = features_to_observations(features)[0]
+                with model_stage("ppo"):
+                    action, _ = rl_model.predict(obs)
                 
                 if action == 1:
                     mitigation_strategies.append("RL suggestion: Increase altitude to reduce risk.")
@@ -842,6 +1225,7 @@ async def predict_risk(request: AIRiskPredictionRequest):
                     mitigation_strategies.append("RL suggestion: Adjust inclination to minimize congestion.")
             except Exception as e:
                 logger.warning(f"RL mitigation strategy failed: {str(e)}")
+                record_fallback("rl_mitigation")
         
         response = AIRiskPredictionResponse(
             riskAssessmentId=f"risk_{hash(str(request.parameters))}",
@@ -849,20 +1233,391 @@ async def predict_risk(request: AIRiskPredictionRequest):
             congestionRiskScore=congestion_risk_score,
             longTermImpactScore=long_term_impact_score,
             riskFactors=risk_factors,
-            mitigationStrategies=mitigation_strategies
+            mitigationStrategies=mitigation_strategies,
+            degraded=request_is_degraded()
         )
         
-        logger.info(f"Successfully processed risk prediction for event type: {request.eventType}")
+        logger.debug(f"Successfully processed risk prediction for event type: {request.eventType}")
         return response
         
     except Exception as e:
         logger.error(f"Error processing risk prediction: {str(e)}")
         raise HTTPException(status_code=500, detail="Internal server error")
 
+@app.post("/ai/timeline", response_model=TimelineResponse)
+def score_timeline(request: TimelineRequest, x_serving_tier: Optional[str] = Header(None)):
+    """
+    Score an ordered sequence of events from one initial state.
+
+    Each event's state delta is applied on top of the previous state (see
+    timeline.py) and all intermediate states are scored in one batched pass,
+    returning the cumulative risk trajectory and each event's marginal impact.
+    """
+    tier = resolve_serving_tier(x_serving_tier)
+    if len(request.events) > MAX_TIMELINE_EVENTS:
+        raise HTTPException(status_code=422, detail=f"Timeline is limited to {MAX_TIMELINE_EVENTS} events")
+    try:
+        with pipeline_stage("feature_prep"):
+            states, features = timeline_features(
+                request.initialState.model_dump(),
+                # Unset stateDelta fields are no change (an empty delta: the derived one)
+                [event.model_dump(exclude_none=True) for event in request.events]
+            )
+    except TimelineError as e:
+        raise HTTPException(status_code=422, detail=str(e))
+
+    try:
+        logger.debug(f"Scoring timeline {request.timelineId} with {len(request.events)} events")
+        # Intermediate states are synthetic, not traffic: kept out of the journal
+        predictions = predict_ensemble(features, tier, journal=False)
+        collision, congestion, debris = impact_scores(predictions["ensemble"], predictions["debris"])
+        scores = [
+            {
+                "collisionRiskPercentage": float(collision[i]),
+                "orbitalCongestionIncrease": float(congestion[i]),
+                "secondaryDebrisProbability": float(debris[i]),
+            }
+            for i in range(len(states))
+        ]
+
+        steps = []
+        for i, event in enumerate(request.events, start=1):
+            steps.append({
+                "index": i - 1,
+                "eventType": event.eventType,
+                "state": states[i],
+                **scores[i],
+                "marginalImpact": {key: scores[i][key] - scores[i - 1][key] for key in scores[i]},
+                "escalated": bool(predictions["escalated"][i]),
+            })
+
+        return TimelineResponse(
+            timelineId=request.timelineId,
+            initial={"state": states[0], **scores[0]},
+            steps=steps,
+            totalImpact={key: scores[-1][key] - scores[0][key] for key in scores[0]},
+            degraded=request_is_degraded()
+        )
+
+    except Exception as e:
+        logger.error(f"Error scoring timeline: {str(e)}")
+        raise HTTPException(status_code=500, detail="Internal server error")
+
+def _validate_constellation_request(request):
+    """Reject out-of-bounds optimization requests before any work is scheduled"""
+    for name, values, (low, high) in (("altitudeRange", request.altitudeRange, (100, 5000)),
+                                      ("inclinationRange", request.inclinationRange, (0, 180))):
+        if len(values) != 2 or not (low <= values[0] <= values[1] <= high):
+            raise HTTPException(status_code=422, detail=f"{name} must be [min, max] within {low}-{high}")
+    if not (1 <= request.planes <= 100 and 1 <= request.satellitesPerPlane <= 1000):
+        raise HTTPException(status_code=422, detail="planes must be 1-100 and satellitesPerPlane 1-1000")
+    if not (0 < request.timeBudgetSeconds <= MAX_OPTIMIZER_BUDGET_SECONDS):
+        raise HTTPException(status_code=422,
+                            detail=f"timeBudgetSeconds must be between 0 and {MAX_OPTIMIZER_BUDGET_SECONDS}")
+    if not (8 <= request.populationSize <= 1024):
+        raise HTTPException(status_code=422, detail="populationSize must be 8-1024")
+    if not (0 < request.satelliteMass <= 10000):
+        raise HTTPException(status_code=422, detail="satelliteMass must be between 0 and 10000 kg")
+
+def _constellation_option(problem, genome, objectives):
+    altitudes, inclinations = problem.decode(genome[np.newaxis])
+    return {
+        "planes": [
+            {"altitude": float(altitude), "inclination": float(inclination),
+             "satellites": problem.satellites_per_plane}
+            for altitude, inclination in zip(altitudes[0], inclinations[0])
+        ],
+        **{name: float(value) for name, value in zip(OBJECTIVES, objectives)},
+    }
+
+@app.post("/ai/optimize-constellation")
+def optimize_constellation(request: ConstellationOptimizationRequest):
+    """
+    Search plane slots that minimize predicted collision and congestion risk.
+
+    Candidate populations are scored as batches through the cheap-tier
+    ensemble by independent search islands in worker processes, within the
+    time budget (see optimizer.py). Returns the Pareto front of collision
+    risk, congestion risk and altitude cost, the most balanced option and
+    an evenly spaced baseline for comparison.
+    """
+    _validate_constellation_request(request)
+    try:
+        if density_index.loaded:
+            base_objects = sum(density_index.regime_totals.values())
+            congestion_grid = density_index.congestion_grid()
+        else:
+            base_objects = sum(BASELINE_STATE[key] for key in ('objectsInLEO', 'objectsInMEO', 'objectsInGEO'))
+            congestion_grid = None
+        problem = ConstellationProblem(
+            request.altitudeRange, request.inclinationRange, request.planes, request.satellitesPerPlane,
+            mass=request.satelliteMass, base_objects=base_objects, congestion_grid=congestion_grid,
+            base_congestion=BASELINE_STATE['averageCongestion'], separation_km=request.minPlaneSeparationKm,
+        )
+        scorer = cascade.cheap_scorer()
+        result = constellation_optimizer.optimize(scorer, problem, request.timeBudgetSeconds,
+                                                  request.populationSize, request.seed)
+
+        front = [_constellation_option(problem, genome, objectives)
+                 for genome, objectives in zip(result["genomes"], result["objectives"])]
+        # Most balanced option: lowest combined collision + congestion risk
+        recommended = int(np.argmin(result["objectives"][:, 0] + result["objectives"][:, 1]))
+        baseline_genome = problem.evenly_spaced()
+        baseline = _constellation_option(problem, baseline_genome[0], problem.evaluate(scorer, baseline_genome)[0])
+
+        logger.info(f"Constellation search: {result['evaluations']} candidates in {result['generations']} "
+                    f"generations over {result['islands']} islands, front of {len(front)}")
+        return {
+            "front": front,
+            "recommended": front[recommended],
+            "baseline": baseline,
+            "search": {key: result[key] for key in ("islands", "generations", "evaluations", "seconds")},
+        }
+
+    except Exception as e:
+        logger.error(f"Error optimizing constellation: {str(e)}")
+        raise HTTPException(status_code=500, detail="Internal server error")
+
+@app.post("/ai/evaluate-maneuvers")
+def evaluate_maneuvers(request: ManeuverEvaluationRequest):
+    """
+    Rank candidate collision-avoidance maneuvers for one object.
+
+    Several hundred along-track / normal / radial burns and altitude /
+    inclination offsets within ``maxDeltaV`` are re-featurized and scored in
+    one batch on the cheap tier (the compiled models answer ~500 rows in a
+    few milliseconds), then ranked by risk reduction against delta-v cost
+    (see maneuvers.py).
+    """
+    start = time.perf_counter()
+    parameters = request.parameters
+    if not (0 < request.maxDeltaV <= 1000 and 0 < request.isp <= 10000 and 1 <= request.top <= 1000):
+        raise HTTPException(status_code=422, detail="maxDeltaV must be 0-1000 m/s, isp 0-10000 s and top 1-1000")
+    if not (100 <= parameters.altitude <= 50000 and 0 <= parameters.inclination <= 180 and parameters.mass > 0):
+        raise HTTPException(status_code=422, detail="parameters out of range")
+    try:
+        with pipeline_stage("feature_prep"):
+            if request.currentState is not None:
+                state = request.currentState
+                objects_in_orbit = state.objectsInLEO + state.objectsInMEO + state.objectsInGEO
+                congestion = state.averageCongestion
+            else:
+                state = (density_index.scenario_features(parameters.altitude, parameters.inclination)
+                         if density_index.loaded else BASELINE_STATE)
+                objects_in_orbit = state['objectsInLEO'] + state['objectsInMEO'] + state['objectsInGEO']
+                congestion = state['averageCongestion']
+                if density_index.loaded:
+                    # Location-specific congestion at every candidate's new slot
+                    congestion = density_index.congestion_at
+            candidates = generate_candidates(parameters.altitude, parameters.inclination, request.maxDeltaV)
+            features = candidate_features(parameters.model_dump(), candidates, objects_in_orbit, congestion)
+
+        predictions = cascade.predict(features, "cheap")["ensemble"]
+        baseline, predictions = predictions[0], predictions[1:]
+        order, ranks, risk_reduction = rank_candidates(baseline, predictions, candidates)
+        propellant = propellant_mass(parameters.mass, candidates["deltaV"], request.isp)
+
+        table = []
+        for i in order[:request.top]:
+            table.append({
+                "kind": str(candidates["kind"][i]),
+                "deltaV": float(candidates["deltaV"][i]),
+                "alongTrackDeltaV": float(candidates["alongTrackDeltaV"][i]),
+                "normalDeltaV": float(candidates["normalDeltaV"][i]),
+                "radialDeltaV": float(candidates["radialDeltaV"][i]),
+                "altitudeChange": float(candidates["altitudeChange"][i]),
+                "inclinationChange": float(candidates["inclinationChange"][i]),
+                "radialExcursion": float(candidates["radialExcursion"][i]),
+                "propellantKg": float(propellant[i]),
+                "collisionRisk": float(predictions[i, 0]),
+                "congestionRisk": float(predictions[i, 1]),
+                "riskReduction": float(risk_reduction[i]),
+                "riskReductionPerMetrePerSecond": float(risk_reduction[i] / candidates["deltaV"][i]),
+                "efficient": bool(ranks[i] == 0),
+            })
+
+        return {
+            "baseline": {"collisionRisk": float(baseline[0]), "congestionRisk": float(baseline[1])},
+            "candidates": table,
+            "evaluated": int(len(predictions)),
+            "elapsedMs": (time.perf_counter() - start) * 1000,
+            "degraded": request_is_degraded()
+        }
+
+    except Exception as e:
+        logger.error(f"Error evaluating maneuvers: {str(e)}")
+        raise HTTPException(status_code=500, detail="Internal server error")
+
+def heatmap_model_version():
+    """Versions of the models behind the cheap tier, which scores heatmap tiles"""
+    versions = tuple(live_model_versions.get(name) for name in HEAD_MODELS)
+    if None in versions or "in-memory" in versions:
+        # Unregistered models carry no version; the cascade is rebuilt whenever they change
+        return f"in-memory-{cascade_generation}"
+    return ",".join(versions)
+
+@app.get("/ai/heatmap")
+async def heatmap_info():
+    """Tile pyramid layout for /ai/heatmap/{level}/{x}/{y}"""
+    return {
+        "altitudeRange": list(ALTITUDE_RANGE_KM),
+        "inclinationRange": list(INCLINATION_RANGE_DEG),
+        "maxLevel": MAX_LEVEL,
+        "tileSize": TILE_SIZE,
+        "columns": list(HEATMAP_COLUMNS),
+        "defaultMass": DEFAULT_MASS_KG,
+        "modelVersion": heatmap_model_version(),
+        "densityRevision": density_index.revision,
+        "cachedTiles": len(heatmap_tiles),
+    }
+
+@app.get("/ai/heatmap/{level}/{x}/{y}")
+def heatmap_tile(level: int, x: int, y: int, request: Request, mass: float = DEFAULT_MASS_KG):
+    """
+    Risk grid of one altitude x inclination tile.
+
+    ``TILE_SIZE`` x ``TILE_SIZE`` cells, inclination-major (row i, column j =
+    i-th inclination, j-th altitude from the tile's low corner), with the
+    HEATMAP_COLUMNS risks of each cell. Computed in one cheap-tier batch and
+    cached per model version and density index revision; the ETag changes
+    with both, and a matching If-None-Match is answered with 304.
+    ``Accept: application/x-float32`` returns the (cells, columns) matrix raw.
+    """
+    try:
+        altitude_range, inclination_range = tile_bounds(level, x, y)
+    except HeatmapError as e:
+        raise HTTPException(status_code=422, detail=str(e))
+    if not 0 < mass <= 100000:
+        raise HTTPException(status_code=422, detail="mass must be 0-100000 kg")
+
+    key = (heatmap_model_version(), density_index.revision, level, x, y, float(mass))
+    etag = f'"{tile_etag(key)}"'
+    headers = {"ETag": etag, "Cache-Control": "no-cache"}
+    if request.headers.get("if-none-match") == etag:
+        return Response(status_code=304, headers=headers)
+
+    try:
+        if density_index.loaded:
+            objects_in_orbit = sum(density_index.regime_totals.values())
+            congestion = density_index.congestion_at
+        else:
+            objects_in_orbit = sum(BASELINE_STATE[key] for key in ('objectsInLEO', 'objectsInMEO', 'objectsInGEO'))
+            congestion = BASELINE_STATE['averageCongestion']
+        grid = heatmap_tiles.get(
+            key, lambda: tile_features(level, x, y, mass, objects_in_orbit, congestion), cascade)
+    except Exception as e:
+        logger.error(f"Error computing heatmap tile {level}/{x}/{y}: {str(e)}")
+        raise HTTPException(status_code=500, detail="Internal server error")
+
+    content = {
+        "level": level,
+        "x": x,
+        "y": y,
+        "altitudeRange": list(altitude_range),
+        "inclinationRange": list(inclination_range),
+        "mass": mass,
+        "shape": [TILE_SIZE, TILE_SIZE],
+        "values": {column: grid[:, i] for i, column in enumerate(HEATMAP_COLUMNS)},
+    }
+    return NegotiatedResponse(content, headers=headers, array=grid, columns=list(HEATMAP_COLUMNS))
+
+@app.post("/ai/trajectories")
+def trajectories(request: TrajectoryRequest):
+    """
+    Decimated orbit paths of one or more objects for the 3D views.
+
+    Every object is propagated (Kepler + secular J2) at ``step`` intervals
+    over ``duration`` seconds, then thinned by curvature so the drawn
+    polyline stays within ``tolerancePixels`` x ``kmPerPixel`` of the orbit
+    (see trajectory.py). All positions share one float32 (points, 3) ECI km
+    buffer with per-object offset and count: base64 in JSON / MessagePack,
+    or the raw body with ``Accept: application/x-float32`` (offsets and
+    counts in the x-object-offsets / x-object-counts headers).
+    """
+    start = time.perf_counter()
+    samples = int(request.duration // request.step) + 1 if request.step > 0 else 0
+    if not 1 <= len(request.objects) <= MAX_TRAJECTORY_OBJECTS:
+        raise HTTPException(status_code=422, detail=f"objects must contain 1-{MAX_TRAJECTORY_OBJECTS} entries")
+    if not (request.duration > 0 and request.step > 0 and request.tolerancePixels > 0 and request.kmPerPixel > 0):
+        raise HTTPException(status_code=422, detail="duration, step, tolerancePixels and kmPerPixel must be positive")
+    if samples * len(request.objects) > MAX_TRAJECTORY_SAMPLES:
+        raise HTTPException(status_code=422, detail=f"objects x duration / step exceeds {MAX_TRAJECTORY_SAMPLES} samples")
+    tolerance_km = request.tolerancePixels * request.kmPerPixel
+
+    try:
+        positions, times, offsets, counts, samples = generate_trajectories(
+            [item.model_dump() for item in request.objects], request.duration, request.step,
+            tolerance_km, delta=request.deltaEncoding)
+    except TrajectoryError as e:
+        raise HTTPException(status_code=422, detail=str(e))
+    except Exception as e:
+        logger.error(f"Error generating trajectories: {str(e)}")
+        raise HTTPException(status_code=500, detail="Internal server error")
+
+    columns = ["dx", "dy", "dz"] if request.deltaEncoding else ["x", "y", "z"]
+    content = {
+        "objects": [
+            {"id": item.id if item.id is not None else str(i), "offset": int(offset), "count": int(count)}
+            for i, (item, offset, count) in enumerate(zip(request.objects, offsets, counts))
+        ],
+        "frame": "ECI",
+        "units": "km",
+        "encoding": "delta" if request.deltaEncoding else "absolute",
+        "columns": columns,
+        "toleranceKm": tolerance_km,
+        "samplesPerObject": samples,
+        "points": int(len(positions)),
+        "positions": base64.b64encode(encode_float32(positions)).decode("ascii"),
+        "times": base64.b64encode(encode_float32(times)).decode("ascii"),
+        "elapsedMs": (time.perf_counter() - start) * 1000,
+    }
+    headers = {"x-object-offsets": ",".join(str(int(offset)) for offset in offsets),
+               "x-object-counts": ",".join(str(int(count)) for count in counts)}
+    return NegotiatedResponse(content, headers=headers, array=positions, columns=columns)
+
 @app.get("/health")
 async def health_check():
     """Health check endpoint"""
-    return {"status": "healthy", "service": "Space Traffic Simulator AI Service"}
+    return {"status": "healthy", "service": "Space Traffic Simulator AI Service",
+            "admission": admission_controller.status()}
+
+@app.get("/metrics", include_in_schema=False)
+async def metrics_endpoint():
+    """Prometheus metrics endpoint"""
+    return PlainTextResponse(render_metrics(), media_type=PROMETHEUS_CONTENT_TYPE)
+
+@app.get("/ai/environment")
+async def environment_status():
+    """Cached environmental factors, derived risk multiplier and staleness"""
+    return environment_cache.status()
+
+@app.get("/ai/drift")
+async def drift_report():
+    """Live input / prediction distributions compared with the training data (PSI, KS, quantiles)"""
+    return drift_monitor.report()
+
+@app.get("/ai/journal")
+async def journal_status():
+    """Prediction journal segments, records written / buffered / dropped and current model versions"""
+    return prediction_journal.status()
+
+@app.get("/ai/density")
+async def density_lookup(altitude: Optional[float] = None, inclination: Optional[float] = None):
+    """Density index status, or the cell containing (altitude, inclination)"""
+    if altitude is None or inclination is None:
+        return density_index.status()
+    if not (0 <= altitude <= 100000 and 0 <= inclination <= 180):
+        raise HTTPException(status_code=422, detail="altitude must be 0-100000 km and inclination 0-180 degrees")
+    return {**density_index.cell(altitude, inclination), "catalogObjects": len(density_index)}
+
+@app.post("/ai/density/objects")
+def update_density_objects(request: DensityUpdateRequest):
+    """Add (or move) and remove catalog objects; only the touched cells are recomputed"""
+    try:
+        result = density_index.update(add=request.add, remove=request.remove)
+    except CatalogError as e:
+        raise HTTPException(status_code=422, detail=str(e))
+    return {**result, "objects": len(density_index)}
 
 @app.get("/")
 async def root():
@@ -873,19 +1628,41 @@ async def root():
         "endpoints": [
             "POST /ai/simulate-impact",
             "POST /ai/predict-risk",
+            "POST /ai/timeline",
+            "POST /ai/optimize-constellation",
+            "POST /ai/evaluate-maneuvers",
             "POST /ai/retrain",
             "POST /ai/real-time-prediction",
+            "WS /ai/stream/real-time",
             "POST /ai/personalized-recommendations",
-            "GET /health"
+            "POST /ai/batch-predict",
+            "GET /ai/models",
+            "POST /ai/models/{name}/promote",
+            "POST /ai/models/{name}/shadow",
+            "GET /ai/environment",
+            "GET /ai/drift",
+            "GET /ai/journal",
+            "GET /ai/density",
+            "GET /ai/heatmap",
+            "GET /ai/heatmap/{level}/{x}/{y}",
+            "POST /ai/trajectories",
+            "POST /ai/density/objects",
+            "GET /health",
+            "GET /metrics"
         ]
     }
 
 
 @app.post("/ai/retrain")
-async def retrain_models(request: RetrainRequest):
-    """Retrain models with new data"""
-    global random_forest_model, linear_model
-    
+def retrain_models(request: RetrainRequest):
+    """Retrain models with new data
+
+    Only the heads of ``targetVariable`` (``random_forest.<target>`` and
+    ``linear.<target>``) are refit and validated; the other targets' heads are
+    untouched. The new head versions only replace the live ones when
+    ``promote`` is set; otherwise they are shadowed against live traffic until
+    promoted via /ai/models/{name}/promote.
+    """
     try:
         logger.info(f"Retraining models with {len(request.trainingData)} samples for target: {request.targetVariable}")
         
@@ -904,44 +1681,118 @@ async def retrain_models(request: RetrainRequest):
             raise ValueError(f"Invalid target variable: {request.targetVariable}")
         
         y = np.array([d[target_map[request.targetVariable]] for d in request.trainingData])
-        
-        # Retrain models
-        random_forest_model.fit(X, y)
-        linear_model.fit(X, y)
-        
-        # Save updated models
-        try:
-            import os
-            os.makedirs('models', exist_ok=True)
-            joblib.dump(random_forest_model, 'models/random_forest_model.pkl')
-            joblib.dump(linear_model, 'models/linear_model.pkl')
-            logger.info("Retrained models saved successfully")
-        except Exception as e:
-            logger.warning(f"Failed to save retrained models: {str(e)}")
+
+        journal_samples = 0
+        if request.fromJournal:
+            # Rows scored so far, labelled with the ensemble outputs served for them (distillation)
+            unknown = [tier for tier in request.journalTiers if tier not in SERVING_TIERS]
+            if unknown:
+                raise ValueError(f"Unknown journal tiers: {unknown}")
+            prediction_journal.flush()
+            X_journal, y_journal, _ = load_training_data(
+                prediction_journal.directory, since=request.journalSince, max_samples=request.journalMaxSamples,
+                tiers=request.journalTiers)
+            journal_samples = len(X_journal)
+            X = np.vstack([X.reshape(-1, X_journal.shape[1]), X_journal])
+            y = np.concatenate([y, y_journal[:, TARGET_NAMES.index(request.targetVariable)]])
+            logger.info(f"Added {journal_samples} journaled samples")
+        if len(X) == 0:
+            raise ValueError("No training data")
+        
+        # Hold out a fifth of the data for the metrics stored with each version
+        validation = None
+        X_train, y_train = X, y
+        if len(X) >= 10:
+            X_train, X_test, y_train, y_test = train_test_split(X, y, test_size=0.2, random_state=42)
+            validation = (X_test, y_test)
+        
+        # Retrain fresh heads for this target only; the live heads keep serving until promoted
+        versions = {}
+        for family in MODEL_FAMILIES:
+            name = head_name(family, request.targetVariable)
+            model, version = train_head(name, X_train, y_train, f"retrain:{request.targetVariable}",
+                                        validation, promote=request.promote)
+            versions[name] = version
+            if request.promote:
+                set_live_model(name, model, version)
+                shadow_scorer.clear_candidate(name)
+            else:
+                shadow_scorer.set_candidate(name, version, model, targets=(request.targetVariable,))
+        if request.promote:
+            refresh_cascade()
+        record_model_versions()
         
         return {
             "success": True,
             "message": f"Models successfully retrained for {request.targetVariable} prediction",
-            "samplesUsed": len(request.trainingData)
+            "samplesUsed": len(X),
+            "journalSamples": journal_samples,
+            "versions": versions,
+            "promoted": request.promote
         }
         
     except Exception as e:
         logger.error(f"Error retraining models: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Failed to retrain models: {str(e)}")
 
-@app.post("/ai/real-time-prediction")
-async def real_time_prediction(request: RealTimePredictionRequest):
-    """
-    Provide real-time predictive analytics based on current parameters and user history.
+def _check_registered_model(name, names=REGISTERED_MODELS + OPTIONAL_MODELS):
+    if name not in names:
+        raise HTTPException(status_code=404, detail=f"Unknown model: {name}")
+
+@app.get("/ai/models")
+async def list_models():
+    """Registered versions, live pointers and shadow comparison statistics"""
+    return {
+        "models": {
+            name: {
+                "live": live_model_versions.get(name),
+                "versions": model_registry.list_versions(name)
+            }
+            for name in REGISTERED_MODELS + OPTIONAL_MODELS
+        },
+        "shadow": shadow_scorer.report()
+    }
+
+@app.post("/ai/models/{name}/promote")
+async def promote_model(name: str, request: PromoteModelRequest):
+    """Make a registered version the live model"""
+    _check_registered_model(name)
+    try:
+        model, metadata = model_registry.load(name, request.version)
+    except ModelRegistryError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    model_registry.promote(name, request.version)
+    set_live_model(name, model, request.version)
+    shadow_scorer.clear_candidate(name)
+    refresh_cascade()
+    record_model_versions()
+    return {"success": True, "model": name, "live": request.version}
+
+@app.post("/ai/models/{name}/shadow")
+async def shadow_model(name: str, request: ShadowModelRequest):
+    """Start (or stop) shadowing a registered version against live traffic"""
+    _check_registered_model(name, REGISTERED_MODELS)
+    if request.sampleRate is not None and not 0 <= request.sampleRate <= 1:
+        raise HTTPException(status_code=422, detail="sampleRate must be between 0 and 1")
+    if request.version is None:
+        shadow_scorer.clear_candidate(name)
+        return {"success": True, "model": name, "shadow": None}
+    try:
+        model, metadata = model_registry.load(name, request.version)
+    except ModelRegistryError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    shadow_scorer.set_candidate(name, request.version, model, request.sampleRate,
+                                targets=(split_head_name(name)[1],))
+    return {"success": True, "model": name, "shadow": request.version, "sampleRate": shadow_scorer.sample_rate}
+
+
+def compute_real_time_prediction(request, tier, degraded=False):
+    """Real-time prediction for a validated request (shared by the HTTP and streaming endpoints)"""
+    logger.debug(f"Processing real-time prediction for user: {request.userId}")
     
-    This endpoint analyzes the current space traffic situation and provides immediate
-    predictions for collision risks, congestion impacts, and debris probabilities.
-    """
+    # Prepare features for prediction
     try:
-        logger.info(f"Processing real-time prediction for user: {request.userId}")
-        
-        # Prepare features for prediction
-        try:
+        with pipeline_stage("feature_prep"):
             features = prepare_features({
                 'altitude': request.parameters.altitude,
                 'inclination': request.parameters.inclination,
@@ -952,120 +1803,159 @@ async def real_time_prediction(request: RealTimePredictionRequest):
                 'objectsInGEO': request.currentState.objectsInGEO,
                 'averageCongestion': request.currentState.averageCongestion
             })
-            logger.info(f"Features prepared successfully")
-        except Exception as e:
-            logger.error(f"Error preparing features: {str(e)}")
-            raise
-        
-        logger.info(f"Features prepared: {features}")
-        logger.info(f"Features shape: {features.shape}")
-        
-        # Make predictions using ensemble of models
-        rf_pred_raw = random_forest_model.predict(features)
-        rf_predictions = rf_pred_raw[0] if hasattr(rf_pred_raw, '__len__') and len(rf_pred_raw) > 0 else rf_pred_raw
-        
-        lr_pred_raw = linear_model.predict(features)
-        lr_predictions = lr_pred_raw[0] if hasattr(lr_pred_raw, '__len__') and len(lr_pred_raw) > 0 else lr_pred_raw
-        
-        logger.info(f"RF predictions: {rf_predictions}")
-        logger.info(f"LR predictions: {lr_predictions}")
-        
-        # Use LSTM model if available
-        lstm_predictions = rf_predictions  # Default to RF if LSTM not available
-        if lstm_model is not None:
-            try:
-                # Reshape for LSTM (1 sample, 10 time steps, 6 features)
-                # For demo, we'll just repeat the features 10 times
-                features_lstm = np.tile(features, (1, 1, 1))
-                # Repeat to create 10 time steps
-                features_lstm = np.repeat(features_lstm, 10, axis=1)
-                lstm_pred = lstm_model.predict(features_lstm, verbose=0)[0]
-                lstm_predictions = lstm_pred
-            except Exception as e:
-                logger.warning(f"LSTM prediction failed: {str(e)}")
-        
-        # Ensemble prediction (simple average)
-        ensemble_predictions = (rf_predictions + lr_predictions + lstm_predictions) / 3
-        
-        # Extract predictions and ensure they are positive
-        collision_risk_percentage = max(0.0, min(100.0, float(abs(ensemble_predictions[0]) * 100)))
-        orbital_congestion_increase = max(0.0, min(100.0, float(abs(ensemble_predictions[1]) * 50)))
-        secondary_debris_probability = max(0.0, min(100.0, float(abs(ensemble_predictions[2]) * 25)))
-        
-        # Use debris prediction model if available
-        if debris_prediction_model is not None:
-            try:
-                debris_prob = debris_prediction_model.predict(features, verbose=0)[0][0]
-                secondary_debris_probability = float(debris_prob * 100)
-            except Exception as e:
-                logger.warning(f"Debris prediction failed: {str(e)}")
-        
-        # Calculate confidence based on model agreement
-        model_std = np.std([rf_predictions, lr_predictions, lstm_predictions])
-        confidence_level = max(70.0, 100.0 - model_std * 100)  # Higher agreement = higher confidence
-        
-        # Generate explanation and recommendations
+    except Exception as e:
+        logger.error(f"Error preparing features: {str(e)}")
+        raise
+    
+    # Full feature dumps go to the (sampled) trace instead of the INFO log
+    trace_event("features_prepared", features=features.ravel().tolist())
+    
+    # Cheap models first; the LSTM / debris model only run if the cascade escalates
+    predictions = predict_ensemble(features, tier)
+    rf_predictions = predictions["random_forest"][0]
+    lr_predictions = predictions["linear"][0]
+    lstm_predictions = predictions["lstm"][0]
+    escalated = bool(predictions["escalated"][0])
+    
+    trace_event("model_outputs", random_forest=rf_predictions.tolist(), linear=lr_predictions.tolist(),
+                tier=tier, escalated=escalated)
+    
+    # Ensemble prediction (learned stacking weights)
+    ensemble_predictions = predictions["ensemble"][0]
+    
+    # Extract predictions and ensure they are positive
+    collision_risk_percentage = max(0.0, min(100.0, float(abs(ensemble_predictions[0]) * 100)))
+    orbital_congestion_increase = max(0.0, min(100.0, float(abs(ensemble_predictions[1]) * 50)))
+    secondary_debris_probability = max(0.0, min(100.0, float(abs(ensemble_predictions[2]) * 25)))
+    
+    # Use debris prediction model output if it ran
+    if predictions["debris"] is not None and not np.isnan(predictions["debris"][0]):
+        secondary_debris_probability = float(predictions["debris"][0] * 100)
+    
+    # Calculate confidence based on model agreement
+    model_std = np.std([rf_predictions, lr_predictions, lstm_predictions])
+    confidence_level = max(70.0, 100.0 - model_std * 100)  # Higher agreement = higher confidence
+    
+    # What drove the forest's estimate (cached per feature row)
+    attributions = explain_features(features)
+    
+    # Generate explanation and recommendations
+    with pipeline_stage("explanation"):
         explanation = generate_explanation(
             ensemble_predictions[0], 
             ensemble_predictions[1], 
-            ensemble_predictions[2], 
-            request.parameters
+            secondary_debris_probability / 100,  # Served debris probability, in every tier
+            request.parameters,
+            attributions=None if attributions is None else attributions[0]
         )
-        
+    
+    with pipeline_stage("recommendations"):
         recommendations = generate_recommendations(
             ensemble_predictions[0], 
             ensemble_predictions[1], 
             request.parameters
         )
-        
-        # Add RL-based recommendations if available
-        if rl_model is not None:
-            try:
-                # Create observation from features (normalized)
-                obs = np.clip(features.flatten() / np.array([2000, 180, 15, 10000, 10000, 1]), 0, 1)
+    
+    # Add RL-based recommendations if available (escalated requests only)
+    if rl_model is not None and escalated:
+        try:
+            # Create observation from features (normalized)
+            obs = features_to_observations(features)[0]
+            with model_stage("ppo"):
                 action, _ = rl_model.predict(obs)
-                
-                if action == 1:
-                    recommendations.append("RL recommendation: Consider increasing altitude to reduce congestion.")
-                elif action == 2:
-                    recommendations.append("RL recommendation: Consider adjusting inclination to optimize traffic flow.")
-            except Exception as e:
-                logger.warning(f"RL recommendation failed: {str(e)}")
-        
-        # Personalize recommendations based on user history
-        if len(request.userHistory) > 0:
-            # Extract user's preferred strategies from history
+            
+            if action == 1:
+                recommendations.append("RL recommendation: Consider increasing altitude to reduce congestion.")
+            elif action == 2:
+                recommendations.append("RL recommendation: Consider adjusting inclination to optimize traffic flow.")
+        except Exception as e:
+            logger.warning(f"RL recommendation failed: {str(e)}")
+            record_fallback("rl_recommendation")
+    
+    # Personalize recommendations based on user history
+    if len(request.userHistory) > 0:
+        # Extract user's preferred strategies from history
+        with pipeline_stage("personalization"):
             user_preferences = analyze_user_preferences(request.userHistory)
             personalized_recommendations = personalize_recommendations(recommendations, user_preferences)
             recommendations = personalized_recommendations
-        
-        # Consider environmental factors if provided
+    
+    # Consider environmental factors: the caller's if provided, else the cached snapshot
+    with pipeline_stage("environmental_adjustment"):
         if request.environmentalFactors:
             environmental_impact = assess_environmental_impact(request.environmentalFactors)
+        else:
+            environmental_impact = environment_cache.current_impact()
+        if environmental_impact:
             collision_risk_percentage *= environmental_impact.get('risk_multiplier', 1.0)
             recommendations.extend(environmental_impact.get('recommendations', []))
-        
-        # Ensure values stay within bounds
-        collision_risk_percentage = max(0.0, min(100.0, collision_risk_percentage))
-        
-        return {
-            "predictionId": f"realtime_{hash(str(request.parameters))}",
-            "timestamp": datetime.utcnow().isoformat(),
-            "collisionRiskPercentage": collision_risk_percentage,
-            "orbitalCongestionIncrease": orbital_congestion_increase,
-            "secondaryDebrisProbability": secondary_debris_probability,
-            "confidenceLevel": confidence_level,
-            "explanation": explanation,
-            "recommendations": recommendations,
-            "timeHorizonHours": request.timeHorizon
-        }
-        
+    
+    # Ensure values stay within bounds
+    collision_risk_percentage = max(0.0, min(100.0, collision_risk_percentage))
+    
+    prediction = {
+        "predictionId": f"realtime_{hash(str(request.parameters))}",
+        "timestamp": datetime.utcnow().isoformat(),
+        "collisionRiskPercentage": collision_risk_percentage,
+        "orbitalCongestionIncrease": orbital_congestion_increase,
+        "secondaryDebrisProbability": secondary_debris_probability,
+        "confidenceLevel": confidence_level,
+        "explanation": explanation,
+        "recommendations": recommendations,
+        "timeHorizonHours": request.timeHorizon,
+        "degraded": degraded
+    }
+    if request.includeAttributions and attributions is not None:
+        prediction["featureAttributions"] = forest_explainer.to_dict(attributions[0])
+    return prediction
+
+
+@app.post("/ai/real-time-prediction")
+def real_time_prediction(request: RealTimePredictionRequest, x_serving_tier: Optional[str] = Header(None)):
+    """
+    Provide real-time predictive analytics based on current parameters and user history.
+    
+    This endpoint analyzes the current space traffic situation and provides immediate
+    predictions for collision risks, congestion impacts, and debris probabilities.
+    """
+    tier = resolve_serving_tier(x_serving_tier)
+    try:
+        return compute_real_time_prediction(request, tier, request_is_degraded())
     except Exception as e:
         logger.error(f"Error processing real-time prediction: {str(e)}")
         raise HTTPException(status_code=500, detail="Internal server error")
 
+
+# Sessions for the streaming endpoint (debouncing and limits: see streaming.py);
+# every streamed prediction takes a real-time admission slot
+prediction_stream = PredictionStream(admission=admission_controller)
+
+
+@app.websocket("/ai/stream/real-time")
+async def stream_real_time_prediction(websocket: WebSocket):
+    """
+    Streaming real-time predictions over one WebSocket per client.
+
+    Clients send scenario deltas; the latest scenario is re-predicted after each
+    burst of updates. The serving tier comes from the X-Serving-Tier handshake
+    header or the ``tier`` query parameter.
+    """
+    try:
+        tier = resolve_serving_tier(websocket.headers.get("x-serving-tier") or websocket.query_params.get("tier"))
+    except HTTPException:
+        await websocket.close(code=1008)
+        return
+
+    def compute(scenario):
+        request = RealTimePredictionRequest(**scenario)
+        # Admitted per prediction by the stream, degraded like an HTTP request
+        degraded = request_is_degraded()
+        return compute_real_time_prediction(request, resolve_serving_tier(tier, degraded), degraded)
+
+    await prediction_stream.serve(websocket, compute)
+
 @app.post("/ai/personalized-recommendations")
-async def personalized_recommendations_endpoint(request: PersonalizedRecommendationRequest):
+def personalized_recommendations_endpoint(request: PersonalizedRecommendationRequest):
     """
     Provide personalized recommendations based on user history and preferences.
     
@@ -1120,6 +2010,53 @@ async def personalized_recommendations_endpoint(request: PersonalizedRecommendat
         logger.error(f"Error generating personalized recommendations: {str(e)}")
         raise HTTPException(status_code=500, detail="Internal server error")
 
+@app.post("/ai/batch-predict")
+async def batch_predict(request: Request):
+    """
+    Score many scenarios in one call from a columnar payload.
+
+    The body holds one array per feature (altitude[], inclination[], velocity[],
+    mass[] and optionally objectsInLEO[]/objectsInMEO[]/objectsInGEO[] or
+    objectsInOrbit[], averageCongestion[]) as JSON, MessagePack or an Arrow IPC
+    stream. Rows are range-checked as whole columns and scored in a single
+    ensemble pass; results come back as columns too. At most
+    ``AI_BATCH_MAX_ROWS`` rows and ``AI_MAX_BODY_BYTES`` bytes are accepted
+    (413 otherwise).
+    """
+    tier = resolve_serving_tier(request.headers.get("x-serving-tier"))
+    content_type = request.headers.get("content-type", "").split(";")[0].strip().lower()
+    try:
+        # Decoding and validation of large payloads stay off the event loop
+        if content_type in ARROW_MEDIA_TYPES:
+            columns = await run_in_threadpool(read_arrow_columns, await read_body(request), MAX_BATCH_ROWS)
+        else:
+            columns = await decode_request_body(request)
+        with pipeline_stage("feature_prep"):
+            features = await run_in_threadpool(columns_to_features, columns, MAX_BATCH_ROWS)
+    except ColumnarTooLargeError as e:
+        raise HTTPException(status_code=413, detail=str(e))
+    except ColumnarValidationError as e:
+        raise HTTPException(status_code=422, detail=str(e))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=f"Malformed batch payload: {str(e)}")
+
+    try:
+        logger.debug(f"Processing columnar batch prediction for {features.shape[0]} rows")
+
+        # Inference runs in the thread pool so the event loop keeps admitting (or shedding) requests
+        predictions = await run_in_threadpool(predict_ensemble, features, tier)
+
+        # Same scaling as the single-scenario endpoints (shared with bulk_score.py)
+        results = batch_results(predictions)
+        columns = list(BATCH_RESULT_COLUMNS)
+        content = {"count": int(features.shape[0]), "degraded": request_is_degraded()}
+        content.update({name: results[:, i] for i, name in enumerate(columns)})
+        return NegotiatedResponse(content, array=results, columns=columns)
+
+    except Exception as e:
+        logger.error(f"Error processing batch prediction: {str(e)}")
+        raise HTTPException(status_code=500, detail="Internal server error")
+
 if __name__ == "__main__":
     # Run the service
     uvicorn.run(
@@ -0,0 +1,241 @@
+"""
+Feature Attributions
+--------------------
+
+Exact path-dependent TreeSHAP values for the random forest heads, vectorized
+over batches, with an LRU cache of per-row results.
+
+For one leaf of one tree the path-dependent SHAP game has product form: with
+``o_j`` = 1 when the row satisfies every split on feature j along the leaf's
+path and ``z_j`` the fraction of training samples those splits keep, the
+leaf's contribution to feature i is
+
+    value * (o_i - z_i) * sum_s w(s) * e_s(prod over j != i of (z_j + o_j x))
+
+where ``e_s`` is the x^s coefficient and ``w(s) = s! (d - s - 1)! / d!`` over
+the d distinct features on the path (features off the path are null players).
+The path conditions on a feature collapse to one interval, so a row enters
+only through which of the d intervals contain it: with six features (most
+paths use three or four) the contributions for all 2^d patterns are
+precomputed once per leaf (one table row per pattern, scaled by the leaf
+value). Explaining a row is then six interval tests per leaf, one table-row
+gather per leaf and a sum per target, instead of the per-tree recursion of
+TreeSHAP or a model-agnostic explainer's thousands of model calls.
+Attributions plus ``base_values`` (the forest's expected prediction) add up
+to the forest's prediction for the row.
+
+The table grows with the forest's leaf count, so with the training set: for
+the served 100-tree heads fitted on the 1000-row startup data it takes
+20-70 MB and 0.6-2.5 s to build, and a row takes 1.5-2.5 ms to explain; heads
+retrained on 5000 rows or more reach 130-150 MB, ~5 s and ~15 ms.
+refresh_cascade builds a new table only when the live forest changes.
+"""
+
+import math
+import os
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+from metrics import Counter
+from training_data import FEATURE_NAMES, TARGET_NAMES
+
+N_FEATURES = len(FEATURE_NAMES)
+# Rows explained per vectorized step; bounds the (rows, features, leaves) working arrays
+CHUNK_ROWS = 8
+DEFAULT_CACHE_SIZE = int(os.getenv("AI_ATTRIBUTION_CACHE_SIZE", "4096"))
+
+# Readable names for explanations
+FEATURE_LABELS = {
+    "altitude": "altitude",
+    "inclination": "inclination",
+    "velocity": "velocity",
+    "mass": "mass",
+    "objectsInOrbit": "objects in orbit",
+    "averageCongestion": "orbital congestion",
+}
+
+ATTRIBUTION_CACHE = Counter("ai_attribution_cache_total", "Attribution cache lookups by result", ("result",))
+
+
+def _round_down_float32(values):
+    """Largest float32 <= each value: float32 rows then compare exactly as against the float64 thresholds"""
+    rounded = values.astype(np.float32)
+    too_high = rounded > values
+    rounded[too_high] = np.nextafter(rounded[too_high], np.float32(-np.inf))
+    return rounded
+
+
+def _leaf_paths(tree):
+    """Leaves of a fitted tree with, per feature, their interval (lo, hi] and path cover fraction"""
+    left, right = tree.children_left, tree.children_right
+    weight = tree.weighted_n_node_samples
+    lo = np.full((tree.node_count, N_FEATURES), -np.inf)
+    hi = np.full((tree.node_count, N_FEATURES), np.inf)
+    cover = np.ones((tree.node_count, N_FEATURES))
+    # One tree level per step
+    frontier = np.array([0])
+    while frontier.size:
+        parents = frontier[left[frontier] != -1]
+        feature, threshold = tree.feature[parents], tree.threshold[parents]
+        for children in (left[parents], right[parents]):
+            lo[children] = lo[parents]
+            hi[children] = hi[parents]
+            cover[children] = cover[parents]
+            cover[children, feature] *= weight[children] / weight[parents]
+        hi[left[parents], feature] = np.minimum(hi[parents, feature], threshold)
+        lo[right[parents], feature] = np.maximum(lo[parents, feature], threshold)
+        frontier = np.concatenate([left[parents], right[parents]])
+    leaves = np.flatnonzero(left == -1)
+    return leaves, lo[leaves], hi[leaves], cover[leaves]
+
+
+def _leaf_tables(cover):
+    """(m, 2^d, d) contribution weights of m leaves whose paths cover d features
+
+    ``cover`` is (m, d). Entry [leaf, pattern, k] is the SHAP weight of path
+    feature k when bit j of ``pattern`` says whether the row lies in the
+    interval of path feature j; multiplied by the leaf value it is the
+    leaf's contribution.
+    """
+    m, d = cover.shape
+    weights = np.array([math.factorial(s) * math.factorial(d - s - 1) / math.factorial(d) for s in range(d)])
+    table = np.empty((m, 2 ** d, d))
+    for pattern in range(2 ** d):
+        inside = [(pattern >> j) & 1 for j in range(d)]
+        for k in range(d):
+            # Polynomial coefficients of the product over the other path features
+            coefficients = np.zeros((m, d))
+            coefficients[:, 0] = 1
+            for j in range(d):
+                if j == k:
+                    continue
+                product = coefficients * cover[:, j:j + 1]
+                if inside[j]:
+                    product[:, 1:] += coefficients[:, :-1]
+                coefficients = product
+            table[:, pattern, k] = (inside[k] - cover[:, k]) * (coefficients @ weights)
+    return table
+
+
+class ForestExplainer:
+    """TreeSHAP attributions of a fitted forest (scikit-learn or per-target ``MultiHeadModel``)"""
+
+    def __init__(self, forest_model, cache_size=DEFAULT_CACHE_SIZE):
+        self.forest_model = forest_model
+        if hasattr(forest_model, "estimator_columns"):
+            estimator_columns = forest_model.estimator_columns()
+        else:
+            estimator_columns = [(forest_model, column) for column in range(forest_model.n_outputs_)]
+        self.n_outputs = len(estimator_columns)
+        self.targets = TARGET_NAMES[:self.n_outputs]
+
+        los, his, covers, values, outputs = [], [], [], [], []
+        for output, (model, column) in enumerate(estimator_columns):
+            n_trees = len(model.estimators_)
+            for estimator in model.estimators_:
+                leaves, lo, hi, cover = _leaf_paths(estimator.tree_)
+                los.append(lo)
+                his.append(hi)
+                covers.append(cover)
+                values.append(estimator.tree_.value[leaves, column, 0] / n_trees)
+                outputs.append(np.full(len(leaves), output))
+        lo, hi, cover = np.concatenate(los), np.concatenate(his), np.concatenate(covers)
+        values, outputs = np.concatenate(values), np.concatenate(outputs)
+
+        # Expected prediction: every leaf weighted by the training mass reaching it
+        self.base_values = np.bincount(outputs, weights=values * cover.prod(axis=1), minlength=self.n_outputs)
+
+        # Only leaves with a non-empty path contribute; the rest are all base value
+        on_path = np.isfinite(lo) | np.isfinite(hi)
+        keep = on_path.any(axis=1)
+        lo, hi, cover, values, outputs, on_path = (
+            lo[keep], hi[keep], cover[keep], values[keep], outputs[keep], on_path[keep])
+        depth = on_path.sum(axis=1)
+
+        # One table row per (leaf, pattern): the leaf's contribution to every
+        # feature, already scaled by the leaf value (zero off the path)
+        table_offset = np.zeros(len(depth), dtype=np.int64)
+        table = np.zeros((int((2 ** depth).sum()), N_FEATURES), dtype=np.float32)
+        offset = 0
+        for d in np.unique(depth):
+            group = np.flatnonzero(depth == d)
+            features = np.nonzero(on_path[group])[1].reshape(len(group), d)
+            group_tables = _leaf_tables(cover[group][on_path[group]].reshape(len(group), d))
+            group_tables *= values[group][:, np.newaxis, np.newaxis]
+            rows = offset + np.arange(len(group))[:, np.newaxis] * 2 ** d + np.arange(2 ** d)
+            table[rows[:, :, np.newaxis], features[:, np.newaxis, :]] = group_tables
+            table_offset[group] = rows[:, 0]
+            offset += len(group) * 2 ** d
+        self._table = table
+        self._table_offset = table_offset
+
+        # Interval tests in (feature, leaf) layout; features off a leaf's path
+        # always test inside and carry no bit
+        self._lo = np.ascontiguousarray(_round_down_float32(lo.T))
+        self._hi = np.ascontiguousarray(_round_down_float32(hi.T))
+        rank = np.cumsum(on_path, axis=1) - 1
+        self._bit = np.ascontiguousarray(np.where(on_path, 1 << np.maximum(rank, 0), 0).T, dtype=np.uint8)
+        # Leaves are grouped by output
+        self._output_bounds = np.searchsorted(outputs, np.arange(self.n_outputs + 1))
+
+        self.cache_size = cache_size
+        self._cache = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _explain_rows(self, X):
+        values = X[:, :, np.newaxis]
+        inside = ((values > self._lo) & (values <= self._hi)).view(np.uint8)
+        # The pattern of satisfied path intervals selects each leaf's table row
+        patterns = inside[:, 0] * self._bit[0]
+        for feature in range(1, N_FEATURES):
+            patterns += inside[:, feature] * self._bit[feature]
+        contributions = np.take(self._table, self._table_offset + patterns, axis=0)
+        # Sum over each output's leaves (2-D reduceat per row is far faster than over a 3-D block)
+        return np.stack([np.add.reduceat(row, self._output_bounds[:-1], axis=0) for row in contributions])
+
+    def explain(self, X):
+        """(n, n_outputs, n_features) attributions of an (n, 6) feature matrix"""
+        # The trees split on float32 inputs
+        X = np.asarray(X, dtype=np.float32).reshape(-1, N_FEATURES)
+        result = np.empty((X.shape[0], self.n_outputs, N_FEATURES))
+        keys = [row.tobytes() for row in X]
+        missing = []
+        with self._lock:
+            for i, key in enumerate(keys):
+                cached = self._cache.get(key)
+                if cached is None:
+                    missing.append(i)
+                else:
+                    self._cache.move_to_end(key)
+                    result[i] = cached
+        ATTRIBUTION_CACHE.inc(len(keys) - len(missing), result="hit")
+        ATTRIBUTION_CACHE.inc(len(missing), result="miss")
+
+        for start in range(0, len(missing), CHUNK_ROWS):
+            rows = missing[start:start + CHUNK_ROWS]
+            result[rows] = self._explain_rows(X[rows])
+        if missing and self.cache_size:
+            with self._lock:
+                for i in missing:
+                    self._cache[keys[i]] = result[i].copy()
+                while len(self._cache) > self.cache_size:
+                    self._cache.popitem(last=False)
+        return result
+
+    def to_dict(self, attributions):
+        """One row's attributions as {"baseValues": {target: v}, "contributions": {target: {feature: v}}}"""
+        return {
+            "baseValues": {target: float(value) for target, value in zip(self.targets, self.base_values)},
+            "contributions": {
+                target: {feature: float(value) for feature, value in zip(FEATURE_NAMES, attributions[output])}
+                for output, target in enumerate(self.targets)
+            },
+        }
+
+
+def top_contributions(attributions, limit=3):
+    """(feature, value) pairs of one target's attributions, largest magnitude first"""
+    order = np.argsort(-np.abs(attributions))[:limit]
+    return [(FEATURE_NAMES[i], float(attributions[i])) for i in order]
@@ -0,0 +1,78 @@
+"""
+Cascade Serving Benchmark
+-------------------------
+
+Reports accuracy against held-out synthetic data vs. average single-row cost
+for each serving tier (cheap, cascade, full), the escalation rate of the
+cascade, and how the compiled random forest compares to scikit-learn.
+
+Usage:
+    python benchmarks/bench_cascade.py [--rows 2000] [--output report.json]
+"""
+
+import argparse
+import json
+import os
+import shutil
+import sys
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+def run_benchmark(rows=2000, repeat=50):
+    """Train models in a scratch directory and return the cascade report"""
+    import ai_service
+    from cascade import cascade_report
+    from training_data import generate_synthetic_training_data
+
+    workdir = tempfile.mkdtemp(prefix="ai-cascade-")
+    previous_cwd = os.getcwd()
+    os.chdir(workdir)
+    try:
+        ai_service.initialize_models()
+    finally:
+        os.chdir(previous_cwd)
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    # Seed disjoint from training (42) and stacking calibration (11)
+    X, y = generate_synthetic_training_data(rows, seed=2024)
+    return cascade_report(ai_service.cascade, X, y, forest_model=ai_service.random_forest_model, repeat=repeat)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=2000, help="held-out rows to evaluate")
+    parser.add_argument("--repeat", type=int, default=50, help="single-row timing repetitions")
+    parser.add_argument("--output", help="also write the report as JSON to this path")
+    args = parser.parse_args()
+
+    report = run_benchmark(args.rows, args.repeat)
+
+    print(f"\nHeld-out rows: {report['rows']}")
+    print(f"Escalation margins: {report['escalationMargins']}, disagreement limit: {report['disagreementLimit']:.4f}")
+    print("Single-row model cost (ms): " +
+          ", ".join(f"{name}={cost:.3f}" for name, cost in report["singleRowCostMs"].items()))
+    print(f"\n{'tier':<10}{'escalated':>10}{'avg cost ms':>13}{'decisions=full':>16}"
+          f"{'mse coll':>10}{'mse cong':>10}{'mse debr':>10}")
+    for tier, stats in report["tiers"].items():
+        mse = stats["mse"]
+        print(f"{tier:<10}{stats['escalationRate']:>10.1%}{stats['averageCostMs']:>13.3f}"
+              f"{stats['decisionAgreementWithFull']:>16.1%}"
+              f"{mse['collision']:>10.4g}{mse['congestion']:>10.4g}{mse['debris']:>10.4g}")
+    legacy = report["equalWeightFullMse"]
+    print(f"{'equal /3':<10}{'':>10}{'':>13}{'':>16}"
+          f"{legacy['collision']:>10.4g}{legacy['congestion']:>10.4g}{legacy['debris']:>10.4g}")
+    if "compiledForest" in report:
+        forest = report["compiledForest"]
+        print(f"\nCompiled forest: {forest['compiledSingleRowMs']:.3f} ms/row vs scikit-learn "
+              f"{forest['sklearnSingleRowMs']:.3f} ms/row (max abs diff {forest['maxAbsDiffFromSklearn']:.2e})")
+
+    if args.output:
+        with open(args.output, "w") as output:
+            json.dump(report, output, indent=2)
+        print(f"\nReport written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
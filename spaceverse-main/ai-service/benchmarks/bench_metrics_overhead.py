@@ -0,0 +1,65 @@
+"""
+Metrics Overhead Benchmark
+--------------------------
+
+Measures the per-request cost of the instrumentation added to the AI
+service: the request counter and latency histogram recorded by
+MetricsMiddleware plus one inference histogram per model call (five for a
+full ensemble prediction), and the cost of rendering /metrics.
+
+Usage:
+    python benchmarks/bench_metrics_overhead.py [--iterations 100000]
+"""
+
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import metrics  # noqa: E402
+
+MODELS = ("random_forest", "linear", "lstm", "debris", "ppo")
+
+
+def instrumented_request():
+    """Everything the service records for one real-time prediction"""
+    for model in MODELS:
+        with metrics.time_model(model):
+            pass
+    metrics.REQUEST_DURATION.observe(0.012, endpoint="/ai/real-time-prediction")
+    metrics.REQUESTS_TOTAL.inc(endpoint="/ai/real-time-prediction", method="POST", status="200")
+
+
+def run_benchmark(iterations=100000):
+    """Return per-request instrumentation cost and /metrics render time"""
+    start = time.perf_counter()
+    for _ in range(iterations):
+        instrumented_request()
+    per_request_us = (time.perf_counter() - start) / iterations * 1e6
+
+    start = time.perf_counter()
+    body = metrics.render_metrics()
+    render_ms = (time.perf_counter() - start) * 1000
+
+    return {
+        "per_request_us": per_request_us,
+        "render_ms": render_ms,
+        "render_bytes": len(body),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark AI service metrics overhead")
+    parser.add_argument("--iterations", type=int, default=100000, help="Simulated requests")
+    args = parser.parse_args()
+
+    result = run_benchmark(args.iterations)
+    print(f"Instrumentation per request: {result['per_request_us']:.2f} us "
+          f"({len(MODELS)} model timers + request counter/histogram)")
+    print(f"Rendering /metrics: {result['render_ms']:.2f} ms ({result['render_bytes']} bytes)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,97 @@
+"""
+Wire Protocol Benchmark
+-----------------------
+
+Compares encode/decode cost and payload size of a large float response
+between today's path (Pydantic model -> jsonable_encoder -> json.dumps, as
+FastAPI's JSONResponse does) and the negotiated encoders in wire_protocol.
+
+Usage:
+    python benchmarks/bench_wire_protocol.py [--rows 10000] [--repeat 20]
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+from typing import List
+
+import numpy as np
+from fastapi.encoders import jsonable_encoder
+from pydantic import BaseModel
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import wire_protocol  # noqa: E402
+
+
+class BatchPredictionResponse(BaseModel):
+    """Shape of a typical batch response: one float list per target"""
+    collisionRiskPercentage: List[float]
+    orbitalCongestionIncrease: List[float]
+    secondaryDebrisProbability: List[float]
+
+
+def time_call(fn, repeat):
+    """Return the best wall time of ``repeat`` calls in milliseconds"""
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    return best * 1000
+
+
+def run_benchmark(rows=10000, repeat=20):
+    """Run the encode/decode comparison and return a list of result dicts"""
+    rng = np.random.default_rng(42)
+    matrix = rng.uniform(0, 100, size=(rows, 3))
+    columns = list(BatchPredictionResponse.model_fields)
+    arrays = {name: matrix[:, i] for i, name in enumerate(columns)}
+
+    def baseline_encode():
+        model = BatchPredictionResponse(**{name: values.tolist() for name, values in arrays.items()})
+        return json.dumps(jsonable_encoder(model), ensure_ascii=False, allow_nan=False,
+                          separators=(",", ":")).encode("utf-8")
+
+    encoders = [("json (pydantic + stdlib, today)", baseline_encode, json.loads)]
+    encoders.append(("json (orjson)" if wire_protocol.ORJSON_AVAILABLE else "json (stdlib fallback)",
+                     lambda: wire_protocol.encode_json(arrays), wire_protocol.decode_json))
+    if wire_protocol.MSGPACK_AVAILABLE:
+        encoders.append(("msgpack", lambda: wire_protocol.encode_msgpack(arrays), wire_protocol.decode_msgpack))
+    encoders.append(("float32 raw", lambda: wire_protocol.encode_float32(matrix),
+                     lambda body: wire_protocol.decode_float32(body, (rows, 3))))
+
+    results = []
+    for name, encode, decode in encoders:
+        body = encode()
+        results.append({
+            "format": name,
+            "bytes": len(body),
+            "encode_ms": time_call(encode, repeat),
+            "decode_ms": time_call(lambda: decode(body), repeat),
+        })
+
+    baseline = results[0]
+    for result in results:
+        result["encode_speedup"] = baseline["encode_ms"] / max(result["encode_ms"], 1e-9)
+        result["size_ratio"] = result["bytes"] / baseline["bytes"]
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark AI service response encoders")
+    parser.add_argument("--rows", type=int, default=10000, help="Rows in the float response")
+    parser.add_argument("--repeat", type=int, default=20, help="Repetitions per measurement")
+    args = parser.parse_args()
+
+    print(f"Encoding a {args.rows} x 3 float response ({args.repeat} repeats, best time)")
+    print(f"{'format':<34}{'bytes':>12}{'encode ms':>12}{'decode ms':>12}{'speedup':>10}{'size':>8}")
+    for r in run_benchmark(args.rows, args.repeat):
+        print(f"{r['format']:<34}{r['bytes']:>12}{r['encode_ms']:>12.2f}{r['decode_ms']:>12.2f}"
+              f"{r['encode_speedup']:>9.1f}x{r['size_ratio']:>8.2f}")
+
+
+if __name__ == "__main__":
+    main()
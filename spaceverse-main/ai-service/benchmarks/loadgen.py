@@ -0,0 +1,350 @@
+"""
+AI Service Load Generator
+-------------------------
+
+Open-loop async load generator for finding the throughput ceiling of one AI
+service replica. Requests arrive as a Poisson process at the configured rate
+(independent of how fast the server answers), drawn from a weighted traffic
+mix:
+
+* realtime      - /ai/real-time-prediction, sent as slider bursts: a user drags
+                  a slider and fires several requests ~50 ms apart with small
+                  parameter deltas
+* impact        - /ai/simulate-impact
+* risk          - /ai/predict-risk
+* personalized  - /ai/personalized-recommendations
+* retrain       - /ai/retrain with a small synthetic training set
+
+Latency is measured from each request's scheduled arrival time, so queueing
+inside the client or server is not hidden (no coordinated omission). Every
+reporting interval prints throughput, p50/p95/p99 latency and error rate.
+Requests refused at the client's concurrency cap (``--max-inflight``) count
+as errors and are also reported on their own, so saturation never looks
+healthier than the load below it.
+
+Usage (from the ai-service directory):
+    python benchmarks/loadgen.py --spawn --rate 20,40,80 --stage-duration 30
+    python benchmarks/loadgen.py --url http://127.0.0.1:8001 --rate 50 --mix realtime=80,risk=20
+
+With --spawn a uvicorn instance is started in a scratch directory, so
+/ai/retrain traffic never overwrites the tracked model files.
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import random
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from collections import defaultdict
+
+import httpx
+import numpy as np
+
+SERVICE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+DEFAULT_MIX = "realtime=60,impact=15,risk=15,personalized=9,retrain=1"
+
+ENDPOINTS = {
+    "realtime": "/ai/real-time-prediction",
+    "impact": "/ai/simulate-impact",
+    "risk": "/ai/predict-risk",
+    "personalized": "/ai/personalized-recommendations",
+    "retrain": "/ai/retrain",
+}
+
+
+def random_parameters(rng):
+    return {
+        "altitude": round(rng.uniform(200, 2000), 1),
+        "inclination": round(rng.uniform(0, 180), 1),
+        "velocity": round(rng.uniform(6.5, 8), 2),
+        "mass": round(rng.uniform(100, 5000), 0),
+        "launchTime": "2025-01-01T00:00:00Z",
+    }
+
+
+def random_state(rng):
+    return {
+        "objectsInLEO": rng.randint(2500, 4500),
+        "objectsInMEO": rng.randint(400, 700),
+        "objectsInGEO": rng.randint(1800, 2400),
+        "averageCongestion": round(rng.uniform(0, 1), 3),
+        "collisionProbability": round(rng.uniform(0, 0.2), 4),
+    }
+
+
+def build_payload(kind, rng, parameters=None):
+    """Request body for one call of the given traffic kind"""
+    if kind == "realtime":
+        return {
+            "parameters": parameters or random_parameters(rng),
+            "currentState": random_state(rng),
+            "userId": f"load-{rng.randint(1, 500)}",
+            "userHistory": [],
+            "environmentalFactors": {},
+            "timeHorizon": 24,
+        }
+    if kind == "impact":
+        return {
+            "simulationId": f"load-{rng.randint(1, 10 ** 9)}",
+            "beforeState": random_state(rng),
+            "afterState": random_state(rng),
+            "changes": {},
+        }
+    if kind == "risk":
+        return {"eventType": rng.choice(["launch", "adjustment", "breakup"]),
+                "parameters": random_parameters(rng)}
+    if kind == "personalized":
+        return {
+            "userId": f"load-{rng.randint(1, 500)}",
+            "currentScenario": {"eventType": rng.choice(["launch", "adjustment", "breakup"])},
+            "userPreferences": {},
+            "simulationHistory": [{"eventType": "launch", "aiAnalysis": {"collisionRiskPercentage": 30}}],
+            "skillLevel": rng.choice(["beginner", "intermediate", "expert"]),
+            "riskTolerance": rng.choice(["conservative", "moderate", "aggressive"]),
+        }
+    if kind == "retrain":
+        rows = []
+        for _ in range(50):
+            p = random_parameters(rng)
+            rows.append({
+                "altitude": p["altitude"], "inclination": p["inclination"], "velocity": p["velocity"],
+                "mass": p["mass"], "objectsInLEO": rng.randint(1000, 5000),
+                "averageCongestion": rng.uniform(0, 1), "collisionRisk": rng.uniform(0, 1),
+                "congestionIncrease": rng.uniform(0, 1), "debrisProbability": rng.uniform(0, 1),
+            })
+        return {"trainingData": rows, "targetVariable": rng.choice(["collision", "congestion", "debris"])}
+    raise ValueError(f"Unknown traffic kind: {kind}")
+
+
+def parse_mix(value):
+    mix = {}
+    for entry in value.split(","):
+        name, _, weight = entry.partition("=")
+        name = name.strip()
+        if name not in ENDPOINTS:
+            raise argparse.ArgumentTypeError(f"Unknown traffic kind '{name}' (choose from {', '.join(ENDPOINTS)})")
+        mix[name] = float(weight or 1)
+    return mix
+
+
+class Recorder:
+    """Collects per-request outcomes and summarizes them per interval"""
+
+    def __init__(self):
+        self.results = []  # (finish_time, kind, latency_s, ok)
+        self.drops = []  # (time, kind) of requests refused at the client-side concurrency cap
+
+    def record(self, kind, latency, ok):
+        self.results.append((time.perf_counter(), kind, latency, ok))
+
+    def record_drop(self, kind):
+        self.drops.append((time.perf_counter(), kind))
+
+    @staticmethod
+    def summarize(results, elapsed, drops=()):
+        """Throughput and latency of the completions; dropped requests count as errors"""
+        attempts = len(results) + len(drops)
+        if not results:
+            return {"requests": 0, "throughput_rps": 0.0, "error_rate": 1.0 if drops else 0.0,
+                    "client_dropped": len(drops)}
+        latencies = np.array([latency for _, _, latency, _ in results]) * 1000
+        errors = sum(1 for _, _, _, ok in results if not ok)
+        return {
+            "requests": len(results),
+            "throughput_rps": len(results) / elapsed if elapsed > 0 else 0.0,
+            "p50_ms": float(np.percentile(latencies, 50)),
+            "p95_ms": float(np.percentile(latencies, 95)),
+            "p99_ms": float(np.percentile(latencies, 99)),
+            "error_rate": (errors + len(drops)) / attempts,
+            "client_dropped": len(drops),
+        }
+
+    def window(self, start, end):
+        """(completions, drops) within [start, end)"""
+        return ([r for r in self.results if start <= r[0] < end],
+                [d for d in self.drops if start <= d[0] < end])
+
+
+async def send(client, recorder, kind, payload, scheduled, semaphore):
+    if semaphore.locked():
+        recorder.record_drop(kind)
+        return
+    async with semaphore:
+        ok = False
+        try:
+            response = await client.post(ENDPOINTS[kind], json=payload)
+            ok = response.status_code < 400
+        except httpx.HTTPError:
+            ok = False
+        recorder.record(kind, time.perf_counter() - scheduled, ok)
+
+
+async def slider_burst(client, recorder, rng, semaphore, scheduled, burst_size):
+    """One user dragging a slider: several real-time calls with small deltas"""
+    parameters = random_parameters(rng)
+    tasks = []
+    at = scheduled
+    for i in range(burst_size):
+        parameters = dict(parameters, altitude=min(2000.0, max(200.0, parameters["altitude"] + rng.uniform(-20, 20))))
+        if i > 0:
+            at += rng.uniform(0.03, 0.08)
+        delay = at - time.perf_counter()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        tasks.append(asyncio.create_task(
+            send(client, recorder, "realtime", build_payload("realtime", rng, parameters), at, semaphore)))
+    await asyncio.gather(*tasks)
+
+
+async def run_stage(client, recorder, rate, duration, mix, rng, semaphore, burst_size, interval, stage_index):
+    """Generate open-loop Poisson arrivals at ``rate`` for ``duration`` seconds"""
+    kinds = list(mix)
+    weights = [mix[k] for k in kinds]
+    # A slider burst is several requests; scale its arrival rate so `rate` stays the request rate
+    mean_cost = sum(w * (burst_size if k == "realtime" else 1) for k, w in zip(kinds, weights)) / sum(weights)
+    arrival_rate = rate / mean_cost
+
+    tasks = []
+    start = time.perf_counter()
+    next_arrival = start
+    next_report = start + interval
+    while True:
+        next_arrival += rng.expovariate(arrival_rate)
+        if next_arrival - start >= duration:
+            break
+        now = time.perf_counter()
+        while next_report <= min(now, next_arrival):
+            report_interval(recorder, next_report - interval, next_report, stage_index, rate)
+            next_report += interval
+        if next_arrival > now:
+            await asyncio.sleep(next_arrival - now)
+        kind = rng.choices(kinds, weights)[0]
+        if kind == "realtime":
+            tasks.append(asyncio.create_task(
+                slider_burst(client, recorder, rng, semaphore, next_arrival, burst_size)))
+        else:
+            tasks.append(asyncio.create_task(
+                send(client, recorder, kind, build_payload(kind, rng), next_arrival, semaphore)))
+
+    await asyncio.gather(*tasks)
+    end = time.perf_counter()
+    while next_report <= end:
+        report_interval(recorder, next_report - interval, next_report, stage_index, rate)
+        next_report += interval
+    return start, end
+
+
+def report_interval(recorder, start, end, stage_index, rate):
+    results, drops = recorder.window(start, end)
+    summary = Recorder.summarize(results, end - start, drops)
+    if summary["requests"] == 0:
+        print(f"[stage {stage_index} @ {rate:g} rps] no completions  dropped {summary['client_dropped']}")
+        return
+    print(f"[stage {stage_index} @ {rate:g} rps] {summary['throughput_rps']:7.1f} req/s  "
+          f"p50 {summary['p50_ms']:8.1f} ms  p95 {summary['p95_ms']:8.1f} ms  "
+          f"p99 {summary['p99_ms']:8.1f} ms  errors {summary['error_rate']:6.1%}  "
+          f"dropped {summary['client_dropped']}")
+
+
+def spawn_server(port, workers):
+    """Start uvicorn in a scratch directory and wait for /health"""
+    workdir = tempfile.mkdtemp(prefix="ai-loadgen-")
+    env = dict(os.environ, PYTHONPATH=SERVICE_DIR + os.pathsep + os.environ.get("PYTHONPATH", ""))
+    process = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "ai_service:app", "--host", "127.0.0.1", "--port", str(port),
+         "--workers", str(workers), "--log-level", "warning"],
+        cwd=workdir, env=env,
+    )
+    url = f"http://127.0.0.1:{port}"
+    deadline = time.time() + 300
+    while time.time() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError("uvicorn exited during startup")
+        try:
+            if httpx.get(f"{url}/health", timeout=1).status_code == 200:
+                return process, workdir, url
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.5)
+    process.terminate()
+    raise RuntimeError("AI service did not become healthy within 300s")
+
+
+async def run_load(url, rates, stage_duration, mix, seed, max_inflight, burst_size, interval):
+    rng = random.Random(seed)
+    recorder = Recorder()
+    semaphore = asyncio.Semaphore(max_inflight)
+    limits = httpx.Limits(max_connections=max_inflight, max_keepalive_connections=max_inflight)
+    stages = []
+    async with httpx.AsyncClient(base_url=url, timeout=60, limits=limits) as client:
+        for index, rate in enumerate(rates, start=1):
+            start, end = await run_stage(client, recorder, rate, stage_duration, mix, rng, semaphore,
+                                         burst_size, interval, index)
+            results, drops = recorder.window(start, float("inf"))
+            summary = Recorder.summarize(results, end - start, drops)
+            summary["offered_rps"] = rate
+            by_kind = defaultdict(list)
+            drops_by_kind = defaultdict(list)
+            for result in results:
+                by_kind[result[1]].append(result)
+            for drop in drops:
+                drops_by_kind[drop[1]].append(drop)
+            summary["by_endpoint"] = {ENDPOINTS[k]: Recorder.summarize(by_kind[k], end - start, drops_by_kind[k])
+                                      for k in set(by_kind) | set(drops_by_kind)}
+            stages.append(summary)
+    return stages
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Open-loop load generator for the AI service")
+    parser.add_argument("--url", default="http://127.0.0.1:8001", help="Service base URL")
+    parser.add_argument("--spawn", action="store_true", help="Start a local uvicorn instance to test")
+    parser.add_argument("--port", type=int, default=8765, help="Port for --spawn")
+    parser.add_argument("--workers", type=int, default=1, help="uvicorn workers for --spawn")
+    parser.add_argument("--rate", default="20", help="Offered request rate(s) in req/s, comma-separated stages")
+    parser.add_argument("--stage-duration", type=float, default=30, help="Seconds per rate stage")
+    parser.add_argument("--mix", type=parse_mix, default=parse_mix(DEFAULT_MIX), help="Traffic mix weights")
+    parser.add_argument("--burst-size", type=int, default=8, help="Real-time requests per slider burst")
+    parser.add_argument("--max-inflight", type=int, default=512, help="Client-side concurrency cap")
+    parser.add_argument("--interval", type=float, default=5, help="Seconds between progress reports")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--output", help="Write the per-stage summary as JSON")
+    args = parser.parse_args()
+
+    rates = [float(rate) for rate in args.rate.split(",")]
+    process = workdir = None
+    url = args.url
+    if args.spawn:
+        process, workdir, url = spawn_server(args.port, args.workers)
+        print(f"Started AI service at {url} ({args.workers} worker(s))")
+
+    try:
+        stages = asyncio.run(run_load(url, rates, args.stage_duration, args.mix, args.seed,
+                                      args.max_inflight, args.burst_size, args.interval))
+    finally:
+        if process is not None:
+            process.terminate()
+            process.wait(timeout=30)
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    print("\nSummary")
+    for stage in stages:
+        print(f"  offered {stage['offered_rps']:6g} rps -> {stage['throughput_rps']:7.1f} req/s, "
+              f"p50 {stage.get('p50_ms', 0):.1f} / p95 {stage.get('p95_ms', 0):.1f} / "
+              f"p99 {stage.get('p99_ms', 0):.1f} ms, errors {stage['error_rate']:.1%}, "
+              f"client-dropped {stage['client_dropped']}")
+
+    if args.output:
+        with open(args.output, "w") as output:
+            json.dump({"url": url, "mix": args.mix, "stages": stages}, output, indent=2)
+        print(f"Results written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,369 @@
+"""
+AI Service Benchmark Suite
+--------------------------
+
+Runs the FastAPI app in-process and measures:
+
+* startup: import time of ai_service (fresh interpreter) and cold-start time
+  of initialize_models() for both the training and the saved-model path
+* per-model inference latency at batch sizes 1 / 64 / 1k / 10k
+* end-to-end latency of every endpoint through the ASGI test client (with
+  the model registry and journal in a scratch directory, so /ai/retrain
+  never touches the tracked models)
+* wire protocol and metrics instrumentation micro-benchmarks
+* peak resident memory after each section
+
+Results are written as JSON and can be compared against a saved baseline;
+the exit status is non-zero when any timing regresses beyond the tolerance.
+
+Usage (from the ai-service directory):
+    python benchmarks/run_benchmarks.py                      # run, write results/latest.json
+    python benchmarks/run_benchmarks.py --save-baseline      # also store as baseline.json
+    python benchmarks/run_benchmarks.py --tolerance 0.2      # fail on >20% slowdowns
+"""
+
+import argparse
+import json
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+import numpy as np
+
+BENCHMARK_DIR = os.path.dirname(os.path.abspath(__file__))
+SERVICE_DIR = os.path.dirname(BENCHMARK_DIR)
+sys.path.insert(0, SERVICE_DIR)
+sys.path.insert(0, BENCHMARK_DIR)
+
+try:
+    import resource
+    RESOURCE_AVAILABLE = True
+except ImportError:  # Windows
+    RESOURCE_AVAILABLE = False
+
+DEFAULT_OUTPUT = os.path.join(BENCHMARK_DIR, "results", "latest.json")
+DEFAULT_BASELINE = os.path.join(BENCHMARK_DIR, "baseline.json")
+BATCH_SIZES = (1, 64, 1000, 10000)
+
+# Representative request bodies for every endpoint
+PARAMETERS = {"altitude": 550, "inclination": 53, "velocity": 7.6, "mass": 260,
+              "launchTime": "2025-01-01T00:00:00Z"}
+STATE = {"objectsInLEO": 3400, "objectsInMEO": 520, "objectsInGEO": 2010,
+         "averageCongestion": 0.45, "collisionProbability": 0.02}
+ENDPOINT_REQUESTS = {
+    "/ai/simulate-impact": {"simulationId": "bench", "beforeState": STATE, "afterState": STATE, "changes": {}},
+    "/ai/predict-risk": {"eventType": "launch", "parameters": PARAMETERS},
+    "/ai/real-time-prediction": {
+        "parameters": PARAMETERS, "currentState": STATE, "userId": "bench",
+        "userHistory": [{"parameters": {"altitude": 500}, "aiAnalysis": {"collisionRiskPercentage": 20}}],
+        "environmentalFactors": {"geomagnetic_storm_severity": 6},
+    },
+    "/ai/personalized-recommendations": {
+        "userId": "bench", "currentScenario": {"eventType": "launch"}, "userPreferences": {},
+        "simulationHistory": [{"eventType": "launch", "aiAnalysis": {"collisionRiskPercentage": 35}}],
+        "skillLevel": "intermediate", "riskTolerance": "moderate",
+    },
+    "/ai/timeline": {
+        "timelineId": "bench", "initialState": STATE,
+        "events": [{"eventType": event_type, "parameters": PARAMETERS, "count": 12}
+                   for event_type in ("launch", "adjustment", "breakup") * 34],
+    },
+    "/ai/optimize-constellation": {
+        "altitudeRange": [500, 1200], "inclinationRange": [40, 100], "planes": 6, "satellitesPerPlane": 10,
+        "timeBudgetSeconds": 0.25,
+    },
+    "/ai/evaluate-maneuvers": {"parameters": PARAMETERS, "currentState": STATE},
+    "/ai/trajectories": {
+        "objects": [{"altitude": 400 + 30 * i, "eccentricity": 0.01 * (i % 5), "inclination": 3 * i,
+                     "raan": 7 * i} for i in range(50)],
+    },
+}
+# Read-only GET endpoints besides /health, / and /metrics; the tile is computed once, then cached
+GET_ENDPOINTS = ("/ai/models", "/ai/environment", "/ai/drift", "/ai/journal", "/ai/density",
+                 "/ai/heatmap", "/ai/heatmap/2/1/1")
+# Model promotion / shadowing and catalog updates change what later requests measure and are left out
+
+
+def peak_rss_bytes():
+    """Peak resident memory of this process so far"""
+    if not RESOURCE_AVAILABLE:
+        return None
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+def summarize(samples_s):
+    """Latency summary in milliseconds"""
+    samples_ms = np.asarray(samples_s) * 1000
+    return {
+        "mean_ms": float(samples_ms.mean()),
+        "p50_ms": float(np.percentile(samples_ms, 50)),
+        "p95_ms": float(np.percentile(samples_ms, 95)),
+        "min_ms": float(samples_ms.min()),
+    }
+
+
+def measure(fn, repeat, warmup=1):
+    for _ in range(warmup):
+        fn()
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - start)
+    return summarize(samples)
+
+
+def random_features(n_rows, seed=0):
+    """Feature rows drawn from the simulator's input ranges"""
+    rng = np.random.default_rng(seed)
+    return np.column_stack([
+        rng.uniform(200, 2000, n_rows),
+        rng.uniform(0, 180, n_rows),
+        rng.uniform(6, 8, n_rows),
+        rng.uniform(100, 5000, n_rows),
+        rng.integers(1000, 5000, n_rows),
+        rng.uniform(0, 1, n_rows),
+    ]).astype(np.float64)
+
+
+def bench_import_time():
+    """Import ai_service in a fresh interpreter"""
+    code = "import time; t = time.perf_counter(); import ai_service; print(time.perf_counter() - t)"
+    output = subprocess.run([sys.executable, "-c", code], cwd=SERVICE_DIR, capture_output=True,
+                            text=True, check=True).stdout.strip().splitlines()
+    return {"import_s": float(output[-1])}
+
+
+def bench_cold_start(ai_service, workdir):
+    """Time initialize_models() when training from scratch and when loading saved models"""
+    results = {}
+    previous_cwd = os.getcwd()
+    os.chdir(workdir)
+    try:
+        start = time.perf_counter()
+        ai_service.initialize_models()
+        results["initialize_train_s"] = time.perf_counter() - start
+
+        start = time.perf_counter()
+        ai_service.initialize_models()
+        results["initialize_load_s"] = time.perf_counter() - start
+    finally:
+        os.chdir(previous_cwd)
+    results["peak_rss_bytes"] = peak_rss_bytes()
+    return results
+
+
+def bench_models(ai_service, repeat):
+    """Per-model inference latency for each batch size"""
+    models = {
+        "random_forest": lambda X: ai_service.random_forest_model.predict(X),
+        "linear": lambda X: ai_service.linear_model.predict(X),
+        "compiled_forest": lambda X: ai_service.cascade.forest.predict(X),
+        "ensemble": lambda X: ai_service.predict_ensemble(X, "full"),
+        "cascade": lambda X: ai_service.predict_ensemble(X, "cascade"),
+    }
+    if ai_service.lstm_model is not None:
+        models["lstm"] = lambda X: ai_service.lstm_model.predict(
+            np.repeat(X[:, np.newaxis, :], 10, axis=1), batch_size=1024, verbose=0)
+    if ai_service.debris_prediction_model is not None:
+        models["debris"] = lambda X: ai_service.debris_prediction_model.predict(X, batch_size=1024, verbose=0)
+    if ai_service.rl_model is not None:
+        models["ppo"] = lambda X: ai_service.rl_model.predict(
+            np.clip(X / np.array([2000, 180, 15, 10000, 10000, 1]), 0, 1))
+
+    results = {}
+    for name, predict in models.items():
+        results[name] = {}
+        for batch_size in BATCH_SIZES:
+            X = random_features(batch_size)
+            # Large batches are slow enough that a few repeats suffice
+            runs = max(3, repeat // max(1, batch_size // 64))
+            timing = measure(lambda: predict(X), runs)
+            timing["rows_per_sec"] = batch_size / (timing["p50_ms"] / 1000) if timing["p50_ms"] else None
+            results[name][str(batch_size)] = timing
+    results["peak_rss_bytes"] = peak_rss_bytes()
+    return results
+
+
+def bench_endpoints(ai_service, repeat):
+    """End-to-end latency of every endpoint through the ASGI test client"""
+    from fastapi.testclient import TestClient
+
+    client = TestClient(ai_service.app)
+    requests_to_run = [("GET", path, None) for path in ("/health", "/", "/metrics") + GET_ENDPOINTS]
+    requests_to_run += [("POST", path, body) for path, body in ENDPOINT_REQUESTS.items()]
+
+    batch = random_features(1000, seed=1)
+    batch_body = {"altitude": batch[:, 0].tolist(), "inclination": batch[:, 1].tolist(),
+                  "velocity": batch[:, 2].tolist(), "mass": batch[:, 3].tolist(),
+                  "objectsInOrbit": batch[:, 4].tolist(), "averageCongestion": batch[:, 5].tolist()}
+    requests_to_run.append(("POST", "/ai/batch-predict", batch_body))
+
+    # Last: every run registers (and shadows, without promoting) new collision heads
+    from training_data import generate_synthetic_training_data
+
+    X, y = generate_synthetic_training_data(200, seed=3)
+    retrain_body = {"targetVariable": "collision", "trainingData": [
+        dict(zip(("altitude", "inclination", "velocity", "mass", "objectsInLEO", "averageCongestion"), row),
+             collisionRisk=target)
+        for row, target in zip(X.tolist(), y[:, 0].tolist())
+    ]}
+    requests_to_run.append(("POST", "/ai/retrain", retrain_body))
+
+    results = {}
+    for method, path, body in requests_to_run:
+        statuses = set()
+
+        def call():
+            response = client.request(method, path, json=body)
+            statuses.add(response.status_code)
+
+        timing = measure(call, repeat)
+        timing["statuses"] = sorted(statuses)
+        results[f"{method} {path}"] = timing
+    results["peak_rss_bytes"] = peak_rss_bytes()
+    return results
+
+
+def bench_serialization():
+    import bench_metrics_overhead
+    import bench_wire_protocol
+
+    return {
+        "wire_protocol": bench_wire_protocol.run_benchmark(rows=10000, repeat=10),
+        "metrics_overhead": bench_metrics_overhead.run_benchmark(iterations=20000),
+    }
+
+
+def flatten_timings(results, prefix=""):
+    """Flatten nested results into {dotted.key: value} for timing metrics only"""
+    flat = {}
+    for key, value in results.items():
+        path = f"{prefix}.{key}" if prefix else str(key)
+        if isinstance(value, dict):
+            flat.update(flatten_timings(value, path))
+        elif isinstance(value, list):
+            for item in value:
+                if isinstance(item, dict) and "format" in item:
+                    flat.update(flatten_timings(item, f"{path}.{item['format']}"))
+        elif isinstance(value, (int, float)) and (key.endswith("_ms") or key.endswith("_s") or key.endswith("_us")):
+            # p50 and single-shot timings only; tails are too noisy to gate on
+            if key not in ("min_ms", "mean_ms", "p95_ms"):
+                flat[path] = float(value)
+    return flat
+
+
+def compare_to_baseline(results, baseline, tolerance):
+    """Return (regressions, improvements) between two result documents"""
+    current = flatten_timings(results["benchmarks"])
+    previous = flatten_timings(baseline["benchmarks"])
+    regressions, improvements = [], []
+    for key, value in sorted(current.items()):
+        old = previous.get(key)
+        if not old:
+            continue
+        change = (value - old) / old
+        entry = {"metric": key, "baseline": old, "current": value, "change": change}
+        if change > tolerance:
+            regressions.append(entry)
+        elif change < -tolerance:
+            improvements.append(entry)
+    return regressions, improvements
+
+
+def run_suite(repeat, sections):
+    import ai_service
+
+    benchmarks = {}
+    workdir = tempfile.mkdtemp(prefix="ai-bench-")
+    try:
+        if "startup" in sections:
+            benchmarks["startup"] = bench_import_time()
+            benchmarks["startup"].update(bench_cold_start(ai_service, workdir))
+        else:
+            previous_cwd = os.getcwd()
+            os.chdir(workdir)
+            try:
+                ai_service.initialize_models()
+            finally:
+                os.chdir(previous_cwd)
+
+        if "models" in sections:
+            benchmarks["models"] = bench_models(ai_service, repeat)
+        if "endpoints" in sections:
+            # Registry and journal paths are relative: keep /ai/retrain's versions in the scratch directory
+            previous_cwd = os.getcwd()
+            os.chdir(workdir)
+            try:
+                benchmarks["endpoints"] = bench_endpoints(ai_service, repeat)
+            finally:
+                os.chdir(previous_cwd)
+        if "serialization" in sections:
+            benchmarks["serialization"] = bench_serialization()
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    return {
+        "timestamp": datetime.utcnow().isoformat(),
+        "environment": {
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "processor": platform.processor(),
+            "cpu_count": os.cpu_count(),
+        },
+        "repeat": repeat,
+        "benchmarks": benchmarks,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run the AI service performance benchmarks")
+    parser.add_argument("--repeat", type=int, default=20, help="Timed repetitions per measurement")
+    parser.add_argument("--sections", default="startup,models,endpoints,serialization",
+                        help="Comma-separated sections to run")
+    parser.add_argument("--output", default=DEFAULT_OUTPUT, help="Where to write the JSON results")
+    parser.add_argument("--baseline", default=DEFAULT_BASELINE, help="Baseline JSON to compare against")
+    parser.add_argument("--save-baseline", action="store_true", help="Store these results as the new baseline")
+    parser.add_argument("--tolerance", type=float, default=0.25,
+                        help="Allowed relative slowdown before a metric counts as a regression")
+    args = parser.parse_args()
+
+    sections = {section.strip() for section in args.sections.split(",") if section.strip()}
+    results = run_suite(args.repeat, sections)
+
+    os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+    with open(args.output, "w") as output:
+        json.dump(results, output, indent=2)
+    print(f"Results written to {args.output}")
+
+    if args.save_baseline:
+        with open(args.baseline, "w") as output:
+            json.dump(results, output, indent=2)
+        print(f"Baseline saved to {args.baseline}")
+        return 0
+
+    if not os.path.exists(args.baseline):
+        print("No baseline found; run with --save-baseline to create one")
+        return 0
+
+    with open(args.baseline) as baseline_file:
+        baseline = json.load(baseline_file)
+    regressions, improvements = compare_to_baseline(results, baseline, args.tolerance)
+    for entry in improvements:
+        print(f"  faster  {entry['metric']}: {entry['baseline']:.3f} -> {entry['current']:.3f} ({entry['change']:+.0%})")
+    for entry in regressions:
+        print(f"  SLOWER  {entry['metric']}: {entry['baseline']:.3f} -> {entry['current']:.3f} ({entry['change']:+.0%})")
+    if regressions:
+        print(f"{len(regressions)} metric(s) regressed by more than {args.tolerance:.0%}")
+        return 1
+    print("No regressions against baseline")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,316 @@
+"""
+Bulk Scoring
+------------
+
+Offline re-scoring of stored scenarios (analytics, leaderboard backfills)
+with the live models, without going through the HTTP API.
+
+The input (CSV, NDJSON or Parquet, with the /ai/batch-predict columns:
+altitude, inclination, velocity, mass and optionally objectsInLEO /
+objectsInMEO / objectsInGEO or objectsInOrbit, averageCongestion) is read in
+fixed-size chunks. Each chunk is validated and featurized by
+columnar.columns_to_features and scored in one vectorized pass by the same
+cascade the service uses (live registry heads, calibrated exactly like the
+service's; chunks this large take its scikit-learn forest path), then written
+as the batch-predict result columns. Chunks fan out over a pool of worker
+processes that share the read-only models (forked workers map the parent's
+memory; elsewhere each worker receives one copy), with a bounded number of
+chunks in flight so memory stays flat whatever the input size.
+
+Output (CSV or NDJSON, by extension) is appended chunk by chunk in input
+order. After every chunk a checkpoint next to the output records how far the
+run got; re-running the same command resumes from there (``--restart``
+starts over).
+
+Only the cheap and student tiers are available offline: the LSTM / debris
+escalation needs the service's deep learning stack.
+
+Usage (from the ai-service directory):
+    python bulk_score.py INPUT OUTPUT [--chunk-size 100000] [--processes 4]
+                         [--tier cheap|student] [--id-column id] [--restart]
+"""
+
+import argparse
+import collections
+import itertools
+import json
+import multiprocessing
+import os
+import resource
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+from cascade import BATCH_RESULT_COLUMNS, CascadeEnsemble, batch_results
+from columnar import ColumnarValidationError, columns_to_features
+from model_heads import HEAD_MODELS, MultiHeadModel, split_head_name
+from model_registry import ModelRegistry, ModelRegistryError
+from training_data import generate_synthetic_training_data
+
+OFFLINE_TIERS = ("cheap", "student")
+INPUT_FORMATS = {".csv": "csv", ".ndjson": "ndjson", ".jsonl": "ndjson", ".parquet": "parquet"}
+OUTPUT_FORMATS = {".csv": "csv", ".ndjson": "ndjson", ".jsonl": "ndjson"}
+
+# Set in each worker process by _init_worker
+_ensemble = None
+_tier = None
+
+
+class BulkScoringError(Exception):
+    """Raised for unusable inputs, outputs or model state"""
+
+
+def _file_format(path, formats):
+    extension = os.path.splitext(path)[1].lower()
+    if extension not in formats:
+        raise BulkScoringError(f"Unsupported file type '{extension}' for {path} "
+                               f"(expected one of {', '.join(sorted(formats))})")
+    return formats[extension]
+
+
+def load_ensemble(registry_dir, tier="cheap"):
+    """Cascade over the live registry heads, calibrated as the service calibrates it"""
+    registry = ModelRegistry(registry_dir)
+    families = {}
+    try:
+        for name in HEAD_MODELS:
+            model, _ = registry.load(name)
+            family, target = split_head_name(name)
+            families.setdefault(family, {})[target] = model
+    except ModelRegistryError as e:
+        raise BulkScoringError(f"No live model heads in {registry_dir} ({str(e)}); "
+                               f"start the AI service once to train and register them")
+
+    ensemble = CascadeEnsemble(MultiHeadModel(families["random_forest"]), MultiHeadModel(families["linear"]))
+    # Same held-out set as the service's refresh_cascade, so the stacking weights match
+    ensemble.calibrate(*generate_synthetic_training_data(1000, seed=11))
+    if tier == "student":
+        try:
+            ensemble.student, _ = registry.load("student")
+        except ModelRegistryError:
+            raise BulkScoringError("No live student model; run distillation.py or use --tier cheap")
+    return ensemble
+
+
+def read_chunks(path, chunk_size, skip_chunks=0):
+    """Yield (first row number, dict of column arrays) per chunk, skipping already scored chunks"""
+    file_format = _file_format(path, INPUT_FORMATS)
+    first_row = skip_chunks * chunk_size
+    if file_format == "csv":
+        # Skipped rows are not parsed, only scanned; a callable (unlike a range, which pandas
+        # turns into a set) keeps memory flat however far the run resumes
+        reader = pd.read_csv(path, chunksize=chunk_size,
+                             skiprows=(lambda row: 0 < row <= first_row) if first_row else None)
+        for frame in reader:
+            yield first_row, {name: frame[name].to_numpy() for name in frame.columns}
+            first_row += len(frame)
+    elif file_format == "ndjson":
+        with open(path) as lines:
+            # Blank lines are not rows: they neither count towards the resume point nor end the input
+            records = (line for line in lines if line.strip())
+            for _ in itertools.islice(records, first_row):
+                pass
+            while True:
+                batch = list(itertools.islice(records, chunk_size))
+                if not batch:
+                    return
+                frame = pd.DataFrame.from_records([json.loads(line) for line in batch])
+                yield first_row, {name: frame[name].to_numpy() for name in frame.columns}
+                first_row += len(batch)
+    else:
+        import pyarrow.parquet as pq
+
+        batches = pq.ParquetFile(path).iter_batches(batch_size=chunk_size)
+        for batch in itertools.islice(batches, skip_chunks, None):
+            yield first_row, {name: column.to_numpy(zero_copy_only=False)
+                              for name, column in zip(batch.schema.names, batch.columns)}
+            first_row += batch.num_rows
+
+
+def _init_worker(ensemble, tier, single_threaded=False):
+    global _ensemble, _tier
+    if single_threaded:
+        # The pool already spreads chunks over the cores; keep each forest to one thread
+        for estimator, _ in ensemble.forest_model.estimator_columns():
+            if "n_jobs" in estimator.get_params():
+                estimator.set_params(n_jobs=1)
+    _ensemble = ensemble
+    _tier = tier
+
+
+def score_chunk(first_row, columns, id_column=None):
+    """Score one chunk in the worker; returns (number of rows, result DataFrame)"""
+    ids = columns.get(id_column) if id_column else None
+    features = columns_to_features(columns)
+    results = batch_results(_ensemble.predict(features, _tier))
+    frame = pd.DataFrame(results, columns=list(BATCH_RESULT_COLUMNS))
+    frame.insert(0, id_column or "row", ids if ids is not None else np.arange(first_row, first_row + len(frame)))
+    return len(frame), frame
+
+
+class _Checkpoint:
+    """Progress of one run, rewritten atomically after every chunk"""
+
+    def __init__(self, output_path, input_path, chunk_size):
+        self.path = output_path + ".checkpoint.json"
+        self.state = {"input": os.path.abspath(input_path), "chunkSize": chunk_size,
+                      "chunks": 0, "rows": 0, "outputBytes": 0}
+
+    def load(self):
+        """Resume state of a previous run of the same job, or None"""
+        try:
+            with open(self.path) as checkpoint:
+                state = json.load(checkpoint)
+        except (OSError, ValueError):
+            return None
+        if state.get("input") != self.state["input"] or state.get("chunkSize") != self.state["chunkSize"]:
+            raise BulkScoringError(f"{self.path} belongs to a different input or chunk size; use --restart")
+        self.state = state
+        return state
+
+    def save(self, chunks, rows, output_bytes):
+        self.state.update(chunks=chunks, rows=rows, outputBytes=output_bytes)
+        temporary = self.path + ".tmp"
+        with open(temporary, "w") as checkpoint:
+            json.dump(self.state, checkpoint)
+        os.replace(temporary, self.path)
+
+    def remove(self):
+        if os.path.exists(self.path):
+            os.remove(self.path)
+
+
+def _write_frame(output, frame, output_format, header):
+    if output_format == "csv":
+        frame.to_csv(output, header=header, index=False)
+    else:
+        text = frame.to_json(orient="records", lines=True)
+        # Older pandas omit the final newline
+        output.write(text if text.endswith("\n") else text + "\n")
+
+
+class _Done:
+    """Result holder with the AsyncResult interface for in-process scoring"""
+
+    def __init__(self, value):
+        self.value = value
+
+    def get(self):
+        return self.value
+
+
+def bulk_score(input_path, output_path, ensemble, tier="cheap", chunk_size=100000, processes=1,
+               id_column=None, restart=False, progress=None):
+    """Score ``input_path`` into ``output_path``; returns a summary dict"""
+    output_format = _file_format(output_path, OUTPUT_FORMATS)
+    _file_format(input_path, INPUT_FORMATS)
+    checkpoint = _Checkpoint(output_path, input_path, chunk_size)
+    state = None if restart else checkpoint.load()
+    chunks, rows = (state["chunks"], state["rows"]) if state else (0, 0)
+
+    mode = "r+" if state and os.path.exists(output_path) else "w"
+    output = open(output_path, mode, newline="")
+    # Drop anything written after the last checkpoint (a chunk interrupted mid-write)
+    output.truncate(state["outputBytes"] if state else 0)
+    output.seek(0, os.SEEK_END)
+
+    start = time.perf_counter()
+    resumed_rows = rows
+    pool = None
+    if processes > 1:
+        method = "fork" if "fork" in multiprocessing.get_all_start_methods() else "spawn"
+        pool = multiprocessing.get_context(method).Pool(processes, initializer=_init_worker,
+                                                        initargs=(ensemble, tier, True))
+    else:
+        _init_worker(ensemble, tier)
+
+    def submit(first_row, columns):
+        if pool is None:
+            return _Done(score_chunk(first_row, columns, id_column))
+        return pool.apply_async(score_chunk, (first_row, columns, id_column))
+
+    try:
+        in_flight = collections.deque()
+        reader = read_chunks(input_path, chunk_size, skip_chunks=chunks)
+        exhausted = False
+        while in_flight or not exhausted:
+            # Keep a bounded number of chunks queued so memory does not grow with the input
+            while not exhausted and len(in_flight) < 2 * processes:
+                try:
+                    first_row, columns = next(reader)
+                except StopIteration:
+                    exhausted = True
+                    break
+                in_flight.append((first_row, submit(first_row, columns)))
+            if not in_flight:
+                break
+            first_row, pending = in_flight.popleft()
+            try:
+                count, frame = pending.get()
+            except ColumnarValidationError as e:
+                raise BulkScoringError(f"Invalid chunk starting at row {first_row}: {str(e)}")
+            _write_frame(output, frame, output_format, header=(output.tell() == 0))
+            output.flush()
+            os.fsync(output.fileno())
+            chunks += 1
+            rows += count
+            checkpoint.save(chunks, rows, output.tell())
+            if progress is not None:
+                progress(rows, time.perf_counter() - start, rows - resumed_rows)
+    finally:
+        output.close()
+        if pool is not None:
+            pool.terminate()
+            pool.join()
+
+    seconds = time.perf_counter() - start
+    checkpoint.remove()
+    return {
+        "rows": rows,
+        "scoredRows": rows - resumed_rows,
+        "resumedFromRow": resumed_rows,
+        "chunks": chunks,
+        "seconds": seconds,
+        "rowsPerSecond": (rows - resumed_rows) / seconds if seconds > 0 else 0.0,
+    }
+
+
+def _peak_rss_mb():
+    # ru_maxrss is in kilobytes on Linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("input", help="CSV, NDJSON or Parquet file of scenarios")
+    parser.add_argument("output", help="CSV or NDJSON file for the scores")
+    parser.add_argument("--chunk-size", type=int, default=100000, help="rows per chunk")
+    parser.add_argument("--processes", type=int, default=os.cpu_count() or 1, help="scoring worker processes")
+    parser.add_argument("--tier", choices=OFFLINE_TIERS, default="cheap")
+    parser.add_argument("--id-column", help="input column copied to the output to identify rows")
+    parser.add_argument("--registry", default=os.getenv("AI_MODEL_REGISTRY_DIR", "models/registry"))
+    parser.add_argument("--restart", action="store_true", help="ignore an existing checkpoint and start over")
+    args = parser.parse_args()
+
+    def progress(rows, seconds, scored):
+        print(f"\r{rows:,} rows ({scored / seconds:,.0f} rows/s)", end="", file=sys.stderr, flush=True)
+
+    try:
+        ensemble = load_ensemble(args.registry, args.tier)
+        summary = bulk_score(args.input, args.output, ensemble, args.tier, args.chunk_size,
+                             max(1, args.processes), args.id_column, args.restart, progress)
+    except BulkScoringError as e:
+        print(f"\nbulk_score: {str(e)}", file=sys.stderr)
+        return 1
+    print(file=sys.stderr)
+    resumed = f", resumed at row {summary['resumedFromRow']:,}" if summary["resumedFromRow"] else ""
+    print(f"Scored {summary['scoredRows']:,} rows in {summary['seconds']:.1f}s "
+          f"({summary['rowsPerSecond']:,.0f} rows/s, {summary['chunks']} chunks{resumed}); "
+          f"peak RSS {_peak_rss_mb():.0f} MB")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
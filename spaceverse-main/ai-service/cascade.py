@@ -0,0 +1,452 @@
+"""
+Cascade Inference
+-----------------
+
+Cost-aware ensemble serving. The cheap tier (linear model plus a random
+forest compiled into flat NumPy arrays) answers first; the expensive models
+(LSTM, debris MLP, and PPO in the endpoints) only run for rows where
+
+* the random forest and linear model disagree more than they do on all but
+  the top ``1 - AI_CASCADE_DISAGREEMENT_QUANTILE`` of held-out rows, or
+* the cheap answer lies within ``AI_CASCADE_MARGIN_SIGMAS`` held-out RMSEs
+  of a decision threshold used by ``generate_explanation`` (collision
+  0.4/0.7, congestion 0.1/0.3, debris 0.2/0.5), i.e. where the cheap tier's
+  error could change the explanation.
+
+Models are combined with non-negative stacking weights learned per target on
+held-out data instead of a fixed average. ``cascade_report`` compares the
+accuracy and average cost of each serving tier.
+
+Serving tiers: ``cheap`` (never escalate), ``cascade`` (escalate when
+warranted), ``full`` (always run every model) and ``student`` (the distilled
+single model from distillation.py, falling back to ``cheap`` when none is
+live or it was distilled from other model versions than the live ones). The
+default comes from ``AI_SERVING_TIER`` and can be overridden per request with
+``X-Serving-Tier``.
+"""
+
+import os
+import time
+from contextlib import nullcontext
+
+import numpy as np
+from scipy.optimize import nnls
+
+from metrics import Counter
+
+SERVING_TIERS = ("cheap", "cascade", "full", "student")
+DEFAULT_SERVING_TIER = os.getenv("AI_SERVING_TIER", "cascade")
+BATCH_RESULT_COLUMNS = ("collisionRiskPercentage", "orbitalCongestionIncrease",
+                        "secondaryDebrisProbability", "confidenceLevel")
+# Ensemble value -> served percentage, per target (the debris model's probability is served x100)
+RESULT_SCALES = np.array([100.0, 50.0, 25.0])
+
+# Lower/upper decision thresholds per target, as used by generate_explanation
+DECISION_THRESHOLDS = np.array([[0.4, 0.7], [0.1, 0.3], [0.2, 0.5]])
+# Ensemble value -> value generate_explanation is given: debris is explained by the served probability
+# (served percentage / 100) in every tier
+EXPLANATION_SCALES = RESULT_SCALES / np.array([100.0, 50.0, 100.0])
+# Tuned with benchmarks/bench_cascade.py: at 2 sigmas / 0.95 the cascade escalated ~43% of held-out
+# rows for no gain in served accuracy or decision agreement; these escalate ~4%
+MARGIN_SIGMAS = float(os.getenv("AI_CASCADE_MARGIN_SIGMAS", "0.25"))
+DISAGREEMENT_QUANTILE = float(os.getenv("AI_CASCADE_DISAGREEMENT_QUANTILE", "0.99"))
+# From this many rows scikit-learn's tree-by-tree predict outruns the compiled forest
+LARGE_BATCH_ROWS = int(os.getenv("AI_CASCADE_LARGE_BATCH_ROWS", "2048"))
+
+CASCADE_ROWS = Counter(
+    "ai_cascade_rows_total", "Rows served per serving tier and cascade path", ("tier", "path"),
+)
+
+
+def target_matrix(predictions, n_rows):
+    """Coerce raw model output to an (n_rows, 3) target matrix"""
+    predictions = np.asarray(predictions, dtype=np.float64).reshape(n_rows, -1)
+    if predictions.shape[1] != 3:
+        # Single-output model: mirror its one target across all three columns
+        predictions = np.repeat(predictions[:, :1], 3, axis=1)
+    return predictions
+
+
+def _untimed(name, batch_size):
+    # Module-level (not a lambda) so ensembles can be pickled to worker processes
+    return nullcontext()
+
+
+class CompiledForest:
+    """A fitted scikit-learn forest packed into flat arrays for vectorized traversal.
+
+    All trees are evaluated at once, one tree level per NumPy step, which
+    avoids the per-call validation and thread-pool dispatch that dominate
+    ``RandomForestRegressor.predict`` on single rows.
+    """
+
+    def __init__(self, feature, threshold, left, right, value, roots, depth):
+        self.feature = feature
+        self.threshold = threshold
+        self.left = left
+        self.right = right
+        self.value = value
+        self.roots = roots
+        self.depth = depth
+
+    @classmethod
+    def from_sklearn(cls, model):
+        return cls.from_heads([(model, column) for column in range(model.n_outputs_)])
+
+    @classmethod
+    def from_heads(cls, estimator_columns):
+        """Compile several forests into one: output i is column c_i of forest f_i
+
+        A forest serving several outputs (a multi-output model) is packed once.
+        Leaf values are pre-divided by the number of trees of their forest, so
+        summing over all trees yields each forest's mean.
+        """
+        n_outputs = len(estimator_columns)
+        forests = {}
+        for output, (model, column) in enumerate(estimator_columns):
+            forests.setdefault(id(model), (model, []))[1].append((output, column))
+
+        features, thresholds, lefts, rights, values, roots = [], [], [], [], [], []
+        offset = 0
+        depth = 0
+        for model, outputs in forests.values():
+            n_trees = len(model.estimators_)
+            for estimator in model.estimators_:
+                tree = estimator.tree_
+                nodes = np.arange(tree.node_count)
+                leaf = tree.children_left == -1
+                # Leaves point at themselves so extra traversal steps are no-ops
+                lefts.append(np.where(leaf, nodes, tree.children_left) + offset)
+                rights.append(np.where(leaf, nodes, tree.children_right) + offset)
+                features.append(np.where(leaf, 0, tree.feature))
+                thresholds.append(np.where(leaf, np.inf, tree.threshold))
+                tree_values = np.zeros((tree.node_count, n_outputs))
+                for output, column in outputs:
+                    tree_values[:, output] = tree.value[:, column, 0] / n_trees
+                values.append(tree_values)
+                roots.append(offset)
+                offset += tree.node_count
+                depth = max(depth, tree.max_depth)
+        return cls(
+            np.concatenate(features).astype(np.intp),
+            np.concatenate(thresholds),
+            np.concatenate(lefts).astype(np.intp),
+            np.concatenate(rights).astype(np.intp),
+            np.concatenate(values),
+            np.array(roots, dtype=np.intp),
+            depth,
+        )
+
+    def predict(self, X):
+        # Trees split on float32 inputs; compare the same way for identical results
+        X = np.asarray(X, dtype=np.float32)
+        rows = np.arange(X.shape[0])
+        node = np.repeat(self.roots[:, np.newaxis], X.shape[0], axis=1)
+        for _ in range(self.depth):
+            go_left = X[rows, self.feature[node]] <= self.threshold[node]
+            node = np.where(go_left, self.left[node], self.right[node])
+        return self.value[node].sum(axis=0)
+
+
+class CompiledLinear:
+    """Linear model(s) evaluated as a single matrix product"""
+
+    def __init__(self, coef, intercept):
+        self.coef = coef
+        self.intercept = intercept
+
+    @classmethod
+    def from_sklearn(cls, model):
+        return cls(np.atleast_2d(model.coef_).T, np.atleast_1d(model.intercept_))
+
+    @classmethod
+    def from_heads(cls, estimator_columns):
+        """One (6, n_outputs) product for output i = column c_i of linear model m_i"""
+        return cls(
+            np.column_stack([np.atleast_2d(model.coef_)[column] for model, column in estimator_columns]),
+            np.array([np.atleast_1d(model.intercept_)[column] for model, column in estimator_columns]),
+        )
+
+    def predict(self, X):
+        return X @ self.coef + self.intercept
+
+
+class CheapScorer:
+    """Picklable cheap-tier ensemble (compiled forest + linear, stacked), for worker processes"""
+
+    def __init__(self, forest, linear, weights):
+        self.forest = forest
+        self.linear = linear
+        self.weights = weights
+
+    def predict(self, features):
+        n_rows = features.shape[0]
+        return (target_matrix(self.forest.predict(features), n_rows) * self.weights[0] +
+                target_matrix(self.linear.predict(features), n_rows) * self.weights[1])
+
+
+def learn_stacking_weights(predictions, y):
+    """Non-negative least-squares weights per target; returns (n_models, 3)"""
+    y = target_matrix(y, len(y))
+    weights = np.empty((len(predictions), y.shape[1]))
+    for target in range(y.shape[1]):
+        design = np.column_stack([p[:, target] for p in predictions])
+        weights[:, target], _ = nnls(design, y[:, target])
+    return weights
+
+
+def escalation_mask(rf_predictions, lr_predictions, cheap_predictions, margins, disagreement_limit):
+    """Rows whose cheap-tier answer is not trustworthy enough to serve"""
+    disagreement = np.abs(rf_predictions - lr_predictions).max(axis=1) > disagreement_limit
+    thresholds = DECISION_THRESHOLDS / EXPLANATION_SCALES[:, np.newaxis]
+    distance = np.abs(cheap_predictions[:, :, np.newaxis] - thresholds[np.newaxis, :, :])
+    near_threshold = (distance < margins[np.newaxis, :, np.newaxis]).any(axis=(1, 2))
+    return disagreement | near_threshold
+
+
+class CascadeEnsemble:
+    """Cheap-first ensemble escalating ambiguous rows to the expensive models
+
+    ``forest_model`` and ``linear_model`` are fitted scikit-learn models or
+    per-target ``MultiHeadModel``s.
+
+    ``lstm_predict`` and ``debris_predict`` take an (m, 6) feature matrix and
+    return (m, 3) targets / (m,) probabilities, or None when the model is
+    unavailable or failed. ``model_timer(name, batch_size)`` wraps each model
+    call (metrics, tracing).
+    """
+
+    def __init__(self, forest_model, linear_model, lstm_predict=None, debris_predict=None, model_timer=None):
+        # Per-target heads (model_heads.MultiHeadModel) compile into one model per family
+        self.forest_model = forest_model
+        if hasattr(forest_model, "estimator_columns"):
+            self.forest = CompiledForest.from_heads(forest_model.estimator_columns())
+        else:
+            self.forest = CompiledForest.from_sklearn(forest_model)
+        if hasattr(linear_model, "estimator_columns"):
+            self.linear = CompiledLinear.from_heads(linear_model.estimator_columns())
+        else:
+            self.linear = CompiledLinear.from_sklearn(linear_model)
+        self.lstm_predict = lstm_predict
+        self.debris_predict = debris_predict
+        self.model_timer = model_timer or _untimed
+        # Until calibrated: plain averages, and escalate anything near a threshold
+        self.cheap_weights = np.full((2, 3), 1 / 2)
+        self.full_weights = np.full((3, 3), 1 / 3)
+        self.margins = np.full(3, 0.05)
+        self.disagreement_limit = 0.1
+        # Distilled student model, attached by the service when one is live
+        self.student = None
+
+    def _cheap_models(self, features):
+        n_rows = features.shape[0]
+        with self.model_timer("random_forest", n_rows):
+            forest = self.forest_model if n_rows >= LARGE_BATCH_ROWS else self.forest
+            rf_predictions = target_matrix(forest.predict(features), n_rows)
+        with self.model_timer("linear", n_rows):
+            lr_predictions = target_matrix(self.linear.predict(features), n_rows)
+        return rf_predictions, lr_predictions
+
+    def calibrate(self, X, y):
+        """Learn stacking weights and escalation limits on held-out data"""
+        rf_predictions, lr_predictions = self._cheap_models(X)
+        self.cheap_weights = learn_stacking_weights([rf_predictions, lr_predictions], y)
+        cheap_predictions = rf_predictions * self.cheap_weights[0] + lr_predictions * self.cheap_weights[1]
+        rmse = np.sqrt(np.mean((cheap_predictions - target_matrix(y, len(y))) ** 2, axis=0))
+        self.margins = MARGIN_SIGMAS * rmse
+        self.disagreement_limit = float(np.quantile(np.abs(rf_predictions - lr_predictions).max(axis=1),
+                                                    DISAGREEMENT_QUANTILE))
+        lstm_predictions = self.lstm_predict(X) if self.lstm_predict is not None else None
+        if lstm_predictions is not None:
+            self.full_weights = learn_stacking_weights([rf_predictions, lr_predictions, lstm_predictions], y)
+        return self
+
+    def predict(self, features, tier=DEFAULT_SERVING_TIER):
+        """Score a feature matrix; returns per-model targets, the stacked ensemble and routing info
+
+        Rows that were not escalated report the random forest under "lstm"
+        (as when the LSTM is unavailable) and NaN under "debris". "cheap" is
+        the cheap-tier ensemble of every row, before escalation (None for the
+        student).
+        """
+        n_rows = features.shape[0]
+        if tier == "student":
+            if self.student is not None:
+                return self._predict_student(features)
+            tier = "cheap"
+        rf_predictions, lr_predictions = self._cheap_models(features)
+        ensemble = rf_predictions * self.cheap_weights[0] + lr_predictions * self.cheap_weights[1]
+
+        if tier == "full":
+            escalated = np.ones(n_rows, dtype=bool)
+        elif tier == "cheap":
+            escalated = np.zeros(n_rows, dtype=bool)
+        else:
+            escalated = escalation_mask(rf_predictions, lr_predictions, ensemble,
+                                        self.margins, self.disagreement_limit)
+
+        lstm_predictions = rf_predictions.copy()
+        debris = None
+        cheap = ensemble
+        if escalated.any():
+            cheap = ensemble.copy()
+            subset = features[escalated]
+            lstm_subset = self.lstm_predict(subset) if self.lstm_predict is not None else None
+            if lstm_subset is not None:
+                lstm_predictions[escalated] = lstm_subset
+                ensemble[escalated] = (rf_predictions[escalated] * self.full_weights[0] +
+                                       lr_predictions[escalated] * self.full_weights[1] +
+                                       lstm_subset * self.full_weights[2])
+            debris_subset = self.debris_predict(subset) if self.debris_predict is not None else None
+            if debris_subset is not None:
+                debris = np.full(n_rows, np.nan)
+                debris[escalated] = debris_subset
+
+        n_escalated = int(escalated.sum())
+        if n_escalated:
+            CASCADE_ROWS.inc(n_escalated, tier=tier, path="escalated")
+        if n_rows - n_escalated:
+            CASCADE_ROWS.inc(n_rows - n_escalated, tier=tier, path="cheap")
+
+        return {
+            "random_forest": rf_predictions,
+            "linear": lr_predictions,
+            "lstm": lstm_predictions,
+            "ensemble": ensemble,
+            "cheap": cheap,
+            "debris": debris,
+            "escalated": escalated,
+            "tier": tier,
+        }
+
+    def cheap_predict(self, features):
+        """Cheap-tier ensemble of a feature matrix, without routing or row metrics"""
+        rf_predictions, lr_predictions = self._cheap_models(features)
+        return rf_predictions * self.cheap_weights[0] + lr_predictions * self.cheap_weights[1]
+
+    def cheap_scorer(self):
+        """Snapshot of the cheap tier that can be shipped to other processes"""
+        return CheapScorer(self.forest, self.linear, self.cheap_weights.copy())
+
+    def _predict_student(self, features):
+        """Single distilled model; it stands in for every ensemble member"""
+        n_rows = features.shape[0]
+        with self.model_timer("student", n_rows):
+            predictions = target_matrix(self.student.predict(features), n_rows)
+        CASCADE_ROWS.inc(n_rows, tier="student", path="student")
+        return {
+            "random_forest": predictions,
+            "linear": predictions,
+            "lstm": predictions,
+            "ensemble": predictions,
+            "cheap": None,
+            "debris": None,
+            "escalated": np.zeros(n_rows, dtype=bool),
+            "tier": "student",
+        }
+
+
+def batch_results(predictions):
+    """(n, 4) BATCH_RESULT_COLUMNS from CascadeEnsemble.predict output, scaled as the single-scenario endpoints"""
+    ensemble_predictions = predictions["ensemble"]
+    results = np.empty((ensemble_predictions.shape[0], 4), dtype=np.float64)
+    results[:, :3] = np.clip(np.abs(ensemble_predictions) * RESULT_SCALES, 0.0, 100.0)
+    if predictions["debris"] is not None:
+        # Debris model output for the rows it scored
+        scored = ~np.isnan(predictions["debris"])
+        results[scored, 2] = predictions["debris"][scored] * 100
+
+    # Confidence from agreement of the models on collision risk
+    model_std = np.std(np.column_stack([
+        predictions["random_forest"][:, 0],
+        predictions["linear"][:, 0],
+        predictions["lstm"][:, 0]
+    ]), axis=1)
+    results[:, 3] = np.maximum(70.0, 100.0 - model_std * 100)
+    return results
+
+
+def served_targets(predictions):
+    """(n, 3) served outputs of CascadeEnsemble.predict output, in ensemble units
+
+    What the endpoints return (debris model override included), divided back
+    by ``RESULT_SCALES``: the targets a model must predict to serve the same.
+    """
+    return batch_results(predictions)[:, :3] / RESULT_SCALES
+
+
+def decision_bands(targets):
+    """Explanation band (0 low, 1 moderate, 2 high) of each of the (n, 3) ``served_targets``"""
+    explained = targets * EXPLANATION_SCALES
+    return (explained[:, :, np.newaxis] > DECISION_THRESHOLDS[np.newaxis, :, :]).sum(axis=2)
+
+
+def _single_row_seconds(function, features, repeat):
+    timings = []
+    for i in range(repeat):
+        row = features[i % len(features):i % len(features) + 1]
+        start = time.perf_counter()
+        function(row)
+        timings.append(time.perf_counter() - start)
+    return float(np.median(timings))
+
+
+def cascade_report(cascade, X, y, forest_model=None, repeat=50):
+    """Accuracy vs. average single-row cost of each serving tier on held-out data
+
+    Errors are measured on what the endpoints serve (``batch_results``: the
+    scaled percentages, with the debris model's output on escalated rows)
+    against the labels scaled the same way. Decision agreement compares the
+    explanation bands of the served outputs.
+    """
+    y = target_matrix(y, len(y))
+    served_y = batch_results({"ensemble": y, "debris": None, "random_forest": y, "linear": y, "lstm": y})[:, :3]
+    costs = {
+        "random_forest": _single_row_seconds(cascade.forest.predict, X, repeat),
+        "linear": _single_row_seconds(cascade.linear.predict, X, repeat),
+        "lstm": _single_row_seconds(cascade.lstm_predict, X, max(5, repeat // 5)) if cascade.lstm_predict else 0.0,
+        "debris": _single_row_seconds(cascade.debris_predict, X, max(5, repeat // 5)) if cascade.debris_predict else 0.0,
+    }
+    if cascade.student is not None:
+        costs["student"] = _single_row_seconds(cascade.student.predict, X, repeat)
+    cheap_cost = costs["random_forest"] + costs["linear"]
+    expensive_cost = costs["lstm"] + costs["debris"]
+
+    full = cascade.predict(X, tier="full")
+    report = {
+        "rows": int(len(X)),
+        "singleRowCostMs": {k: v * 1000 for k, v in costs.items()},
+        "stackingWeights": {"cheap": cascade.cheap_weights.tolist(), "full": cascade.full_weights.tolist()},
+        "escalationMargins": cascade.margins.tolist(),
+        "disagreementLimit": cascade.disagreement_limit,
+        "tiers": {},
+    }
+    served_full = batch_results(full)[:, :3]
+    bands_full = decision_bands(served_full / RESULT_SCALES)
+    for tier in SERVING_TIERS:
+        if tier == "student" and cascade.student is None:
+            continue
+        result = full if tier == "full" else cascade.predict(X, tier=tier)
+        escalation_rate = float(result["escalated"].mean())
+        served = batch_results(result)[:, :3]
+        report["tiers"][tier] = {
+            "mse": dict(zip(("collision", "congestion", "debris"), np.mean((served - served_y) ** 2, axis=0).tolist())),
+            "meanAbsDiffFromFull": float(np.abs(served - served_full).mean()),
+            "decisionAgreementWithFull": float((decision_bands(served / RESULT_SCALES) ==
+                                                bands_full).all(axis=1).mean()),
+            "escalationRate": escalation_rate,
+            "averageCostMs": (costs["student"] if tier == "student" else
+                              cheap_cost + escalation_rate * expensive_cost) * 1000,
+        }
+    # Equal-weight average the service used before stacking, for comparison
+    legacy = batch_results(dict(full, ensemble=(full["random_forest"] + full["linear"] + full["lstm"]) / 3))[:, :3]
+    report["equalWeightFullMse"] = dict(zip(("collision", "congestion", "debris"),
+                                            np.mean((legacy - served_y) ** 2, axis=0).tolist()))
+    if forest_model is not None:
+        report["compiledForest"] = {
+            "maxAbsDiffFromSklearn": float(np.abs(target_matrix(forest_model.predict(X), len(X)) -
+                                                  target_matrix(cascade.forest.predict(X), len(X))).max()),
+            "sklearnSingleRowMs": _single_row_seconds(forest_model.predict, X, max(5, repeat // 5)) * 1000,
+            "compiledSingleRowMs": costs["random_forest"] * 1000,
+        }
+    return report
@@ -0,0 +1,158 @@
+"""
+Columnar Batch Input
+--------------------
+
+Parses columnar scoring payloads (one array per feature) into the contiguous
+feature matrix expected by the models, without building a Pydantic object
+per row. Payloads may arrive as JSON, MessagePack (decoded by the wire
+protocol layer) or Apache Arrow IPC streams.
+
+Range checks are vectorized and mirror the limits enforced by the Node
+gateway in routes/simulator.js.
+"""
+
+import numpy as np
+
+try:
+    import pyarrow as pa
+    ARROW_AVAILABLE = True
+except ImportError:
+    ARROW_AVAILABLE = False
+    print("pyarrow not available, Arrow IPC batch input disabled")
+
+ARROW_MEDIA_TYPES = ("application/vnd.apache.arrow.stream", "application/vnd.apache.arrow.file")
+
+# Order of columns in the model feature matrix (see prepare_features)
+FEATURE_COLUMNS = ["altitude", "inclination", "velocity", "mass", "objectsInOrbit", "averageCongestion"]
+
+# Per-column (min, max) limits, matching routes/simulator.js
+COLUMN_LIMITS = {
+    "altitude": (100, 5000),  # km
+    "inclination": (0, 180),  # degrees
+    "velocity": (0, 15),  # km/s
+    "mass": (1, 10000),  # kg
+    "objectsInLEO": (0, np.inf),
+    "objectsInMEO": (0, np.inf),
+    "objectsInGEO": (0, np.inf),
+    "objectsInOrbit": (0, np.inf),
+    "averageCongestion": (0, 1),  # 0-1 scale
+}
+
+REQUIRED_COLUMNS = ["altitude", "inclination", "velocity", "mass"]
+
+# Defaults for optional state columns, same baselines as prepare_features
+COLUMN_DEFAULTS = {
+    "objectsInLEO": 3000,
+    "objectsInMEO": 500,
+    "objectsInGEO": 2000,
+    "averageCongestion": 0.5,
+}
+
+# Maximum number of offending row indices reported per column
+MAX_REPORTED_ROWS = 10
+
+
+class ColumnarValidationError(ValueError):
+    """Raised when a columnar payload is malformed or out of range"""
+
+
+class ColumnarTooLargeError(ColumnarValidationError):
+    """Raised when a columnar payload has more rows than the caller accepts"""
+
+
+def _check_row_count(n_rows, max_rows):
+    if max_rows is not None and n_rows > max_rows:
+        raise ColumnarTooLargeError(f"Columnar payload has {n_rows} rows, at most {max_rows} are accepted")
+
+
+def read_arrow_columns(body, max_rows=None):
+    """Read an Arrow IPC stream (or file) into a dict of NumPy columns"""
+    if not ARROW_AVAILABLE:
+        raise ColumnarValidationError("Arrow IPC input requires pyarrow")
+    try:
+        reader = pa.ipc.open_stream(pa.py_buffer(body))
+    except pa.ArrowInvalid:
+        reader = pa.ipc.open_file(pa.py_buffer(body))
+    table = reader.read_all()
+    _check_row_count(table.num_rows, max_rows)
+    return {name: table.column(name).to_numpy() for name in table.column_names}
+
+
+def _column_array(columns, name, n_rows):
+    """Fetch one column as a float64 array, falling back to its default"""
+    values = columns.get(name)
+    if values is None:
+        return np.full(n_rows, COLUMN_DEFAULTS[name], dtype=np.float64)
+    try:
+        array = np.asarray(values, dtype=np.float64)
+    except (TypeError, ValueError):
+        raise ColumnarValidationError(f"Column '{name}' must contain only numbers")
+    if array.ndim != 1:
+        raise ColumnarValidationError(f"Column '{name}' must be a flat array of numbers")
+    if array.shape[0] != n_rows:
+        raise ColumnarValidationError(
+            f"Column '{name}' has {array.size} values, expected {n_rows}"
+        )
+    return array
+
+
+def _check_range(name, array):
+    """Vectorized range check (NaN fails the comparison and is rejected too)"""
+    low, high = COLUMN_LIMITS[name]
+    invalid = np.flatnonzero(~((array >= low) & (array <= high)))
+    if invalid.size:
+        rows = ", ".join(str(i) for i in invalid[:MAX_REPORTED_ROWS])
+        raise ColumnarValidationError(
+            f"Column '{name}' must be between {low} and {high}: "
+            f"{invalid.size} invalid row(s), e.g. rows {rows}"
+        )
+
+
+def columns_to_features(columns, max_rows=None):
+    """Validate columnar input and build the (n, 6) float feature matrix.
+
+    ``columns`` maps column names to equal-length sequences. The parameter
+    columns (altitude, inclination, velocity, mass) are required; the state
+    is given either as ``objectsInOrbit`` or as the per-regime counts
+    ``objectsInLEO``/``objectsInMEO``/``objectsInGEO``, with baselines used
+    for anything missing.
+    """
+    if not isinstance(columns, dict):
+        raise ColumnarValidationError("Columnar payload must be an object of feature arrays")
+
+    missing = [name for name in REQUIRED_COLUMNS if columns.get(name) is None]
+    if missing:
+        raise ColumnarValidationError(f"Missing required column(s): {', '.join(missing)}")
+
+    # Sized by the first column; every column (this one included) is checked to be 1-D below
+    try:
+        flat = np.ndim(columns["altitude"]) == 1
+    except ValueError:
+        # Ragged nested lists
+        flat = False
+    if not flat:
+        raise ColumnarValidationError("Column 'altitude' must be a flat array of numbers")
+    n_rows = len(columns["altitude"])
+    if n_rows == 0:
+        raise ColumnarValidationError("Columnar payload contains no rows")
+    _check_row_count(n_rows, max_rows)
+
+    features = np.empty((n_rows, len(FEATURE_COLUMNS)), dtype=np.float64)
+    for i, name in enumerate(REQUIRED_COLUMNS):
+        features[:, i] = _column_array(columns, name, n_rows)
+        _check_range(name, features[:, i])
+
+    if columns.get("objectsInOrbit") is not None:
+        features[:, 4] = _column_array(columns, "objectsInOrbit", n_rows)
+        _check_range("objectsInOrbit", features[:, 4])
+    else:
+        features[:, 4] = 0
+        for name in ("objectsInLEO", "objectsInMEO", "objectsInGEO"):
+            counts = _column_array(columns, name, n_rows)
+            _check_range(name, counts)
+            features[:, 4] += counts
+
+    features[:, 5] = _column_array(columns, "averageCongestion", n_rows)
+    _check_range("averageCongestion", features[:, 5])
+
+    return features
@@ -0,0 +1,332 @@
+"""
+Orbital Density Index
+---------------------
+
+Precomputed object counts and spatial density per altitude-shell x
+inclination-band cell, built from a loaded object catalog.
+
+Shells are 50 km wide in LEO, 1000 km in MEO and 100 km around the
+geostationary belt; inclination bands are 5 degrees wide. For every cell the
+index keeps the object count, the spatial density (objects per 10^9 km^3 of
+shell volume) and a congestion level: the density smoothed over the
+neighbouring shells and bands (conjunctions cross cell borders) and scaled to
+0-1 by the densest cell. Adding or removing an object only touches its cell
+and that cell's neighbours, and a query is two table lookups, so the
+congestion features of any scenario cost essentially nothing per request.
+
+Catalog formats (JSON list / ``{"objects": [...]}`` or CSV with a header);
+keys are case-insensitive:
+    id / OBJECT_ID / NORAD_CAT_ID       object identity (row number if absent)
+    altitude + inclination              mean altitude in km, degrees
+    APOGEE + PERIGEE + INCLINATION      SATCAT style, altitudes in km
+    MEAN_MOTION + INCLINATION           CelesTrak GP style, revolutions per day
+
+Configuration:
+    AI_OBJECT_CATALOG_PATH   catalog file loaded at startup (unset: no index,
+                             the fixed baselines are used and incremental
+                             updates are rejected)
+"""
+
+import csv
+import json
+import logging
+import math
+import os
+import threading
+
+import numpy as np
+
+from metrics import Gauge
+
+logger = logging.getLogger(__name__)
+
+DENSITY_CATALOG_OBJECTS = Gauge("ai_density_catalog_objects", "Objects in the orbital density index")
+
+EARTH_RADIUS_KM = 6378.137
+EARTH_MU = 398600.4418  # km^3/s^2
+# Orbit regimes, same boundaries as the simulator's classifyOrbit
+LEO_CEILING_KM = 2000
+GEO_ALTITUDE_KM = 35786
+REGIMES = ("LEO", "MEO", "GEO")
+
+# Shell edges (km): 50 km in LEO, 1000 km in MEO, 100 km across the GEO belt,
+# one graveyard shell above; the last edge is open-ended
+SHELL_EDGES = np.concatenate([
+    np.arange(0, LEO_CEILING_KM, 50),
+    np.arange(LEO_CEILING_KM, 35000, 1000),
+    np.arange(35000, 36600, 100),
+    [36600, 100000],
+]).astype(np.float64)
+N_SHELLS = len(SHELL_EDGES) - 1
+INCLINATION_BAND_DEG = 5
+N_BANDS = 180 // INCLINATION_BAND_DEG
+# Objects per this volume, so densities are readable numbers
+DENSITY_UNIT_KM3 = 1e9
+
+# Per-kilometre shell lookup, so locating a cell needs no search
+_SHELL_BY_KM = (np.searchsorted(SHELL_EDGES, np.arange(int(SHELL_EDGES[-1])), side="right") - 1).astype(np.int16)
+_SHELL_VOLUMES = 4.0 / 3.0 * math.pi * (
+    (EARTH_RADIUS_KM + SHELL_EDGES[1:]) ** 3 - (EARTH_RADIUS_KM + SHELL_EDGES[:-1]) ** 3
+) / DENSITY_UNIT_KM3
+
+
+class CatalogError(ValueError):
+    """Raised when a catalog or catalog object cannot be read"""
+
+
+def shell_index(altitude):
+    altitude = int(altitude)
+    if altitude < 0:
+        return 0
+    if altitude >= len(_SHELL_BY_KM):
+        return N_SHELLS - 1
+    return int(_SHELL_BY_KM[altitude])
+
+
+def band_index(inclination):
+    return min(N_BANDS - 1, max(0, int(inclination) // INCLINATION_BAND_DEG))
+
+
+def cell_indices(altitudes, inclinations):
+    """Vectorized (shell, band) indices for arrays of altitudes and inclinations"""
+    km = np.clip(np.asarray(altitudes, dtype=np.float64), 0, len(_SHELL_BY_KM) - 1).astype(np.intp)
+    bands = np.clip(np.asarray(inclinations, dtype=np.float64) // INCLINATION_BAND_DEG, 0, N_BANDS - 1)
+    return _SHELL_BY_KM[km].astype(np.intp), bands.astype(np.intp)
+
+
+def regime_of(altitude):
+    if altitude < LEO_CEILING_KM:
+        return "LEO"
+    if altitude < GEO_ALTITUDE_KM:
+        return "MEO"
+    return "GEO"
+
+
+def _first(record, *keys):
+    for key in keys:
+        value = record.get(key)
+        if value not in (None, ""):
+            return float(value)
+    return None
+
+
+def parse_catalog_object(record, default_id=None):
+    """``(object id, mean altitude km, inclination deg)`` of one catalog record"""
+    if not isinstance(record, dict):
+        raise CatalogError("Catalog objects must be objects")
+    record = {str(key).lower(): value for key, value in record.items()}
+    object_id = record.get("id") or record.get("object_id") or record.get("norad_cat_id") or default_id
+    if object_id in (None, ""):
+        raise CatalogError("Catalog object has no id")
+    try:
+        inclination = _first(record, "inclination")
+        altitude = _first(record, "altitude")
+        if altitude is None:
+            apogee, perigee = _first(record, "apogee"), _first(record, "perigee")
+            if apogee is not None and perigee is not None:
+                altitude = (apogee + perigee) / 2
+        if altitude is None:
+            mean_motion = _first(record, "mean_motion")
+            if mean_motion:
+                # Semi-major axis from the mean motion (rev/day)
+                n = mean_motion * 2 * math.pi / 86400
+                altitude = (EARTH_MU / n ** 2) ** (1 / 3) - EARTH_RADIUS_KM
+    except (TypeError, ValueError):
+        raise CatalogError(f"Catalog object {object_id} has non-numeric orbital elements")
+    if altitude is None or inclination is None:
+        raise CatalogError(f"Catalog object {object_id} needs an altitude (or apogee/perigee, mean motion) "
+                           f"and an inclination")
+    if not (math.isfinite(altitude) and math.isfinite(inclination)):
+        raise CatalogError(f"Catalog object {object_id} has non-finite orbital elements")
+    return str(object_id), altitude, inclination
+
+
+def load_catalog(path):
+    """Read a JSON or CSV catalog file into a list of records"""
+    try:
+        with open(path, newline="") as catalog:
+            if path.lower().endswith(".csv"):
+                return list(csv.DictReader(catalog))
+            data = json.load(catalog)
+    except (OSError, ValueError) as e:
+        raise CatalogError(f"Cannot read catalog {path}: {str(e)}")
+    if isinstance(data, dict):
+        data = data.get("objects")
+    if not isinstance(data, list):
+        raise CatalogError(f"Catalog {path} must be a list of objects or {{\"objects\": [...]}}")
+    return data
+
+
+class DensityIndex:
+    """Altitude-shell x inclination-band counts with incremental updates
+
+    Writers (catalog load, add / remove) serialize on a lock; readers take no
+    lock and see each cell either before or after an update. Add / remove
+    only apply on top of a loaded catalog: a handful of objects is no
+    population to derive congestion features from.
+    """
+
+    def __init__(self):
+        self.counts = np.zeros((N_SHELLS, N_BANDS), dtype=np.int64)
+        # Neighbourhood-smoothed density per cell and its maximum over the grid
+        self.smoothed = np.zeros((N_SHELLS, N_BANDS), dtype=np.float64)
+        self.max_smoothed = 0.0
+        self.regime_totals = dict.fromkeys(REGIMES, 0)
+        self.objects = {}  # id -> (shell, band, regime)
+        self.source = None
+        self.catalog_loaded = False
+        # Bumped by every load / update, so derived caches know when to recompute
+        self.revision = 0
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.objects)
+
+    @property
+    def loaded(self):
+        return self.catalog_loaded and bool(self.objects)
+
+    def _density(self, shells, bands):
+        return self.counts[shells, bands] / _SHELL_VOLUMES[shells, None]
+
+    def _resmooth(self, shell, band):
+        """Recompute the smoothed density of the 3x3 neighbourhood of one cell"""
+        for s in range(max(0, shell - 1), min(N_SHELLS, shell + 2)):
+            for b in range(max(0, band - 1), min(N_BANDS, band + 2)):
+                s_lo, s_hi = max(0, s - 1), min(N_SHELLS, s + 2)
+                b_lo, b_hi = max(0, b - 1), min(N_BANDS, b + 2)
+                self.smoothed[s, b] = self._density(slice(s_lo, s_hi), slice(b_lo, b_hi)).mean()
+
+    def _rebuild(self):
+        """Smoothed density of every cell at once (mean over the existing 3x3 neighbours)"""
+        density = self.counts / _SHELL_VOLUMES[:, None]
+        padded_density = np.pad(density, 1)
+        padded_cells = np.pad(np.ones_like(density), 1)
+        offsets = [(i, j) for i in range(3) for j in range(3)]
+        windows = sum(padded_density[i:i + N_SHELLS, j:j + N_BANDS] for i, j in offsets)
+        cells = sum(padded_cells[i:i + N_SHELLS, j:j + N_BANDS] for i, j in offsets)
+        self.smoothed = windows / cells
+        self.max_smoothed = float(self.smoothed.max())
+
+    def _insert(self, object_id, altitude, inclination):
+        cell = (shell_index(altitude), band_index(inclination), regime_of(altitude))
+        self.objects[object_id] = cell
+        self.counts[cell[0], cell[1]] += 1
+        self.regime_totals[cell[2]] += 1
+        return cell
+
+    def _delete(self, object_id):
+        cell = self.objects.pop(object_id, None)
+        if cell is not None:
+            self.counts[cell[0], cell[1]] -= 1
+            self.regime_totals[cell[2]] -= 1
+        return cell
+
+    def load(self, records, source=None):
+        """Replace the index with a catalog; returns the number of objects indexed"""
+        parsed = [parse_catalog_object(record, default_id=str(i)) for i, record in enumerate(records)]
+        with self._lock:
+            self.counts[:] = 0
+            self.regime_totals = dict.fromkeys(REGIMES, 0)
+            self.objects = {}
+            for object_id, altitude, inclination in parsed:
+                self._insert(object_id, altitude, inclination)
+            self._rebuild()
+            self.source = source
+            self.catalog_loaded = True
+            self.revision += 1
+        DENSITY_CATALOG_OBJECTS.set(len(self.objects))
+        return len(self.objects)
+
+    def update(self, add=(), remove=()):
+        """Add (or move) and remove objects; returns ``{"added", "removed"}`` counts"""
+        if not self.catalog_loaded:
+            raise CatalogError("No catalog loaded (set AI_OBJECT_CATALOG_PATH); objects can only be "
+                               "added to or removed from a loaded catalog")
+        parsed = [parse_catalog_object(record) for record in add]
+        touched = []
+        removed = 0
+        with self._lock:
+            for object_id in remove:
+                cell = self._delete(str(object_id))
+                if cell is not None:
+                    removed += 1
+                    touched.append(cell)
+            for object_id, altitude, inclination in parsed:
+                previous = self._delete(object_id)
+                if previous is not None:
+                    touched.append(previous)
+                touched.append(self._insert(object_id, altitude, inclination))
+            for shell, band, _ in set(touched):
+                self._resmooth(shell, band)
+            # Only a full scan finds the new maximum once the densest cell thins out
+            self.max_smoothed = float(self.smoothed.max())
+            self.revision += 1
+        DENSITY_CATALOG_OBJECTS.set(len(self.objects))
+        return {"added": len(parsed), "removed": removed}
+
+    def congestion(self, altitude, inclination):
+        """0-1 congestion of the cell containing (altitude, inclination)"""
+        if self.max_smoothed <= 0:
+            return 0.0
+        return float(self.smoothed[shell_index(altitude), band_index(inclination)] / self.max_smoothed)
+
+    def congestion_grid(self):
+        """0-1 congestion of every cell (a copy, e.g. for worker processes)"""
+        if self.max_smoothed <= 0:
+            return np.zeros_like(self.smoothed)
+        return self.smoothed / self.max_smoothed
+
+    def congestion_at(self, altitudes, inclinations):
+        """Vectorized ``congestion`` for arrays of altitudes and inclinations"""
+        if self.max_smoothed <= 0:
+            return np.zeros(np.shape(altitudes))
+        shells, bands = cell_indices(altitudes, inclinations)
+        return self.smoothed[shells, bands] / self.max_smoothed
+
+    def scenario_features(self, altitude, inclination):
+        """Catalog values for the state features prepare_features expects"""
+        return {
+            "objectsInLEO": self.regime_totals["LEO"],
+            "objectsInMEO": self.regime_totals["MEO"],
+            "objectsInGEO": self.regime_totals["GEO"],
+            "averageCongestion": self.congestion(altitude, inclination),
+        }
+
+    def cell(self, altitude, inclination):
+        """Count, density and congestion of the cell containing (altitude, inclination)"""
+        shell, band = shell_index(altitude), band_index(inclination)
+        return {
+            "altitudeShellKm": [float(SHELL_EDGES[shell]), float(SHELL_EDGES[shell + 1])],
+            "inclinationBandDeg": [band * INCLINATION_BAND_DEG, (band + 1) * INCLINATION_BAND_DEG],
+            "regime": regime_of(altitude),
+            "objects": int(self.counts[shell, band]),
+            "density": float(self.counts[shell, band] / _SHELL_VOLUMES[shell]),
+            "densityUnit": "objects per 1e9 km^3",
+            "congestion": self.congestion(altitude, inclination),
+        }
+
+    def status(self):
+        return {
+            "loaded": self.loaded,
+            "catalogLoaded": self.catalog_loaded,
+            "source": self.source,
+            "revision": self.revision,
+            "objects": len(self.objects),
+            "regimeTotals": dict(self.regime_totals),
+            "shells": N_SHELLS,
+            "inclinationBands": N_BANDS,
+        }
+
+
+def density_index_from_env():
+    """Density index over the catalog at AI_OBJECT_CATALOG_PATH (empty if unset or unreadable)"""
+    index = DensityIndex()
+    path = os.getenv("AI_OBJECT_CATALOG_PATH", "").strip()
+    if path:
+        try:
+            count = index.load(load_catalog(path), source=path)
+            logger.info(f"Density index built from {count} catalog objects in {path}")
+        except CatalogError as e:
+            logger.warning(f"Density index unavailable, using baseline congestion: {str(e)}")
+    return index
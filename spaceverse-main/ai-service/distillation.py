@@ -0,0 +1,209 @@
+"""
+Ensemble Distillation
+---------------------
+
+Compresses the serving ensemble (random forest, linear model, LSTM, stacked
+per cascade.py) into one small MLP "student" for all three targets.
+
+Pipeline: build a large synthetic query set (the training distribution plus
+uniform samples over the request validation ranges), label it with what the
+full tier serves (the stacked ensemble, with the debris model's probability
+for the debris target, see ``cascade.served_targets``), fit a scikit-learn
+MLPRegressor on the labels and export it to ``StudentModel``, a pure-NumPy
+evaluator with the input scaling folded in. The student is stored in the
+model registry as ``student`` and served with ``X-Serving-Tier: student``.
+
+Usage (from the ai-service directory, registers and promotes the student):
+    python distillation.py [--queries 50000] [--hidden 64,32] [--no-promote]
+"""
+
+import argparse
+import json
+import logging
+import sys
+import time
+
+import numpy as np
+
+from cascade import decision_bands, served_targets, target_matrix
+from columnar import COLUMN_LIMITS
+from training_data import TARGET_NAMES, generate_synthetic_training_data
+
+logger = logging.getLogger(__name__)
+
+# Upper bound for uniformly sampled object counts (the column itself is unbounded)
+MAX_QUERY_OBJECTS = 15000
+
+
+class StudentModel:
+    """ReLU MLP evaluated with NumPy; input standardization is folded in"""
+
+    def __init__(self, mean, scale, weights, biases):
+        self.mean = mean
+        self.scale = scale
+        self.weights = weights
+        self.biases = biases
+
+    @classmethod
+    def from_sklearn(cls, scaler, mlp):
+        return cls(
+            scaler.mean_.copy(),
+            scaler.scale_.copy(),
+            [w.astype(np.float64) for w in mlp.coefs_],
+            [b.astype(np.float64) for b in mlp.intercepts_],
+        )
+
+    def predict(self, X):
+        hidden = (np.asarray(X, dtype=np.float64) - self.mean) / self.scale
+        for weights, biases in zip(self.weights[:-1], self.biases[:-1]):
+            hidden = np.maximum(hidden @ weights + biases, 0.0)
+        return hidden @ self.weights[-1] + self.biases[-1]
+
+    @property
+    def nbytes(self):
+        arrays = [self.mean, self.scale] + self.weights + self.biases
+        return int(sum(array.nbytes for array in arrays))
+
+
+def generate_query_set(n_queries, seed=0):
+    """Half training-distribution rows, half uniform over the request validation ranges"""
+    n_training = n_queries // 2
+    X_training, _ = generate_synthetic_training_data(n_training, seed=seed)
+
+    rng = np.random.default_rng(seed)
+    n_uniform = n_queries - n_training
+    X_uniform = np.column_stack([
+        rng.uniform(*COLUMN_LIMITS["altitude"], n_uniform),
+        rng.uniform(*COLUMN_LIMITS["inclination"], n_uniform),
+        rng.uniform(*COLUMN_LIMITS["velocity"], n_uniform),
+        rng.uniform(*COLUMN_LIMITS["mass"], n_uniform),
+        rng.integers(0, MAX_QUERY_OBJECTS, n_uniform),
+        rng.uniform(*COLUMN_LIMITS["averageCongestion"], n_uniform),
+    ])
+    return np.vstack([X_training, X_uniform])
+
+
+def train_student(X, y, hidden_layers=(64, 32), seed=0, max_iter=200):
+    """Fit an MLP on teacher labels; returns (StudentModel, training seconds)"""
+    from sklearn.neural_network import MLPRegressor
+    from sklearn.preprocessing import StandardScaler
+
+    scaler = StandardScaler().fit(X)
+    mlp = MLPRegressor(hidden_layer_sizes=hidden_layers, activation="relu", early_stopping=True,
+                       max_iter=max_iter, random_state=seed)
+    start = time.perf_counter()
+    mlp.fit(scaler.transform(X), y)
+    return StudentModel.from_sklearn(scaler, mlp), time.perf_counter() - start
+
+
+def _single_row_ms(predict, X, repeat):
+    timings = []
+    for i in range(repeat):
+        row = X[i % len(X):i % len(X) + 1]
+        start = time.perf_counter()
+        predict(row)
+        timings.append(time.perf_counter() - start)
+    return float(np.median(timings)) * 1000
+
+
+def fidelity_report(student, teacher_predict, X, y_teacher, teacher_bytes=None, repeat=50):
+    """Agreement with the teacher plus per-prediction latency and model memory"""
+    y_student = target_matrix(student.predict(X), len(X))
+    errors = np.abs(y_student - y_teacher)
+    variance = np.var(y_teacher, axis=0)
+    bands_student = decision_bands(y_student)
+    bands_teacher = decision_bands(y_teacher)
+    return {
+        "rows": int(len(X)),
+        "meanAbsError": dict(zip(TARGET_NAMES, errors.mean(axis=0).tolist())),
+        "maxAbsError": dict(zip(TARGET_NAMES, errors.max(axis=0).tolist())),
+        "r2": dict(zip(TARGET_NAMES, (1 - (errors ** 2).mean(axis=0) / np.where(variance > 0, variance, 1)).tolist())),
+        "decisionAgreement": float((bands_student == bands_teacher).all(axis=1).mean()),
+        "studentSingleRowMs": _single_row_ms(student.predict, X, repeat),
+        "teacherSingleRowMs": _single_row_ms(teacher_predict, X, max(5, repeat // 5)),
+        "studentBytes": student.nbytes,
+        "teacherBytes": teacher_bytes,
+    }
+
+
+def ensemble_nbytes(ai_service):
+    """Approximate resident size of the teacher models' parameters"""
+    total = 0
+    forest = ai_service.cascade.forest
+    total += sum(array.nbytes for array in (forest.feature, forest.threshold, forest.left, forest.right, forest.value))
+    total += ai_service.cascade.linear.coef.nbytes + ai_service.cascade.linear.intercept.nbytes
+    for model in (ai_service.lstm_model, ai_service.debris_prediction_model):
+        if model is not None:
+            total += model.count_params() * 4  # float32 weights
+    return int(total)
+
+
+def distill(ai_service, n_queries=50000, hidden_layers=(64, 32), seed=0):
+    """Label a query set with the full tier's served outputs and train the student
+
+    Returns (student, report, metadata) without registering anything.
+    """
+    X = generate_query_set(n_queries, seed=seed)
+    teacher = lambda features: served_targets(ai_service.cascade.predict(features, "full"))  # noqa: E731
+
+    start = time.perf_counter()
+    y = teacher(X)
+    labelling_seconds = time.perf_counter() - start
+
+    # Hold out 10% of the labelled queries for the fidelity report
+    split = int(len(X) * 0.9)
+    student, train_seconds = train_student(X[:split], y[:split], hidden_layers, seed)
+    report = fidelity_report(student, teacher, X[split:], y[split:], ensemble_nbytes(ai_service))
+
+    metadata = {
+        "source": "distillation",
+        "teacherVersions": dict(ai_service.live_model_versions),
+        "teacherHasLstm": ai_service.lstm_model is not None,
+        "querySeed": seed,
+        "queries": int(n_queries),
+        "hiddenLayers": list(hidden_layers),
+        "timings": {"labelSeconds": labelling_seconds, "trainSeconds": train_seconds},
+        "fidelity": report,
+    }
+    return student, report, metadata
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--queries", type=int, default=50000, help="synthetic queries to label")
+    parser.add_argument("--hidden", default="64,32", help="comma-separated hidden layer sizes")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--no-promote", action="store_true", help="register the student without making it live")
+    parser.add_argument("--output", help="also write the fidelity report as JSON to this path")
+    args = parser.parse_args()
+
+    import ai_service
+
+    ai_service.initialize_models()
+    hidden_layers = tuple(int(size) for size in args.hidden.split(",") if size)
+    # Import by module name so the pickled student references distillation.StudentModel, not __main__
+    from distillation import distill as run_distillation
+    student, report, metadata = run_distillation(ai_service, args.queries, hidden_layers, args.seed)
+
+    version = ai_service.model_registry.register("student", student, metadata)
+    if not args.no_promote:
+        ai_service.model_registry.promote("student", version)
+
+    print(f"\nStudent {version} ({'live' if not args.no_promote else 'registered'})")
+    print(f"Fidelity on {report['rows']} held-out queries: decision agreement {report['decisionAgreement']:.1%}")
+    for target in TARGET_NAMES:
+        print(f"  {target:<11} MAE {report['meanAbsError'][target]:.4f}  max {report['maxAbsError'][target]:.4f}"
+              f"  R2 {report['r2'][target]:.4f}")
+    print(f"Latency per prediction: student {report['studentSingleRowMs']:.3f} ms, "
+          f"teacher {report['teacherSingleRowMs']:.3f} ms")
+    print(f"Parameter memory: student {report['studentBytes'] / 1024:.1f} KiB, "
+          f"teacher {report['teacherBytes'] / 1024:.1f} KiB")
+
+    if args.output:
+        with open(args.output, "w") as output:
+            json.dump(report, output, indent=2)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,257 @@
+"""
+Drift Monitoring
+----------------
+
+Streaming distribution sketches of every model input feature and output
+target, compared against the training distribution.
+
+Each series is a fixed histogram whose interior edges are the training
+distribution's quantiles (``FINE_BINS`` equal-mass bins, plus one bin below
+the training minimum and one above the maximum). Recording a batch is a
+vectorized bin lookup per value and a single ``bincount``; memory is a few hundred
+counters per series whatever the traffic volume, so the monitor stays on in
+production. Live counts are kept in two rotating windows of
+``AI_DRIFT_WINDOW_SECONDS`` (default one hour): reports cover the current and
+the previous window, so old traffic ages out.
+
+From the bins the report derives, per series:
+
+* PSI (population stability index) over training deciles: below 0.1 is
+  stable, 0.1-0.25 moderate, above 0.25 significant drift;
+* the two-sample Kolmogorov-Smirnov statistic evaluated at the bin edges
+  (exact to within one bin, 1 / FINE_BINS of the training mass) and its 5%
+  critical value;
+* live count, mean, min, max and quantiles, interpolated within bins (again
+  accurate to one training-quantile step inside the training range).
+
+PSI and KS per series are also exported as ``ai_drift_psi`` /
+``ai_drift_ks`` gauges, refreshed on every report and window rotation.
+``AI_DRIFT_MONITORING=0`` turns recording off.
+"""
+
+import math
+import os
+import threading
+import time
+
+import numpy as np
+
+from metrics import Gauge
+from training_data import FEATURE_NAMES, TARGET_NAMES
+
+FINE_BINS = 50
+PSI_BINS = 10
+QUANTILES = (0.01, 0.05, 0.25, 0.5, 0.75, 0.95, 0.99)
+# PSI cut-offs between stable / moderate / significant drift
+PSI_THRESHOLDS = (0.1, 0.25)
+# Empty-bin floor for PSI, so one empty decile does not make it infinite
+PSI_EPSILON = 1e-4
+# Below this many live observations a series is reported as insufficient
+MIN_OBSERVATIONS = 100
+# Up to this many rows a batch is binned with one broadcast comparison, beyond it per series
+BROADCAST_ROWS = 64
+# Two-sample KS critical value coefficient at alpha = 0.05
+KS_COEFFICIENT_05 = 1.358
+
+DRIFT_PSI = Gauge("ai_drift_psi", "Population stability index of live traffic vs training", ("series",))
+DRIFT_KS = Gauge("ai_drift_ks", "Kolmogorov-Smirnov statistic of live traffic vs training", ("series",))
+
+
+class _Window:
+    """Live bin counts and running moments of one time window"""
+
+    def __init__(self, total_bins, n_series):
+        self.counts = np.zeros(total_bins, dtype=np.int64)
+        self.n = 0
+        self.sum = np.zeros(n_series)
+        self.min = np.full(n_series, np.inf)
+        self.max = np.full(n_series, -np.inf)
+
+
+def _drift_status(psi, count):
+    if count < MIN_OBSERVATIONS:
+        return "insufficient"
+    if psi < PSI_THRESHOLDS[0]:
+        return "stable"
+    if psi < PSI_THRESHOLDS[1]:
+        return "moderate"
+    return "significant"
+
+
+def _bin_quantiles(counts, lower, upper, quantiles, bounds=None):
+    """Quantiles of binned data, linear within each bin; ``lower`` / ``upper`` are the bin bounds
+
+    ``bounds`` (min, max), when known, clamps estimates to the observed range.
+    """
+    total = counts.sum()
+    if total == 0:
+        return [None] * len(quantiles)
+    cumulative = np.cumsum(counts)
+    results = []
+    for q in quantiles:
+        target = q * total
+        index = min(int(np.searchsorted(cumulative, target, side="left")), len(counts) - 1)
+        before = cumulative[index] - counts[index]
+        fraction = (target - before) / counts[index] if counts[index] else 0.0
+        estimate = float(lower[index] + fraction * (upper[index] - lower[index]))
+        results.append(float(min(max(estimate, bounds[0]), bounds[1])) if bounds else estimate)
+    return results
+
+
+class DriftMonitor:
+    """Bounded-memory live histograms of features and targets against a reference sample"""
+
+    def __init__(self, window_seconds=None, enabled=None):
+        self.window_seconds = float(window_seconds if window_seconds is not None
+                                    else os.getenv("AI_DRIFT_WINDOW_SECONDS", "3600"))
+        self.enabled = (enabled if enabled is not None
+                        else os.getenv("AI_DRIFT_MONITORING", "1").lower() not in ("0", "false", "no"))
+        self.series = tuple(FEATURE_NAMES) + tuple(TARGET_NAMES)
+        self.kinds = ("feature",) * len(FEATURE_NAMES) + ("target",) * len(TARGET_NAMES)
+        self._edges = None
+        self._lock = threading.Lock()
+
+    @property
+    def ready(self):
+        return self._edges is not None
+
+    def set_reference(self, features, targets):
+        """Bin edges and reference histograms from training features (n, 6) and targets (n, 3)
+
+        Resets the live windows, whose bins no longer line up.
+        """
+        values = np.column_stack([np.asarray(features, dtype=np.float64),
+                                  np.asarray(targets, dtype=np.float64)])
+        levels = np.linspace(0, 1, FINE_BINS + 1)
+        edges, offsets, reference, groups = [], [], [], []
+        offset = 0
+        for column in values.T:
+            # Discrete or constant series collapse repeated quantiles into fewer bins
+            series_edges = np.unique(np.quantile(column, levels))
+            counts = np.bincount(np.searchsorted(series_edges, column, side="right"),
+                                 minlength=len(series_edges) + 1)
+            fractions = counts / counts.sum()
+            # Fine bins merge into training deciles (by reference mass before each bin) for PSI
+            start = np.concatenate([[0.0], np.cumsum(fractions)[:-1]])
+            edges.append(series_edges)
+            offsets.append(offset)
+            reference.append(fractions)
+            groups.append(np.minimum((start * PSI_BINS + 1e-9).astype(np.int64), PSI_BINS - 1))
+            offset += len(series_edges) + 1
+
+        with self._lock:
+            self._edges = edges
+            # Edges padded to one (series, edge) matrix for small batches
+            self._padded_edges = np.full((len(edges), max(len(e) for e in edges)), np.inf)
+            for series, series_edges in enumerate(edges):
+                self._padded_edges[series, :len(series_edges)] = series_edges
+            self._offsets = np.array(offsets, dtype=np.int64)
+            self._total_bins = offset
+            self._reference = reference
+            self._reference_size = len(values)
+            self._groups = groups
+            self._reference_bounds = values.min(axis=0), values.max(axis=0)
+            self._current = _Window(offset, len(self.series))
+            self._previous = _Window(offset, len(self.series))
+            self._window_started = time.monotonic()
+
+    def observe(self, features, targets):
+        """Record a scored batch: features (n, 6) and ensemble targets (n, 3)"""
+        if not self.enabled or self._edges is None:
+            return
+        values = np.column_stack([features, targets]).astype(np.float64, copy=False)
+        if values.shape[0] == 0:
+            return
+        if values.shape[0] <= BROADCAST_ROWS:
+            # Number of edges <= value, as searchsorted(side="right") counts them
+            bins = (values[:, :, np.newaxis] >= self._padded_edges).sum(axis=2)
+        else:
+            bins = np.empty(values.shape, dtype=np.int64)
+            for series, edges in enumerate(self._edges):
+                bins[:, series] = np.searchsorted(edges, values[:, series], side="right")
+        counts = np.bincount((bins + self._offsets).ravel(), minlength=self._total_bins)
+        batch_min, batch_max, batch_sum = values.min(axis=0), values.max(axis=0), values.sum(axis=0)
+
+        rotated = False
+        with self._lock:
+            if len(counts) != self._total_bins:
+                # The reference changed while this batch was binned
+                return
+            now = time.monotonic()
+            if now - self._window_started >= self.window_seconds:
+                # A window with no traffic in between leaves nothing to keep
+                stale = now - self._window_started >= 2 * self.window_seconds
+                self._previous = _Window(self._total_bins, len(self.series)) if stale else self._current
+                self._current = _Window(self._total_bins, len(self.series))
+                self._window_started = now
+                rotated = True
+            window = self._current
+            window.counts += counts
+            window.n += values.shape[0]
+            window.sum += batch_sum
+            np.minimum(window.min, batch_min, out=window.min)
+            np.maximum(window.max, batch_max, out=window.max)
+        if rotated:
+            self.report()
+
+    def report(self):
+        """Drift scores and live summaries per series over the current and previous window"""
+        if self._edges is None:
+            return {"enabled": self.enabled, "ready": False, "series": {}}
+        with self._lock:
+            counts = self._current.counts + self._previous.counts
+            n = self._current.n + self._previous.n
+            sums = self._current.sum + self._previous.sum
+            live_min = np.minimum(self._current.min, self._previous.min)
+            live_max = np.maximum(self._current.max, self._previous.max)
+            window_age = time.monotonic() - self._window_started
+            edges, offsets, reference, groups = self._edges, self._offsets, self._reference, self._groups
+            reference_min, reference_max = self._reference_bounds
+            reference_size = self._reference_size
+
+        series_reports = {}
+        for index, name in enumerate(self.series):
+            live = counts[offsets[index]:offsets[index] + len(edges[index]) + 1]
+            series_report = {"kind": self.kinds[index], "count": n, "psi": None, "ks": None,
+                             "ksCritical": None, "status": _drift_status(0.0, n)}
+            # Outer bins extend to the extremes seen in either sample
+            lower = np.concatenate([[min(live_min[index], reference_min[index])], edges[index]])
+            upper = np.concatenate([edges[index], [max(live_max[index], reference_max[index])]])
+            series_report["reference"] = dict(zip(
+                (f"p{round(q * 100):02d}" for q in QUANTILES),
+                _bin_quantiles(reference[index] * reference_size, lower, upper, QUANTILES,
+                               (reference_min[index], reference_max[index])),
+            ))
+            if n:
+                fractions = live / n
+                live_groups = np.bincount(groups[index], weights=fractions, minlength=PSI_BINS)
+                reference_groups = np.bincount(groups[index], weights=reference[index], minlength=PSI_BINS)
+                live_groups = np.maximum(live_groups, PSI_EPSILON)
+                reference_groups = np.maximum(reference_groups, PSI_EPSILON)
+                psi = float(np.sum((live_groups - reference_groups) * np.log(live_groups / reference_groups)))
+                ks = float(np.abs(np.cumsum(fractions) - np.cumsum(reference[index])).max())
+                series_report.update(
+                    psi=psi, ks=ks,
+                    ksCritical=KS_COEFFICIENT_05 * math.sqrt((n + reference_size) / (n * reference_size)),
+                    status=_drift_status(psi, n),
+                    live={"mean": float(sums[index] / n), "min": float(live_min[index]),
+                          "max": float(live_max[index]),
+                          **dict(zip((f"p{round(q * 100):02d}" for q in QUANTILES),
+                                     _bin_quantiles(live, lower, upper, QUANTILES,
+                                                    (live_min[index], live_max[index]))))},
+                )
+                DRIFT_PSI.set(psi, series=name)
+                DRIFT_KS.set(ks, series=name)
+            series_reports[name] = series_report
+
+        return {
+            "enabled": self.enabled,
+            "ready": True,
+            "observations": n,
+            "windowSeconds": self.window_seconds,
+            "currentWindowAgeSeconds": window_age,
+            "referenceSize": reference_size,
+            "drifting": [name for name, series_report in series_reports.items()
+                         if series_report["status"] in ("moderate", "significant")],
+            "series": series_reports,
+        }
@@ -0,0 +1,250 @@
+"""
+Environmental Data Cache
+------------------------
+
+Space-weather and environmental factors owned by the AI service.
+
+A source (local JSON snapshot, HTTP endpoint, or a static value for tests) is
+polled on a background thread; each successful fetch is normalized into the
+factor keys ``assess_environmental_impact`` understands and the resulting
+impact, including a Kp / solar-flux derived risk multiplier, is computed once
+per refresh. Requests read the latest snapshot with a single attribute access
+and never do outbound I/O. A failed refresh keeps the last good snapshot and
+marks it stale once it is older than ``AI_ENVIRONMENT_STALE_SECONDS``.
+
+Configuration:
+    AI_ENVIRONMENT_SOURCE           file path, http(s) URL, or unset/"none"
+    AI_ENVIRONMENT_REFRESH_SECONDS  refresh interval (default 300)
+    AI_ENVIRONMENT_STALE_SECONDS    age after which a snapshot is stale
+                                    (default three refresh intervals)
+    AI_ENVIRONMENT_HTTP_TIMEOUT     HTTP source timeout in seconds (default 5)
+"""
+
+import json
+import logging
+import os
+import threading
+import time
+from datetime import datetime
+
+from metrics import Counter, Gauge, record_fallback
+
+logger = logging.getLogger(__name__)
+
+ENVIRONMENT_REFRESHES = Counter(
+    "ai_environment_refresh_total", "Environmental data refreshes by outcome", ("outcome",),
+)
+ENVIRONMENT_KP_INDEX = Gauge("ai_environment_kp_index", "Planetary Kp index of the current snapshot")
+
+# Kp at which geomagnetic storms begin (G1) and the drag-driven risk increase per Kp above it
+STORM_KP = 5.0
+RISK_PER_KP = 0.06
+# Quiet-sun F10.7 flux (sfu) and the risk increase per 100 sfu above it
+QUIET_SOLAR_FLUX = 70.0
+RISK_PER_100_SFU = 0.05
+MAX_SPACE_WEATHER_MULTIPLIER = 1.5
+
+
+class EnvironmentSourceError(Exception):
+    """Raised when a source cannot produce environmental data"""
+
+
+class StaticEnvironmentSource:
+    """Fixed factors; the default when no source is configured, and a stub for tests"""
+
+    name = "static"
+
+    def __init__(self, data=None):
+        self.data = data or {}
+
+    def fetch(self):
+        return self.data
+
+
+class FileEnvironmentSource:
+    """JSON snapshot on local disk (re-read on every refresh)"""
+
+    name = "file"
+
+    def __init__(self, path):
+        self.path = path
+
+    def fetch(self):
+        try:
+            with open(self.path) as snapshot:
+                return json.load(snapshot)
+        except (OSError, ValueError) as e:
+            raise EnvironmentSourceError(f"Cannot read {self.path}: {str(e)}")
+
+
+class HttpEnvironmentSource:
+    """JSON document fetched over HTTP (e.g. the NASA DONKI GST feed)"""
+
+    name = "http"
+
+    def __init__(self, url, timeout=5.0):
+        self.url = url
+        self.timeout = timeout
+
+    def fetch(self):
+        import requests
+
+        try:
+            response = requests.get(self.url, timeout=self.timeout)
+            response.raise_for_status()
+            return response.json()
+        except (requests.RequestException, ValueError) as e:
+            raise EnvironmentSourceError(f"Cannot fetch {self.url}: {str(e)}")
+
+
+def environment_source_from_env():
+    """Build the source configured by AI_ENVIRONMENT_SOURCE"""
+    location = os.getenv("AI_ENVIRONMENT_SOURCE", "").strip()
+    if not location or location.lower() == "none":
+        return StaticEnvironmentSource()
+    if location.startswith(("http://", "https://")):
+        return HttpEnvironmentSource(location, float(os.getenv("AI_ENVIRONMENT_HTTP_TIMEOUT", "5")))
+    return FileEnvironmentSource(location)
+
+
+def _latest_kp_from_storms(storms):
+    """Most recent Kp reading from a DONKI geomagnetic storm (GST) list"""
+    readings = []
+    for storm in storms:
+        for reading in (storm or {}).get("allKpIndex") or []:
+            if reading.get("kpIndex") is not None:
+                readings.append((reading.get("observedTime") or "", float(reading["kpIndex"])))
+    return max(readings)[1] if readings else None
+
+
+def normalize_environment(payload):
+    """Map a raw payload to the factor keys used by assess_environmental_impact
+
+    Accepts a DONKI GST list or a dict with any of ``kpIndex``, ``solarFlux``
+    (F10.7), ``geomagnetic_storm_severity``, ``solar_radiation_level`` and
+    ``near_earth_objects``. Explicit factor values win over derived ones.
+    """
+    if isinstance(payload, list):
+        payload = {"kpIndex": _latest_kp_from_storms(payload)}
+    if not isinstance(payload, dict):
+        raise EnvironmentSourceError(f"Unsupported environmental payload: {type(payload).__name__}")
+
+    factors = dict(payload)
+    kp = payload.get("kpIndex")
+    if isinstance(payload.get("allKpIndex"), list):
+        kp = _latest_kp_from_storms([payload])
+    if kp is not None:
+        kp = float(kp)
+        factors["kpIndex"] = kp
+        # Kp runs 0-9; it doubles as the storm severity scale
+        factors.setdefault("geomagnetic_storm_severity", kp)
+    flux = payload.get("solarFlux")
+    if flux is not None:
+        factors["solarFlux"] = float(flux)
+        # F10.7 of ~70 (quiet) to ~300 (extreme) mapped onto a 0-10 radiation scale
+        factors.setdefault("solar_radiation_level", max(0.0, min(10.0, (float(flux) - QUIET_SOLAR_FLUX) / 23.0)))
+    return factors
+
+
+def space_weather_multiplier(kp=None, solar_flux=None):
+    """Collision-risk multiplier from geomagnetic activity and solar flux"""
+    multiplier = 1.0
+    if kp is not None:
+        multiplier += RISK_PER_KP * max(0.0, kp - STORM_KP + 1)
+    if solar_flux is not None:
+        multiplier += RISK_PER_100_SFU * max(0.0, solar_flux - QUIET_SOLAR_FLUX) / 100.0
+    return min(MAX_SPACE_WEATHER_MULTIPLIER, multiplier)
+
+
+class EnvironmentSnapshot:
+    """Immutable result of one successful refresh"""
+
+    def __init__(self, factors, impact, source, fetched_at):
+        self.factors = factors
+        self.impact = impact
+        self.source = source
+        self.fetched_at = fetched_at  # time.time()
+
+
+class EnvironmentCache:
+    """Last-good environmental snapshot, refreshed on a background thread
+
+    ``impact_fn`` maps normalized factors to ``{"risk_multiplier", "recommendations"}``;
+    its multiplier is raised to the space-weather multiplier when that is higher.
+    """
+
+    def __init__(self, source, impact_fn=None, refresh_seconds=300.0, stale_seconds=None):
+        self.source = source
+        self.impact_fn = impact_fn
+        self.refresh_seconds = refresh_seconds
+        self.stale_seconds = stale_seconds if stale_seconds is not None else 3 * refresh_seconds
+        self.snapshot = None
+        self.last_error = None
+        self.last_attempt = None
+        self._stop = threading.Event()
+        self._thread = None
+
+    def refresh(self):
+        """Fetch and precompute a new snapshot; returns True on success"""
+        self.last_attempt = time.time()
+        try:
+            factors = normalize_environment(self.source.fetch())
+            impact = dict(self.impact_fn(factors)) if self.impact_fn else {"risk_multiplier": 1.0,
+                                                                           "recommendations": []}
+            impact["recommendations"] = list(impact.get("recommendations", []))
+            impact["risk_multiplier"] = max(impact.get("risk_multiplier", 1.0),
+                                            space_weather_multiplier(factors.get("kpIndex"),
+                                                                     factors.get("solarFlux")))
+        except Exception as e:
+            self.last_error = str(e)
+            ENVIRONMENT_REFRESHES.inc(outcome="error")
+            record_fallback("environment_refresh")
+            logger.warning(f"Environmental data refresh failed, keeping last good snapshot: {str(e)}")
+            return False
+
+        # Single reference swap: readers see either the old or the new snapshot
+        self.snapshot = EnvironmentSnapshot(factors, impact, self.source.name, time.time())
+        self.last_error = None
+        ENVIRONMENT_REFRESHES.inc(outcome="success")
+        if factors.get("kpIndex") is not None:
+            ENVIRONMENT_KP_INDEX.set(factors["kpIndex"])
+        return True
+
+    def _run(self):
+        while not self._stop.wait(self.refresh_seconds):
+            self.refresh()
+
+    def start(self):
+        """Load the first snapshot synchronously, then refresh in the background"""
+        self.refresh()
+        if self._thread is None and self.refresh_seconds > 0:
+            self._thread = threading.Thread(target=self._run, name="environment-refresh", daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+            self._thread = None
+
+    def current_impact(self):
+        """Precomputed impact of the latest snapshot, or None if nothing was loaded"""
+        snapshot = self.snapshot
+        return snapshot.impact if snapshot is not None else None
+
+    def status(self):
+        snapshot = self.snapshot
+        now = time.time()
+        age = now - snapshot.fetched_at if snapshot is not None else None
+        return {
+            "available": snapshot is not None,
+            "source": self.source.name,
+            "factors": snapshot.factors if snapshot is not None else {},
+            "riskMultiplier": snapshot.impact["risk_multiplier"] if snapshot is not None else 1.0,
+            "recommendations": snapshot.impact["recommendations"] if snapshot is not None else [],
+            "fetchedAt": datetime.utcfromtimestamp(snapshot.fetched_at).isoformat() if snapshot is not None else None,
+            "ageSeconds": age,
+            "stale": snapshot is None or age > self.stale_seconds,
+            "refreshSeconds": self.refresh_seconds,
+            "lastError": self.last_error,
+        }
@@ -0,0 +1,131 @@
+"""
+Risk Heatmap Tiles
+------------------
+
+Predicted risk over an altitude x inclination grid, served as map-style tiles
+for the traffic visualization.
+
+The domain is the altitude range the models were trained on (200-2000 km)
+by the full 0-180 degree inclination range. Zoom level z splits it into
+2^z x 2^z tiles; tile (x, y) covers the x-th altitude slice and the y-th
+inclination slice (both counted from the low end), and holds
+``AI_HEATMAP_TILE_SIZE`` x ``AI_HEATMAP_TILE_SIZE`` cells (default 32).
+Every cell is scored at its centre as a scenario in a circular orbit:
+circular velocity at its altitude, the requested mass, the catalog object
+count and the congestion of its density cell (see density_index.py), or the
+service baselines when no catalog is loaded. A tile is one batched
+cheap-tier pass over all its cells.
+
+Tiles are kept in an LRU cache of ``AI_HEATMAP_CACHE_TILES`` entries keyed by
+the live model versions and the density index revision, so a retrain,
+promotion or catalog update is never served from stale tiles; the same key
+is the tile's HTTP ETag, so clients revalidate panned-back tiles for free.
+"""
+
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+from cascade import BATCH_RESULT_COLUMNS, batch_results
+from maneuvers import circular_velocity
+from metrics import Counter
+
+ALTITUDE_RANGE_KM = (200.0, 2000.0)
+INCLINATION_RANGE_DEG = (0.0, 180.0)
+TILE_SIZE = int(os.getenv("AI_HEATMAP_TILE_SIZE", "32"))
+MAX_LEVEL = int(os.getenv("AI_HEATMAP_MAX_LEVEL", "6"))
+DEFAULT_CACHE_TILES = int(os.getenv("AI_HEATMAP_CACHE_TILES", "512"))
+DEFAULT_MASS_KG = 1000.0
+# Risk columns of every cell; confidence is left out
+HEATMAP_COLUMNS = BATCH_RESULT_COLUMNS[:3]
+
+HEATMAP_TILES = Counter("ai_heatmap_tiles_total", "Heatmap tile requests by cache result", ("result",))
+
+
+class HeatmapError(ValueError):
+    """Raised for tile addresses outside the pyramid"""
+
+
+def tile_bounds(level, x, y):
+    """((altitude low, high), (inclination low, high)) covered by tile (level, x, y)"""
+    if not 0 <= level <= MAX_LEVEL:
+        raise HeatmapError(f"level must be 0-{MAX_LEVEL}")
+    tiles = 2 ** level
+    if not (0 <= x < tiles and 0 <= y < tiles):
+        raise HeatmapError(f"x and y must be 0-{tiles - 1} at level {level}")
+    bounds = []
+    for index, (low, high) in ((x, ALTITUDE_RANGE_KM), (y, INCLINATION_RANGE_DEG)):
+        step = (high - low) / tiles
+        bounds.append((low + index * step, low + (index + 1) * step))
+    return tuple(bounds)
+
+
+def tile_features(level, x, y, mass, objects_in_orbit, congestion):
+    """(TILE_SIZE^2, 6) feature matrix of the cell centres, inclination-major
+
+    Row ``i * TILE_SIZE + j`` is the cell in the i-th inclination row and
+    j-th altitude column. ``congestion`` is a scalar or a callable
+    ``(altitudes, inclinations) -> array``.
+    """
+    (altitude_low, altitude_high), (inclination_low, inclination_high) = tile_bounds(level, x, y)
+    centres = (np.arange(TILE_SIZE) + 0.5) / TILE_SIZE
+    inclinations, altitudes = np.meshgrid(
+        inclination_low + centres * (inclination_high - inclination_low),
+        altitude_low + centres * (altitude_high - altitude_low),
+        indexing="ij",
+    )
+    altitudes, inclinations = altitudes.ravel(), inclinations.ravel()
+    features = np.empty((altitudes.size, 6), dtype=np.float64)
+    features[:, 0] = altitudes
+    features[:, 1] = inclinations
+    features[:, 2] = circular_velocity(altitudes)
+    features[:, 3] = mass
+    features[:, 4] = objects_in_orbit
+    features[:, 5] = congestion(altitudes, inclinations) if callable(congestion) else congestion
+    return features
+
+
+def tile_etag(key):
+    """Stable validator for a tile cache key"""
+    return hashlib.sha1(repr(key).encode("utf-8")).hexdigest()[:20]
+
+
+class HeatmapTileCache:
+    """LRU cache of scored tiles: (TILE_SIZE^2, len(HEATMAP_COLUMNS)) float32 grids"""
+
+    def __init__(self, max_tiles=DEFAULT_CACHE_TILES):
+        self.max_tiles = max_tiles
+        self._tiles = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._tiles)
+
+    def get(self, key, features_fn, ensemble):
+        """Cached grid for ``key``, else score ``features_fn()`` in one cheap-tier pass"""
+        with self._lock:
+            grid = self._tiles.get(key)
+            if grid is not None:
+                self._tiles.move_to_end(key)
+        if grid is not None:
+            HEATMAP_TILES.inc(result="hit")
+            return grid
+        HEATMAP_TILES.inc(result="miss")
+
+        # Concurrent misses of one tile may both compute it; the results are identical
+        results = batch_results(ensemble.predict(features_fn(), "cheap"))
+        grid = np.ascontiguousarray(results[:, :len(HEATMAP_COLUMNS)], dtype=np.float32)
+        grid.flags.writeable = False
+        if self.max_tiles:
+            with self._lock:
+                self._tiles[key] = grid
+                while len(self._tiles) > self.max_tiles:
+                    self._tiles.popitem(last=False)
+        return grid
+
+    def clear(self):
+        with self._lock:
+            self._tiles.clear()
@@ -0,0 +1,109 @@
+"""
+Collision-Avoidance Maneuver Candidates
+---------------------------------------
+
+Generates a grid of candidate avoidance maneuvers for one object, turns each
+into the orbit it produces and scores all of them, plus the unchanged orbit,
+as one feature batch.
+
+Two candidate families (near-circular orbit, first-order Gauss equations):
+
+* impulsive burns: combinations of along-track, normal and radial delta-v.
+  Along-track dv changes the semi-major axis by ``2 a dv / v``; normal dv at
+  the node turns the plane by ``dv / v`` radians; radial dv leaves the
+  semi-major axis unchanged and only adds an eccentricity excursion of
+  ``a dv / v`` (reported, not a scored feature).
+* slot offsets: altitude and inclination changes reached by a two-burn
+  Hohmann transfer (``v da / 2a``) plus a plane change (``2 v sin(di / 2)``).
+
+Every candidate gets its propellant mass from the rocket equation, and the
+table is ranked by Pareto rank over (predicted collision risk, delta-v), then
+risk reduction, so efficient options come first.
+"""
+
+import numpy as np
+
+from optimizer import EARTH_MU, EARTH_RADIUS_KM, pareto_ranks
+
+STANDARD_GRAVITY = 9.80665  # m/s^2
+# Along-track x normal x radial burns (fractions of the delta-v budget)
+ALONG_TRACK_STEPS = np.linspace(-1.0, 1.0, 21)
+NORMAL_STEPS = np.linspace(-1.0, 1.0, 13)
+RADIAL_STEPS = np.linspace(-0.5, 0.5, 3)
+# Altitude (km) x inclination (degree) offsets
+ALTITUDE_OFFSETS_KM = np.array([-50, -30, -20, -10, -5, 5, 10, 20, 30, 50], dtype=np.float64)
+INCLINATION_OFFSETS_DEG = np.array([-0.2, -0.1, -0.05, 0.0, 0.05, 0.1, 0.2])
+
+
+def circular_velocity(altitude):
+    """km/s at ``altitude`` km"""
+    return np.sqrt(EARTH_MU / (EARTH_RADIUS_KM + altitude))
+
+
+def generate_candidates(altitude, inclination, max_delta_v):
+    """Candidate maneuvers as a dict of equal-length arrays
+
+    ``max_delta_v`` is in m/s; delta-v columns are in m/s, offsets in km /
+    degrees. Candidates over the budget are dropped.
+    """
+    a = EARTH_RADIUS_KM + altitude
+    v = circular_velocity(altitude)
+    budget = max_delta_v / 1000  # km/s
+
+    along, normal, radial = (grid.ravel() * budget for grid in
+                             np.meshgrid(ALONG_TRACK_STEPS, NORMAL_STEPS, RADIAL_STEPS, indexing="ij"))
+    burn_altitude = 2 * a * along / v
+    burn_inclination = np.degrees(normal / v)
+    burn_delta_v = np.sqrt(along ** 2 + normal ** 2 + radial ** 2)
+
+    offset_altitude, offset_inclination = (grid.ravel() for grid in
+                                           np.meshgrid(ALTITUDE_OFFSETS_KM, INCLINATION_OFFSETS_DEG, indexing="ij"))
+    offset_delta_v = (v * np.abs(offset_altitude) / (2 * a) +
+                      2 * v * np.sin(np.radians(np.abs(offset_inclination)) / 2))
+
+    candidates = {
+        "kind": np.concatenate([np.full(along.size, "burn"), np.full(offset_altitude.size, "offset")]),
+        "alongTrackDeltaV": np.concatenate([along, np.zeros(offset_altitude.size)]) * 1000,
+        "normalDeltaV": np.concatenate([normal, np.zeros(offset_altitude.size)]) * 1000,
+        "radialDeltaV": np.concatenate([radial, np.zeros(offset_altitude.size)]) * 1000,
+        "altitudeChange": np.concatenate([burn_altitude, offset_altitude]),
+        "inclinationChange": np.concatenate([burn_inclination, offset_inclination]),
+        "radialExcursion": np.concatenate([a * np.abs(radial) / v, np.zeros(offset_altitude.size)]),
+        "deltaV": np.concatenate([burn_delta_v, offset_delta_v]) * 1000,
+    }
+    # The all-zero burn is the baseline itself, not a maneuver
+    keep = (candidates["deltaV"] <= max_delta_v + 1e-9) & (candidates["deltaV"] > 0)
+    return {name: column[keep] for name, column in candidates.items()}
+
+
+def candidate_features(parameters, candidates, objects_in_orbit, congestion):
+    """(1 + n, 6) feature matrix: the unchanged orbit first, then every candidate
+
+    ``congestion`` is a scalar or a callable ``(altitudes, inclinations) -> array``.
+    """
+    altitudes = np.concatenate([[parameters["altitude"]], parameters["altitude"] + candidates["altitudeChange"]])
+    inclinations = np.clip(
+        np.concatenate([[parameters["inclination"]], parameters["inclination"] + candidates["inclinationChange"]]),
+        0, 180,
+    )
+    features = np.empty((altitudes.size, 6), dtype=np.float64)
+    features[:, 0] = altitudes
+    features[:, 1] = inclinations
+    # The object keeps its own speed relative to the circular speed of its orbit
+    features[:, 2] = parameters["velocity"] * circular_velocity(altitudes) / circular_velocity(parameters["altitude"])
+    features[:, 3] = parameters["mass"]
+    features[:, 4] = objects_in_orbit
+    features[:, 5] = congestion(altitudes, inclinations) if callable(congestion) else congestion
+    return features
+
+
+def propellant_mass(mass, delta_v, isp):
+    """kg of propellant for ``delta_v`` m/s (rocket equation, ``mass`` is the wet mass)"""
+    return mass * (1 - np.exp(-delta_v / (isp * STANDARD_GRAVITY)))
+
+
+def rank_candidates(baseline, predictions, candidates):
+    """Order of candidates: Pareto rank over (collision risk, delta-v), then risk reduction"""
+    risk_reduction = baseline[0] - predictions[:, 0]
+    ranks = pareto_ranks(np.column_stack([predictions[:, 0], candidates["deltaV"]]))
+    return np.lexsort((-risk_reduction, ranks)), ranks, risk_reduction
@@ -0,0 +1,266 @@
+"""
+Service Metrics
+---------------
+
+Minimal in-process Prometheus instrumentation for the AI service: counters,
+gauges and histograms with labels, rendered in the Prometheus text exposition
+format by the ``/metrics`` endpoint. Updates are a dict lookup plus a few
+arithmetic operations under a lock, so the instrumentation can stay on for
+every request.
+"""
+
+import os
+import threading
+import time
+from bisect import bisect_left
+
+try:
+    import resource
+    RESOURCE_AVAILABLE = True
+except ImportError:  # Windows
+    RESOURCE_AVAILABLE = False
+
+PROMETHEUS_CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# Latency buckets in seconds, from sub-millisecond model calls up to slow retrains
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+# Upper bounds used to bucket batch sizes into a small, fixed set of label values
+BATCH_SIZE_LABELS = ((1, "1"), (64, "64"), (1024, "1k"), (10000, "10k"))
+
+
+def batch_size_label(batch_size):
+    """Map a batch size onto a bounded set of label values"""
+    for upper, label in BATCH_SIZE_LABELS:
+        if batch_size <= upper:
+            return label
+    return "10k+"
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(labelnames, labelvalues, extra=None):
+    pairs = list(zip(labelnames, labelvalues))
+    if extra:
+        pairs.append(extra)
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in pairs) + "}"
+
+
+def _format_value(value):
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value))
+
+
+class _Metric:
+    """Base class holding per-label-set values"""
+
+    kind = "untyped"
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+        REGISTRY.append(self)
+
+    def _key(self, labels):
+        return tuple([labels.get(name, "") for name in self.labelnames])
+
+    def clear(self):
+        with self._lock:
+            self._values.clear()
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        with self._lock:
+            items = list(self._values.items())
+        for labelvalues, value in items:
+            lines.extend(self._render_sample(labelvalues, value))
+        return lines
+
+    def _render_sample(self, labelvalues, value):
+        return [f"{self.name}{_format_labels(self.labelnames, labelvalues)} {_format_value(value)}"]
+
+
+class Counter(_Metric):
+    """Monotonically increasing counter"""
+
+    kind = "counter"
+
+    def inc(self, amount=1.0, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+
+class Gauge(_Metric):
+    """Value that can go up and down"""
+
+    kind = "gauge"
+
+    def set(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = float(value)
+
+    def remove(self, **labels):
+        with self._lock:
+            self._values.pop(self._key(labels), None)
+
+
+class Histogram(_Metric):
+    """Cumulative histogram with fixed bucket upper bounds"""
+
+    kind = "histogram"
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                # [per-bucket counts (+Inf last), sum, count]
+                state = self._values[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            state[0][index] += 1
+            state[1] += value
+            state[2] += 1
+
+    def time(self, **labels):
+        """Context manager observing the wall time of the enclosed block"""
+        return _Timer(self, labels)
+
+    def _render_sample(self, labelvalues, state):
+        counts, total, count = state[0][:], state[1], state[2]
+        lines = []
+        cumulative = 0
+        for upper, bucket_count in zip(self.buckets + (float("inf"),), counts):
+            cumulative += bucket_count
+            labels = _format_labels(self.labelnames, labelvalues, ("le", _format_value(upper)))
+            lines.append(f"{self.name}_bucket{labels} {cumulative}")
+        labels = _format_labels(self.labelnames, labelvalues)
+        lines.append(f"{self.name}_sum{labels} {_format_value(total)}")
+        lines.append(f"{self.name}_count{labels} {count}")
+        return lines
+
+
+class _Timer:
+    """Lightweight timing context (cheaper than a generator-based contextmanager)"""
+
+    __slots__ = ("histogram", "labels", "start")
+
+    def __init__(self, histogram, labels):
+        self.histogram = histogram
+        self.labels = labels
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, traceback):
+        self.histogram.observe(time.perf_counter() - self.start, **self.labels)
+        return False
+
+
+REGISTRY = []
+
+REQUESTS_TOTAL = Counter(
+    "ai_http_requests_total", "HTTP requests handled, by endpoint, method and status",
+    ("endpoint", "method", "status"),
+)
+REQUEST_DURATION = Histogram(
+    "ai_http_request_duration_seconds", "HTTP request latency by endpoint", ("endpoint",),
+)
+MODEL_INFERENCE_SECONDS = Histogram(
+    "ai_model_inference_seconds", "Model inference time by model and batch size", ("model", "batch_size"),
+)
+FALLBACK_ERRORS = Counter(
+    "ai_fallback_errors_total", "Failures absorbed by a fallback path, by stage", ("stage",),
+)
+MODEL_INFO = Gauge(
+    "ai_model_info", "Currently loaded model versions (value is always 1)", ("model", "version"),
+)
+PROCESS_RESIDENT_MEMORY = Gauge(
+    "ai_process_resident_memory_bytes", "Resident memory of the service process",
+)
+PROCESS_PEAK_RESIDENT_MEMORY = Gauge(
+    "ai_process_peak_resident_memory_bytes", "Peak resident memory of the service process",
+)
+
+
+def time_model(model, batch_size=1):
+    """Context manager recording the inference time of one model call"""
+    return MODEL_INFERENCE_SECONDS.time(model=model, batch_size=batch_size_label(batch_size))
+
+
+def record_fallback(stage):
+    """Count a failure that was absorbed by a fallback path"""
+    FALLBACK_ERRORS.inc(stage=stage)
+
+
+def set_model_version(model, version):
+    """Expose the version of a loaded model, replacing any previous one"""
+    with MODEL_INFO._lock:
+        for key in [key for key in MODEL_INFO._values if key[0] == model]:
+            del MODEL_INFO._values[key]
+    MODEL_INFO.set(1, model=model, version=version)
+
+
+def _collect_process_memory():
+    try:
+        with open("/proc/self/statm") as statm:
+            resident_pages = int(statm.read().split()[1])
+        PROCESS_RESIDENT_MEMORY.set(resident_pages * os.sysconf("SC_PAGE_SIZE"))
+    except (OSError, ValueError, AttributeError):
+        pass
+    if RESOURCE_AVAILABLE:
+        # ru_maxrss is reported in kilobytes on Linux
+        PROCESS_PEAK_RESIDENT_MEMORY.set(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024)
+
+
+def render_metrics():
+    """Render every registered metric in the Prometheus text format"""
+    _collect_process_memory()
+    lines = []
+    for metric in REGISTRY:
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
+
+
+class MetricsMiddleware:
+    """ASGI middleware recording request counts and latency per route template"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        status_code = 500
+        start = time.perf_counter()
+
+        async def send_wrapper(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            route = scope.get("route")
+            # Label by route template so path parameters can't blow up cardinality
+            endpoint = route.path if route is not None else "unmatched"
+            REQUEST_DURATION.observe(time.perf_counter() - start, endpoint=endpoint)
+            REQUESTS_TOTAL.inc(endpoint=endpoint, method=scope["method"], status=str(status_code))
@@ -0,0 +1,108 @@
+"""
+Per-Target Model Heads
+----------------------
+
+The random forest and linear model are served as one independent
+single-output "head" per target (collision, congestion, debris) instead of
+one multi-output estimator. Every head is its own registry model named
+``<family>.<target>`` (e.g. ``random_forest.collision``) with its own
+versions, so retraining one target fits, validates and promotes only that
+head while the other heads keep serving unchanged.
+
+``MultiHeadModel`` presents the heads of one family as an (n, 3) predictor.
+The serving cascade compiles all heads of a family into one flat forest / one
+matrix product (see cascade.py), so inference still scores every target in a
+single batched pass.
+"""
+
+import time
+
+import numpy as np
+from sklearn.base import clone
+
+from training_data import TARGET_NAMES
+
+MODEL_FAMILIES = ("random_forest", "linear")
+
+
+def head_name(family, target):
+    return f"{family}.{target}"
+
+
+def split_head_name(name):
+    """``"random_forest.collision"`` -> ``("random_forest", "collision")``"""
+    family, _, target = name.partition(".")
+    return family, target
+
+
+HEAD_MODELS = tuple(head_name(family, target) for family in MODEL_FAMILIES for target in TARGET_NAMES)
+
+
+class OutputColumn:
+    """One output of a fitted multi-output estimator, served as a single-target head
+
+    Lets models trained before the split (registry versions, legacy files) be
+    served and versioned per target without retraining.
+    """
+
+    def __init__(self, model, column):
+        self.model = model
+        self.column = column
+
+    def predict(self, X):
+        return np.asarray(self.model.predict(X), dtype=np.float64).reshape(len(X), -1)[:, self.column]
+
+
+def estimator_column(head):
+    """The underlying fitted estimator of a head and the output column it serves"""
+    if isinstance(head, OutputColumn):
+        return head.model, head.column
+    return head, 0
+
+
+class MultiHeadModel:
+    """Per-target heads of one model family, predicting an (n, 3) target matrix"""
+
+    def __init__(self, heads):
+        self.heads = dict(heads)
+
+    def with_head(self, target, model):
+        """A copy with one head replaced; the live object is never mutated"""
+        heads = dict(self.heads)
+        heads[target] = model
+        return MultiHeadModel(heads)
+
+    def estimator_columns(self):
+        """(estimator, output column) per target, in TARGET_NAMES order"""
+        return [estimator_column(self.heads[target]) for target in TARGET_NAMES]
+
+    def predict(self, X):
+        n_rows = len(X)
+        return np.column_stack([
+            np.asarray(self.heads[target].predict(X), dtype=np.float64).reshape(n_rows)
+            for target in TARGET_NAMES
+        ])
+
+
+def output_count(model):
+    """Number of outputs of a fitted scikit-learn regressor"""
+    if hasattr(model, "n_outputs_"):
+        return int(model.n_outputs_)
+    if hasattr(model, "coef_"):
+        return np.atleast_2d(model.coef_).shape[0]
+    return None
+
+
+def heads_from_multi_output(model):
+    """Split a fitted three-output estimator into heads, or None for any other shape"""
+    if output_count(model) != len(TARGET_NAMES):
+        return None
+    return {target: OutputColumn(model, i) for i, target in enumerate(TARGET_NAMES)}
+
+
+def fit_head(base_model, X, y):
+    """Fit a fresh clone of ``base_model`` on one target column; returns (model, seconds)"""
+    model = clone(base_model)
+    start = time.perf_counter()
+    model.fit(X, np.asarray(y, dtype=np.float64).reshape(len(X)))
+    return model, time.perf_counter() - start
@@ -0,0 +1,295 @@
+"""
+Model Registry
+--------------
+
+Immutable, versioned storage for the service's scikit-learn models plus
+shadow inference for candidate versions.
+
+Layout (under ``AI_MODEL_REGISTRY_DIR``, default ``models/registry``)::
+
+    <model>/<version>/model.pkl       read-only once written
+    <model>/<version>/metadata.json   training data hash, metrics, timings
+    <model>/live.json                 pointer to the version serving traffic
+
+Versions are never overwritten: a retrain registers a new version, and only
+an explicit promote moves the live pointer. A candidate version can first be
+run in shadow mode, where a sampled fraction of live requests is re-scored on
+a background executor and the prediction deltas and latency are recorded.
+"""
+
+import hashlib
+import io
+import json
+import logging
+import os
+import random
+import stat
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+import joblib
+import numpy as np
+
+from metrics import Counter, Histogram
+from training_data import TARGET_NAMES
+
+logger = logging.getLogger(__name__)
+
+SHADOW_INFERENCE_SECONDS = Histogram(
+    "ai_shadow_inference_seconds", "Inference time of shadow candidate models", ("model", "version"),
+)
+SHADOW_ABS_DELTA = Histogram(
+    "ai_shadow_abs_delta", "Absolute difference between shadow and live predictions",
+    ("model", "target"), buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0),
+)
+SHADOW_DROPPED = Counter(
+    "ai_shadow_dropped_total", "Shadow requests skipped because the executor was saturated", ("model",),
+)
+
+
+class ModelRegistryError(Exception):
+    """Raised for unknown models/versions or invalid registry operations"""
+
+
+def training_data_hash(X, y):
+    """Stable content hash of a training set"""
+    digest = hashlib.sha256()
+    for array in (X, y):
+        array = np.ascontiguousarray(array, dtype=np.float64)
+        digest.update(str(array.shape).encode())
+        digest.update(array.tobytes())
+    return digest.hexdigest()
+
+
+def evaluate_model(model, X, y):
+    """Held-out metrics and per-row inference latency for a fitted model"""
+    start = time.perf_counter()
+    predictions = model.predict(X)
+    elapsed = time.perf_counter() - start
+    predictions = np.asarray(predictions, dtype=np.float64).reshape(len(X), -1)
+    y = np.asarray(y, dtype=np.float64).reshape(len(X), -1)
+    errors = predictions - y
+    mse = float(np.mean(errors ** 2))
+    variance = float(np.var(y))
+    return {
+        "mse": mse,
+        "r2": 1.0 - mse / variance if variance > 0 else 0.0,
+        "evaluationRows": int(len(X)),
+        "predictMicrosecondsPerRow": elapsed / max(1, len(X)) * 1e6,
+    }
+
+
+class ModelRegistry:
+    """Filesystem-backed registry of immutable model versions"""
+
+    def __init__(self, root):
+        self.root = root
+        self._lock = threading.Lock()
+
+    def _model_dir(self, name):
+        return os.path.join(self.root, name)
+
+    def _version_dir(self, name, version):
+        return os.path.join(self.root, name, version)
+
+    def register(self, name, model, metadata=None):
+        """Store a new immutable version of ``name`` and return its version ID"""
+        buffer = io.BytesIO()
+        joblib.dump(model, buffer)
+        payload = buffer.getvalue()
+        content_hash = hashlib.sha256(payload).hexdigest()
+        version = f"{datetime.utcnow().strftime('%Y%m%dT%H%M%S')}-{content_hash[:8]}"
+
+        version_dir = self._version_dir(name, version)
+        with self._lock:
+            os.makedirs(self._model_dir(name), exist_ok=True)
+            # exist_ok=False: an existing version is never overwritten. The ID includes the
+            # content hash, so an existing one holds this very model (registered again within
+            # the same second)
+            try:
+                os.makedirs(version_dir, exist_ok=False)
+            except FileExistsError:
+                logger.info(f"{name} version {version} is already registered")
+                return version
+            record = dict(metadata or {})
+            record.update({
+                "name": name,
+                "version": version,
+                "createdAt": datetime.utcnow().isoformat(),
+                "contentHash": content_hash,
+                "modelClass": type(model).__name__,
+            })
+            for filename, data in (("model.pkl", payload),
+                                   ("metadata.json", json.dumps(record, indent=2, default=str).encode())):
+                path = os.path.join(version_dir, filename)
+                with open(path, "wb") as output:
+                    output.write(data)
+                os.chmod(path, stat.S_IRUSR | stat.S_IRGRP | stat.S_IROTH)
+        logger.info(f"Registered {name} version {version}")
+        return version
+
+    def metadata(self, name, version):
+        path = os.path.join(self._version_dir(name, version), "metadata.json")
+        if not os.path.exists(path):
+            raise ModelRegistryError(f"Unknown version {version} of model {name}")
+        with open(path) as metadata_file:
+            return json.load(metadata_file)
+
+    def load(self, name, version=None):
+        """Load a version (the live one by default); returns (model, metadata)"""
+        version = version or self.live_version(name)
+        if version is None:
+            raise ModelRegistryError(f"No live version of model {name}")
+        metadata = self.metadata(name, version)
+        model = joblib.load(os.path.join(self._version_dir(name, version), "model.pkl"))
+        return model, metadata
+
+    def live_version(self, name):
+        path = os.path.join(self._model_dir(name), "live.json")
+        if not os.path.exists(path):
+            return None
+        with open(path) as live_file:
+            return json.load(live_file).get("version")
+
+    def promote(self, name, version):
+        """Point ``live`` at an existing version (atomic pointer swap)"""
+        self.metadata(name, version)  # validates the version exists
+        path = os.path.join(self._model_dir(name), "live.json")
+        temporary = f"{path}.tmp"
+        with self._lock:
+            with open(temporary, "w") as live_file:
+                json.dump({"version": version, "promotedAt": datetime.utcnow().isoformat(),
+                           "previous": self.live_version(name)}, live_file)
+            os.replace(temporary, path)
+        logger.info(f"Promoted {name} version {version} to live")
+
+    def list_versions(self, name):
+        model_dir = self._model_dir(name)
+        if not os.path.isdir(model_dir):
+            return []
+        versions = sorted(entry for entry in os.listdir(model_dir)
+                          if os.path.isdir(os.path.join(model_dir, entry)))
+        return [self.metadata(name, version) for version in versions]
+
+    def model_names(self):
+        if not os.path.isdir(self.root):
+            return []
+        return sorted(entry for entry in os.listdir(self.root) if os.path.isdir(os.path.join(self.root, entry)))
+
+
+class _ShadowStats:
+    """Running comparison of a candidate against live predictions"""
+
+    def __init__(self, version, targets=TARGET_NAMES):
+        self.version = version
+        self.targets = tuple(targets)
+        self.requests = 0
+        self.errors = 0
+        self.latency_total = 0.0
+        self.abs_delta_total = np.zeros(len(self.targets))
+        self.abs_delta_max = np.zeros(len(self.targets))
+
+    def as_dict(self):
+        scored = max(1, self.requests)
+        return {
+            "version": self.version,
+            "requests": self.requests,
+            "errors": self.errors,
+            "meanLatencyMs": self.latency_total / scored * 1000,
+            "meanAbsDelta": dict(zip(self.targets, (self.abs_delta_total / scored).tolist())),
+            "maxAbsDelta": dict(zip(self.targets, self.abs_delta_max.tolist())),
+        }
+
+
+class ShadowScorer:
+    """Scores a sampled fraction of live traffic with candidate models off the request path.
+
+    ``maybe_submit`` only draws a random number and, when sampled, hands the
+    work to a small thread pool; when too much shadow work is pending the
+    sample is dropped rather than queued, so shadowing never adds latency.
+    """
+
+    def __init__(self, sample_rate=0.1, max_workers=1, max_pending=32):
+        self.sample_rate = sample_rate
+        self.max_pending = max_pending
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="shadow")
+        self._pending = 0
+        self._lock = threading.Lock()
+        self.candidates = {}
+        self.stats = {}
+
+    def set_candidate(self, name, version, model, sample_rate=None, targets=TARGET_NAMES):
+        """Shadow ``model``; ``targets`` names the columns it predicts (and live predictions hold)"""
+        # A single shadow thread: keep the candidate from fanning out over every core
+        if "n_jobs" in getattr(model, "get_params", dict)():
+            model.set_params(n_jobs=1)
+        with self._lock:
+            self.candidates[name] = (version, model)
+            self.stats[name] = _ShadowStats(version, targets)
+            if sample_rate is not None:
+                self.sample_rate = sample_rate
+
+    def clear_candidate(self, name):
+        with self._lock:
+            self.candidates.pop(name, None)
+
+    def maybe_submit(self, name, features, live_predictions):
+        candidate = self.candidates.get(name)
+        if candidate is None or random.random() >= self.sample_rate:
+            return
+        with self._lock:
+            if self._pending >= self.max_pending:
+                SHADOW_DROPPED.inc(model=name)
+                return
+            self._pending += 1
+        # Copy inputs: the request may reuse its arrays after we return
+        self._executor.submit(self._score, name, candidate, np.array(features), np.array(live_predictions))
+
+    def _score(self, name, candidate, features, live_predictions):
+        version, model = candidate
+        try:
+            start = time.perf_counter()
+            predictions = model.predict(features)
+            latency = time.perf_counter() - start
+            SHADOW_INFERENCE_SECONDS.observe(latency, model=name, version=version)
+
+            n_rows = features.shape[0]
+            predictions = np.asarray(predictions, dtype=np.float64).reshape(n_rows, -1)
+            live_predictions = np.asarray(live_predictions, dtype=np.float64).reshape(n_rows, -1)
+            with self._lock:
+                stats = self.stats.get(name)
+            if stats is None or stats.version != version:
+                return
+            # Compare only the targets both models produce
+            n_targets = min(predictions.shape[1], live_predictions.shape[1], len(stats.targets))
+            abs_delta = np.abs(predictions[:, :n_targets] - live_predictions[:, :n_targets])
+            for i in range(n_targets):
+                SHADOW_ABS_DELTA.observe(float(abs_delta[:, i].mean()), model=name, target=stats.targets[i])
+
+            with self._lock:
+                if self.stats.get(name) is stats:
+                    stats.requests += 1
+                    stats.latency_total += latency
+                    stats.abs_delta_total[:n_targets] += abs_delta.mean(axis=0)
+                    stats.abs_delta_max[:n_targets] = np.maximum(stats.abs_delta_max[:n_targets],
+                                                                 abs_delta.max(axis=0))
+        except Exception as e:
+            logger.warning(f"Shadow scoring of {name} {version} failed: {str(e)}")
+            with self._lock:
+                stats = self.stats.get(name)
+                if stats is not None and stats.version == version:
+                    stats.errors += 1
+        finally:
+            with self._lock:
+                self._pending -= 1
+
+    def report(self):
+        with self._lock:
+            return {
+                "sampleRate": self.sample_rate,
+                "pending": self._pending,
+                "candidates": {name: stats.as_dict() for name, stats in self.stats.items()
+                               if name in self.candidates},
+            }
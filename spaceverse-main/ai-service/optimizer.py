@@ -0,0 +1,324 @@
+"""
+Constellation Slot Optimizer
+----------------------------
+
+Multi-objective search for the orbital slots (altitude and inclination per
+plane) of a constellation within mission bounds.
+
+A candidate is one (altitude, inclination) per plane. Every plane becomes a
+feature row: circular velocity at its altitude, the satellite mass, the
+catalog object count plus the constellation, and the congestion of its
+density cell (density_index.py) raised 1% per satellite in the plane and in
+any other plane of the same candidate within ``separation_km`` /
+``separation_deg`` (the simulator's launch rule, see timeline.py). A whole
+population is scored as one batch through the cheap-tier ensemble, and each
+candidate gets three objectives to minimize: mean predicted collision risk,
+mean predicted congestion increase and altitude cost (mean position within
+the altitude bounds, 0 = lowest; higher slots cost launch energy and latency).
+
+Search is an elitist evolutionary algorithm (Pareto rank + crowding distance
+selection, uniform crossover of planes, Gaussian mutation). Independent
+islands with different seeds run in a persistent pool of worker processes
+(``python optimizer.py --worker``) until the time budget runs out; their
+non-dominated sets are merged into the returned Pareto front.
+"""
+
+import logging
+import os
+import subprocess
+import sys
+import threading
+import time
+from multiprocessing.connection import Connection
+
+import numpy as np
+
+from density_index import cell_indices
+from timeline import LAUNCH_CONGESTION_FACTOR
+
+logger = logging.getLogger(__name__)
+
+EARTH_RADIUS_KM = 6378.137
+EARTH_MU = 398600.4418  # km^3/s^2
+OBJECTIVES = ("collisionRisk", "congestionRisk", "altitudeCost")
+# Congestion floor for empty cells, so crowding by the constellation itself still counts
+MIN_CONGESTION = 0.05
+MUTATION_SIGMA = 0.08
+# Seconds on top of the budget before an island is given up on
+ISLAND_GRACE_SECONDS = 5.0
+WORKER_SCRIPT = os.path.abspath(__file__)
+
+
+class ConstellationProblem:
+    """Mission bounds and environment of one optimization (picklable)"""
+
+    def __init__(self, altitude_range, inclination_range, planes, satellites_per_plane, mass=500.0,
+                 base_objects=5500, congestion_grid=None, base_congestion=0.5,
+                 separation_km=25.0, separation_deg=5.0):
+        self.altitude_range = (float(altitude_range[0]), float(altitude_range[1]))
+        self.inclination_range = (float(inclination_range[0]), float(inclination_range[1]))
+        self.planes = int(planes)
+        self.satellites_per_plane = int(satellites_per_plane)
+        self.mass = float(mass)
+        self.base_objects = float(base_objects)
+        self.congestion_grid = congestion_grid
+        self.base_congestion = float(base_congestion)
+        self.separation_km = float(separation_km)
+        self.separation_deg = float(separation_deg)
+
+    def decode(self, genomes):
+        """Genomes (P, planes, 2) in [0, 1] -> (altitudes, inclinations), each (P, planes)"""
+        low, high = self.altitude_range
+        altitudes = low + genomes[..., 0] * (high - low)
+        low, high = self.inclination_range
+        inclinations = low + genomes[..., 1] * (high - low)
+        return altitudes, inclinations
+
+    def features(self, genomes):
+        """(P * planes, 6) feature matrix, planes of one candidate on consecutive rows"""
+        altitudes, inclinations = self.decode(genomes)
+        if self.congestion_grid is not None:
+            shells, bands = cell_indices(altitudes, inclinations)
+            base = np.maximum(self.congestion_grid[shells, bands], MIN_CONGESTION)
+        else:
+            base = np.full(altitudes.shape, self.base_congestion)
+        # Planes of the same candidate close enough to share conjunctions
+        close = ((np.abs(altitudes[:, :, None] - altitudes[:, None, :]) < self.separation_km) &
+                 (np.abs(inclinations[:, :, None] - inclinations[:, None, :]) < self.separation_deg))
+        sharing = close.sum(axis=2) * self.satellites_per_plane  # includes the plane itself
+        congestion = np.minimum(1.0, base * LAUNCH_CONGESTION_FACTOR ** sharing)
+
+        features = np.empty((altitudes.size, 6), dtype=np.float64)
+        features[:, 0] = altitudes.ravel()
+        features[:, 1] = inclinations.ravel()
+        features[:, 2] = np.sqrt(EARTH_MU / (EARTH_RADIUS_KM + features[:, 0]))
+        features[:, 3] = self.mass
+        features[:, 4] = self.base_objects + self.planes * self.satellites_per_plane
+        features[:, 5] = congestion.ravel()
+        return features
+
+    def evaluate(self, scorer, genomes):
+        """(P, 3) objectives of a population, scored in one batch"""
+        predictions = scorer.predict(self.features(genomes)).reshape(len(genomes), self.planes, -1)
+        return np.column_stack([
+            predictions[:, :, 0].mean(axis=1),
+            predictions[:, :, 1].mean(axis=1),
+            genomes[:, :, 0].mean(axis=1),
+        ])
+
+    def evenly_spaced(self):
+        """Naive configuration: planes spread evenly over the altitude bounds, mid inclination"""
+        genome = np.empty((1, self.planes, 2))
+        genome[0, :, 0] = (np.arange(self.planes) + 0.5) / self.planes
+        genome[0, :, 1] = 0.5
+        return genome
+
+
+def pareto_ranks(objectives):
+    """Non-domination rank of every row (0 = Pareto front), all objectives minimized"""
+    better_or_equal = (objectives[:, None, :] <= objectives[None, :, :]).all(axis=2)
+    strictly_better = (objectives[:, None, :] < objectives[None, :, :]).any(axis=2)
+    dominates = better_or_equal & strictly_better  # dominates[i, j]: i dominates j
+    ranks = np.full(len(objectives), -1)
+    remaining = np.ones(len(objectives), dtype=bool)
+    rank = 0
+    while remaining.any():
+        dominated = (dominates[remaining][:, remaining]).any(axis=0)
+        current = np.flatnonzero(remaining)[~dominated]
+        ranks[current] = rank
+        remaining[current] = False
+        rank += 1
+    return ranks
+
+
+def crowding_distance(objectives):
+    """NSGA-II crowding distance (larger = more isolated)"""
+    n_rows = len(objectives)
+    distance = np.zeros(n_rows)
+    if n_rows <= 2:
+        return np.full(n_rows, np.inf)
+    for column in objectives.T:
+        order = np.argsort(column)
+        span = column[order[-1]] - column[order[0]]
+        distance[order[0]] = distance[order[-1]] = np.inf
+        if span > 0:
+            distance[order[1:-1]] += (column[order[2:]] - column[order[:-2]]) / span
+    return distance
+
+
+def _select(objectives, count):
+    """Indices of the ``count`` best rows by Pareto rank, then crowding distance"""
+    ranks = pareto_ranks(objectives)
+    crowding = np.empty(len(objectives))
+    for rank in np.unique(ranks):
+        members = ranks == rank
+        crowding[members] = crowding_distance(objectives[members])
+    return np.lexsort((-crowding, ranks))[:count]
+
+
+def run_island(scorer, problem, seed, budget_seconds, population_size=128):
+    """One evolutionary search until the budget runs out
+
+    Returns (front genomes, front objectives, generations, evaluations).
+    """
+    deadline = time.perf_counter() + budget_seconds
+    rng = np.random.default_rng(seed)
+    population = rng.random((population_size, problem.planes, 2))
+    objectives = problem.evaluate(scorer, population)
+    generations = 0
+    evaluations = population_size
+    while time.perf_counter() < deadline:
+        ranks = pareto_ranks(objectives)
+        # Binary tournaments on Pareto rank
+        pairs = rng.integers(0, population_size, (population_size, 2, 2))
+        winners = np.where(ranks[pairs[..., 0]] <= ranks[pairs[..., 1]], pairs[..., 0], pairs[..., 1])
+        mothers, fathers = population[winners[:, 0]], population[winners[:, 1]]
+        # Uniform crossover of whole planes, then Gaussian mutation
+        take_father = rng.random((population_size, problem.planes, 1)) < 0.5
+        children = np.where(take_father, fathers, mothers)
+        children = np.clip(children + rng.normal(0, MUTATION_SIGMA, children.shape), 0.0, 1.0)
+
+        combined = np.concatenate([population, children])
+        combined_objectives = np.concatenate([objectives, problem.evaluate(scorer, children)])
+        survivors = _select(combined_objectives, population_size)
+        population, objectives = combined[survivors], combined_objectives[survivors]
+        generations += 1
+        evaluations += population_size
+
+    front = pareto_ranks(objectives) == 0
+    return population[front], objectives[front], generations, evaluations
+
+
+class _IslandWorker:
+    """One ``python optimizer.py --worker`` process, fed pickled tasks over a pipe
+
+    Workers are separate interpreters rather than multiprocessing children, so
+    they never re-import the service module (and TensorFlow) as ``__main__``.
+    """
+
+    def __init__(self):
+        task_read, task_write = os.pipe()
+        result_read, result_write = os.pipe()
+        self.process = subprocess.Popen(
+            [sys.executable, WORKER_SCRIPT, "--worker", str(task_read), str(result_write)],
+            pass_fds=(task_read, result_write), cwd=os.path.dirname(WORKER_SCRIPT),
+        )
+        os.close(task_read)
+        os.close(result_write)
+        self.tasks = Connection(task_write, readable=False)
+        self.results = Connection(result_read, writable=False)
+
+    def alive(self):
+        return self.process.poll() is None
+
+    def close(self):
+        for connection in (self.tasks, self.results):
+            connection.close()
+        if self.alive():
+            self.process.kill()
+        self.process.wait()
+
+
+class ConstellationOptimizer:
+    """Island search over a persistent pool of worker processes (in-process when ``processes`` <= 1)
+
+    One search runs at a time and uses every worker.
+    """
+
+    def __init__(self, processes=1):
+        self.processes = max(1, int(processes))
+        self._workers = []
+        self._lock = threading.Lock()
+
+    def _pool(self):
+        # Replace workers that died or were killed after missing a deadline
+        for worker in [worker for worker in self._workers if not worker.alive()]:
+            worker.close()
+            self._workers.remove(worker)
+        while len(self._workers) < self.processes:
+            self._workers.append(_IslandWorker())
+        return self._workers
+
+    def start(self):
+        """Start the worker processes ahead of the first search"""
+        if self.processes > 1:
+            with self._lock:
+                self._pool()
+
+    def shutdown(self):
+        with self._lock:
+            for worker in self._workers:
+                worker.close()
+            self._workers = []
+
+    def _run_islands(self, scorer, problem, budget_seconds, population_size, seed, start):
+        workers = self._pool()
+        sent = []
+        for island, worker in enumerate(workers):
+            try:
+                worker.tasks.send((scorer, problem, seed + island, budget_seconds, population_size))
+                sent.append(worker)
+            except OSError as e:
+                logger.warning(f"Optimizer worker unavailable: {str(e)}")
+                worker.close()
+        results = []
+        for worker in sent:
+            remaining = start + budget_seconds + ISLAND_GRACE_SECONDS - time.perf_counter()
+            try:
+                if not worker.results.poll(max(0.0, remaining)):
+                    raise TimeoutError("island exceeded its time budget")
+                status, payload = worker.results.recv()
+            except (OSError, EOFError, TimeoutError) as e:
+                logger.warning(f"Optimizer island dropped: {str(e)}")
+                worker.close()
+                continue
+            if status == "ok":
+                results.append(payload)
+            else:
+                logger.warning(f"Optimizer island failed: {payload}")
+        return results
+
+    def optimize(self, scorer, problem, budget_seconds, population_size=128, seed=0):
+        with self._lock:
+            start = time.perf_counter()
+            results = []
+            if self.processes > 1:
+                results = self._run_islands(scorer, problem, budget_seconds, population_size, seed, start)
+            if not results:
+                results.append(run_island(scorer, problem, seed,
+                                          max(0.0, start + budget_seconds - time.perf_counter()), population_size))
+
+        genomes = np.concatenate([result[0] for result in results])
+        objectives = np.concatenate([result[1] for result in results])
+        genomes, unique = np.unique(genomes.round(6), axis=0, return_index=True)
+        objectives = objectives[unique]
+        front = pareto_ranks(objectives) == 0
+        order = np.argsort(objectives[front][:, 0])
+        return {
+            "genomes": genomes[front][order],
+            "objectives": objectives[front][order],
+            "islands": len(results),
+            "generations": sum(result[2] for result in results),
+            "evaluations": sum(result[3] for result in results),
+            "seconds": time.perf_counter() - start,
+        }
+
+
+def _worker_main(task_fd, result_fd):
+    tasks = Connection(task_fd, writable=False)
+    results = Connection(result_fd, readable=False)
+    while True:
+        try:
+            task = tasks.recv()
+        except EOFError:
+            return 0
+        try:
+            results.send(("ok", run_island(*task)))
+        except Exception as e:
+            results.send(("error", str(e)))
+
+
+if __name__ == "__main__":
+    if len(sys.argv) == 4 and sys.argv[1] == "--worker":
+        sys.exit(_worker_main(int(sys.argv[2]), int(sys.argv[3])))
+    sys.exit("usage: optimizer.py --worker TASK_FD RESULT_FD (started by the AI service)")
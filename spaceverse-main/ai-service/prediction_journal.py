@@ -0,0 +1,387 @@
+"""
+Prediction Journal
+------------------
+
+Append-only binary log of every feature vector the service scores, with the
+ensemble outputs, serving tier and live model versions, as a training-data
+source for /ai/retrain.
+
+The recorded outputs are the ensemble's own answers, not observed outcomes:
+training on them distills the served ensemble into new heads, it cannot make
+them more accurate. Rows keep the tier whose models actually scored them
+(cascade rows as ``full`` when escalated, ``cheap`` otherwise), so readers
+can keep to full-ensemble answers and leave out degraded cheap-tier ones.
+
+Records are fixed-size (``RECORD_DTYPE``: timestamp, six float32 features -
+the forests split on float32 anyway - three float32 outputs and the tier).
+Recording a batch copies it into a preallocated in-memory buffer under a
+lock (a few microseconds for one row); a background thread appends sealed
+buffers to the active segment file every ``AI_JOURNAL_FLUSH_SECONDS`` or as
+soon as a buffer fills. If the writer falls behind, whole buffers are
+dropped (and counted) rather than blocking requests or growing memory.
+
+Segments live in ``AI_JOURNAL_DIR`` as ``journal-<sequence>.seg``: a JSON
+header (model versions, feature and target names, record layout) padded to
+64 bytes, then raw records, so a segment is readable as a memory-mapped
+structured array with no parsing. A segment is rotated when it reaches
+``AI_JOURNAL_SEGMENT_MB``, after ``AI_JOURNAL_SEGMENT_SECONDS`` and whenever
+the live model versions change, so every segment belongs to one set of
+models. After each rotation, runs of consecutive closed segments with the
+same versions are compacted into one file (up to the segment size), and the
+oldest segments are deleted once the journal exceeds ``AI_JOURNAL_MAX_MB``.
+One process writes to a directory; give each worker its own.
+
+``AI_PREDICTION_JOURNAL=0`` turns recording off.
+"""
+
+import json
+import logging
+import os
+import re
+import threading
+import time
+
+import numpy as np
+
+from metrics import Counter
+from training_data import FEATURE_NAMES, TARGET_NAMES
+
+logger = logging.getLogger(__name__)
+
+MAGIC = b"SVJRNL01"
+HEADER_ALIGNMENT = 64
+RECORD_DTYPE = np.dtype([
+    ("timestamp", "<f8"),
+    ("features", "<f4", (len(FEATURE_NAMES),)),
+    ("outputs", "<f4", (len(TARGET_NAMES),)),
+    ("tier", "u1"),
+])
+BUFFER_RECORDS = 4096
+# Sealed buffers waiting for the writer; beyond this, new ones are dropped
+MAX_PENDING_BUFFERS = 64
+SEGMENT_PATTERN = re.compile(r"^journal-(\d{8})\.seg$")
+
+JOURNAL_RECORDS = Counter("ai_journal_records_total", "Scored rows offered to the prediction journal",
+                          ("result",))
+
+
+class JournalError(Exception):
+    """Raised for unreadable journal segments"""
+
+
+def _segment_path(directory, sequence):
+    return os.path.join(directory, f"journal-{sequence:08d}.seg")
+
+
+def _encode_header(header):
+    body = json.dumps(header, sort_keys=True).encode("utf-8")
+    length = len(MAGIC) + 4 + len(body)
+    padding = -length % HEADER_ALIGNMENT
+    return MAGIC + (len(body) + padding).to_bytes(4, "little") + body + b" " * padding
+
+
+def read_header(path):
+    """(header dict, offset of the first record) of a segment"""
+    with open(path, "rb") as segment:
+        prefix = segment.read(len(MAGIC) + 4)
+        if len(prefix) < len(MAGIC) + 4 or prefix[:len(MAGIC)] != MAGIC:
+            raise JournalError(f"{path} is not a prediction journal segment")
+        length = int.from_bytes(prefix[len(MAGIC):], "little")
+        try:
+            header = json.loads(segment.read(length))
+        except ValueError:
+            raise JournalError(f"{path} has a corrupt header")
+    if header.get("recordSize") != RECORD_DTYPE.itemsize:
+        raise JournalError(f"{path} uses an incompatible record layout")
+    return header, len(MAGIC) + 4 + length
+
+
+def read_segment(path):
+    """(header, records) of a segment; records is a read-only memory-mapped structured array"""
+    header, offset = read_header(path)
+    # A segment being appended to may end in a partial record
+    count = (os.path.getsize(path) - offset) // RECORD_DTYPE.itemsize
+    if count == 0:
+        return header, np.empty(0, dtype=RECORD_DTYPE)
+    return header, np.memmap(path, dtype=RECORD_DTYPE, mode="r", offset=offset, shape=(count,))
+
+
+def list_segments(directory):
+    """Segment paths in write order"""
+    try:
+        names = sorted(name for name in os.listdir(directory) if SEGMENT_PATTERN.match(name))
+    except FileNotFoundError:
+        return []
+    return [os.path.join(directory, name) for name in names]
+
+
+def load_training_data(directory, since=None, max_samples=None, tiers=None):
+    """(X (n, 6), y (n, 3), timestamps) of journaled rows, most recent ``max_samples`` kept
+
+    ``since`` is a Unix time; ``tiers`` restricts to rows served by those tier names.
+    """
+    features, outputs, timestamps = [], [], []
+    remaining = max_samples
+    # Newest first, so a sample limit reads only the segments it needs
+    for path in reversed(list_segments(directory)):
+        try:
+            header, records = read_segment(path)
+        except (OSError, JournalError) as e:
+            logger.warning(f"Skipping journal segment: {str(e)}")
+            continue
+        keep = np.ones(len(records), dtype=bool)
+        if since is not None:
+            keep &= records["timestamp"] >= since
+        if tiers is not None:
+            codes = [header["tiers"].index(tier) for tier in tiers if tier in header["tiers"]]
+            keep &= np.isin(records["tier"], codes)
+        selected = records[keep]
+        if remaining is not None:
+            selected = selected[max(0, len(selected) - remaining):]
+            remaining -= len(selected)
+        features.append(np.asarray(selected["features"], dtype=np.float64))
+        outputs.append(np.asarray(selected["outputs"], dtype=np.float64))
+        timestamps.append(np.asarray(selected["timestamp"]))
+        if remaining is not None and remaining <= 0:
+            break
+    if not features:
+        return np.empty((0, len(FEATURE_NAMES))), np.empty((0, len(TARGET_NAMES))), np.empty(0)
+    return (np.concatenate(features[::-1]), np.concatenate(outputs[::-1]), np.concatenate(timestamps[::-1]))
+
+
+class _Buffer:
+    """Preallocated records sharing one set of model versions"""
+
+    __slots__ = ("records", "size", "versions")
+
+    def __init__(self, versions, capacity=BUFFER_RECORDS):
+        self.records = np.empty(capacity, dtype=RECORD_DTYPE)
+        self.size = 0
+        self.versions = versions
+
+
+class PredictionJournal:
+    """Batched, asynchronous append-only journal of scored rows"""
+
+    def __init__(self, directory=None, tiers=(), enabled=None, flush_seconds=None, segment_bytes=None,
+                 segment_seconds=None, max_bytes=None):
+        self.directory = directory or os.getenv("AI_JOURNAL_DIR", "journal")
+        self.enabled = (enabled if enabled is not None
+                        else os.getenv("AI_PREDICTION_JOURNAL", "1").lower() not in ("0", "false", "no"))
+        self.flush_seconds = float(flush_seconds if flush_seconds is not None
+                                   else os.getenv("AI_JOURNAL_FLUSH_SECONDS", "1.0"))
+        self.segment_bytes = int(segment_bytes if segment_bytes is not None
+                                 else float(os.getenv("AI_JOURNAL_SEGMENT_MB", "64")) * 2 ** 20)
+        self.segment_seconds = float(segment_seconds if segment_seconds is not None
+                                     else os.getenv("AI_JOURNAL_SEGMENT_SECONDS", "3600"))
+        self.max_bytes = int(max_bytes if max_bytes is not None
+                             else float(os.getenv("AI_JOURNAL_MAX_MB", "1024")) * 2 ** 20)
+        self.tiers = tuple(tiers)
+        self._tier_codes = {tier: code for code, tier in enumerate(self.tiers)}
+        self.versions = {}
+        self.dropped = 0
+        self.written = 0
+
+        self._buffer = _Buffer(self.versions)
+        self._pending = []
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._thread = None
+        self._closed = False
+        # Writer thread state
+        self._segment = None
+        self._segment_path = None
+        self._segment_versions = None
+        self._segment_started = 0.0
+        self._segment_size = 0
+        self._write_lock = threading.Lock()
+
+    def set_model_versions(self, versions):
+        """Live model versions for rows recorded from now on; a change starts a new segment"""
+        versions = dict(versions)
+        with self._lock:
+            if versions != self.versions:
+                self.versions = versions
+                self._seal()
+
+    def _seal(self):
+        # Caller holds self._lock
+        if self._buffer.size:
+            if len(self._pending) < MAX_PENDING_BUFFERS:
+                self._pending.append(self._buffer)
+            else:
+                self.dropped += self._buffer.size
+                JOURNAL_RECORDS.inc(self._buffer.size, result="dropped")
+            self._wake.set()
+        self._buffer = _Buffer(self.versions)
+
+    def record(self, features, outputs, tier):
+        """Journal a scored batch: features (n, 6), outputs (n, 3) and the tier that served it
+
+        ``tier`` is one tier name for the batch or an array of names per row.
+        """
+        if not self.enabled or self._closed:
+            return
+        if self._thread is None:
+            self._start()
+        n_rows = len(features)
+        now = time.time()
+        if isinstance(tier, str):
+            tier_code = self._tier_codes.get(tier, 255)
+        else:
+            tier_code = np.array([self._tier_codes.get(name, 255) for name in tier], dtype=np.uint8)
+        start = 0
+        with self._lock:
+            while start < n_rows:
+                buffer = self._buffer
+                count = min(n_rows - start, len(buffer.records) - buffer.size)
+                chunk = buffer.records[buffer.size:buffer.size + count]
+                chunk["timestamp"] = now
+                chunk["features"] = features[start:start + count]
+                chunk["outputs"] = outputs[start:start + count]
+                chunk["tier"] = tier_code if isinstance(tier_code, int) else tier_code[start:start + count]
+                buffer.size += count
+                start += count
+                if buffer.size == len(buffer.records):
+                    self._seal()
+
+    def _start(self):
+        with self._lock:
+            if self._thread is None and not self._closed:
+                self._thread = threading.Thread(target=self._run, name="prediction-journal", daemon=True)
+                self._thread.start()
+
+    def _run(self):
+        while not self._closed:
+            self._wake.wait(self.flush_seconds)
+            self._wake.clear()
+            self.flush()
+
+    def flush(self):
+        """Write everything recorded so far to the active segment"""
+        with self._lock:
+            self._seal()
+            pending, self._pending = self._pending, []
+        if not pending:
+            return
+        with self._write_lock:
+            for buffer in pending:
+                try:
+                    self._append(buffer)
+                    self.written += buffer.size
+                    JOURNAL_RECORDS.inc(buffer.size, result="written")
+                except OSError as e:
+                    logger.warning(f"Prediction journal write failed: {str(e)}")
+                    self.dropped += buffer.size
+                    JOURNAL_RECORDS.inc(buffer.size, result="dropped")
+
+    def _append(self, buffer):
+        now = time.monotonic()
+        if self._segment is not None and (
+                buffer.versions != self._segment_versions or self._segment_size >= self.segment_bytes
+                or now - self._segment_started >= self.segment_seconds):
+            self._rotate()
+        if self._segment is None:
+            self._open_segment(buffer.versions)
+        data = buffer.records[:buffer.size].tobytes()
+        self._segment.write(data)
+        self._segment.flush()
+        self._segment_size += len(data)
+
+    def _open_segment(self, versions):
+        os.makedirs(self.directory, exist_ok=True)
+        existing = list_segments(self.directory)
+        sequence = int(SEGMENT_PATTERN.match(os.path.basename(existing[-1])).group(1)) + 1 if existing else 0
+        header = {
+            "formatVersion": 1,
+            "recordSize": RECORD_DTYPE.itemsize,
+            "featureNames": list(FEATURE_NAMES),
+            "targetNames": list(TARGET_NAMES),
+            "tiers": list(self.tiers),
+            "modelVersions": versions,
+            "created": time.time(),
+        }
+        self._segment_path = _segment_path(self.directory, sequence)
+        self._segment = open(self._segment_path, "xb")
+        self._segment.write(_encode_header(header))
+        self._segment_versions = versions
+        self._segment_started = time.monotonic()
+        self._segment_size = 0
+
+    def _rotate(self):
+        self._segment.close()
+        self._segment = None
+        self._segment_path = None
+        try:
+            self.compact()
+        except (OSError, JournalError) as e:
+            logger.warning(f"Prediction journal compaction failed: {str(e)}")
+
+    def compact(self):
+        """Merge runs of closed segments with the same model versions; enforce the size limit"""
+        segments = [path for path in list_segments(self.directory) if path != self._segment_path]
+        run, run_versions, run_bytes = [], None, 0
+        for path in segments + [None]:
+            header = read_header(path)[0] if path is not None else None
+            size = os.path.getsize(path) if path is not None else 0
+            if path is not None and header["modelVersions"] == run_versions and run_bytes + size <= self.segment_bytes:
+                run.append(path)
+                run_bytes += size
+                continue
+            if len(run) > 1:
+                self._merge(run)
+            run, run_versions, run_bytes = [path], header and header["modelVersions"], size
+
+        total = sum(os.path.getsize(path) for path in list_segments(self.directory))
+        for path in list_segments(self.directory):
+            if total <= self.max_bytes or path == self._segment_path:
+                break
+            total -= os.path.getsize(path)
+            os.remove(path)
+
+    def _merge(self, paths):
+        """Rewrite consecutive segments as one, under the first one's name"""
+        header, _ = read_header(paths[0])
+        temporary = paths[0] + ".tmp"
+        with open(temporary, "wb") as merged:
+            merged.write(_encode_header(header))
+            for path in paths:
+                merged.write(read_segment(path)[1].tobytes())
+            merged.flush()
+            os.fsync(merged.fileno())
+        os.replace(temporary, paths[0])
+        for path in paths[1:]:
+            os.remove(path)
+
+    def close(self):
+        """Flush and close the active segment; later records are ignored"""
+        self.flush()
+        self._closed = True
+        self._wake.set()
+        with self._write_lock:
+            if self._segment is not None:
+                self._segment.close()
+                self._segment = None
+
+    def status(self):
+        segments = list_segments(self.directory)
+        size = 0
+        for path in segments:
+            try:
+                size += os.path.getsize(path)
+            except FileNotFoundError:
+                # Merged away by a concurrent compaction
+                pass
+        with self._lock:
+            buffered = self._buffer.size + sum(buffer.size for buffer in self._pending)
+        return {
+            "enabled": self.enabled,
+            "directory": self.directory,
+            "segments": len(segments),
+            "bytes": size,
+            "recordSize": RECORD_DTYPE.itemsize,
+            "written": self.written,
+            "buffered": buffered,
+            "dropped": self.dropped,
+            "modelVersions": self.versions,
+        }
@@ -0,0 +1,272 @@
+"""
+Request Profiling
+-----------------
+
+Opt-in, per-request diagnostics for internal callers:
+
+* ``X-Debug-Timing: timing`` (or ``?debug=timing``) attaches a stage-by-stage
+  breakdown (feature prep, each model call, explanation text, ...) to the
+  response as a standard ``Server-Timing`` header.
+* ``X-Debug-Timing: profile`` (or ``?debug=profile``) additionally samples the
+  request's call stacks and writes them in folded-stack format (readable by
+  flamegraph.pl or speedscope) to ``AI_PROFILE_DIR``; the file path is
+  returned in the ``X-Profile-Path`` header once the file has been written.
+  The directory keeps at most ``AI_PROFILE_MAX_FILES`` profiles and
+  ``AI_PROFILE_MAX_MB`` megabytes; the oldest profiles are deleted first.
+
+Debug mode is only honoured for callers presenting the ``AI_DEBUG_TOKEN``
+shared secret in ``X-Debug-Token`` or, when set, calling from one of the
+``AI_DEBUG_ALLOWED_NETWORKS`` (comma-separated CIDRs; none by default). The
+Node gateway proxies every client request from localhost, so trusting
+loopback would open debug mode to any end user: set
+``AI_DEBUG_ALLOWED_NETWORKS=127.0.0.0/8,::1/128`` only for local development
+without the gateway. Outside debug mode, ``stage()`` is a no-op.
+"""
+
+import ipaddress
+import os
+import sys
+import threading
+import time
+import uuid
+from collections import Counter
+from contextvars import ContextVar
+from urllib.parse import parse_qs
+
+from starlette.concurrency import run_in_threadpool
+
+DEBUG_HEADER = b"x-debug-timing"
+DEBUG_TOKEN_HEADER = b"x-debug-token"
+DEBUG_MODES = ("timing", "profile")
+
+PROFILE_DIR = os.getenv("AI_PROFILE_DIR", "profiles")
+# Sampling interval; the effective rate is also bounded by sys.getswitchinterval()
+PROFILE_INTERVAL = float(os.getenv("AI_PROFILE_INTERVAL_MS", "1")) / 1000
+# Safety limit so a hung request can't sample forever
+PROFILE_MAX_SAMPLES = 100000
+# Retention of the profile directory
+PROFILE_MAX_FILES = int(os.getenv("AI_PROFILE_MAX_FILES", "200"))
+PROFILE_MAX_BYTES = int(float(os.getenv("AI_PROFILE_MAX_MB", "100")) * 1024 * 1024)
+PROFILE_SUFFIX = ".folded"
+
+# Stage timer of the request currently being handled (None outside debug mode)
+_current_timer: ContextVar = ContextVar("stage_timer", default=None)
+
+
+def _parse_networks(value):
+    networks = []
+    for entry in value.split(","):
+        entry = entry.strip()
+        if entry:
+            networks.append(ipaddress.ip_network(entry, strict=False))
+    return networks
+
+
+# Token-only by default: requests proxied by the gateway all arrive from loopback
+ALLOWED_NETWORKS = _parse_networks(os.getenv("AI_DEBUG_ALLOWED_NETWORKS", ""))
+DEBUG_TOKEN = os.getenv("AI_DEBUG_TOKEN", "")
+
+
+class StageTimer:
+    """Collects (stage, seconds) pairs for one request"""
+
+    def __init__(self):
+        self.start = time.perf_counter()
+        self.stages = []
+        self.profiler = None
+
+    def record(self, name, seconds):
+        self.stages.append((name, seconds))
+
+    def total(self):
+        return time.perf_counter() - self.start
+
+    def server_timing(self):
+        """Render the breakdown as a Server-Timing header value (durations in ms)"""
+        entries = [f"{name};dur={seconds * 1000:.3f}" for name, seconds in self.stages]
+        entries.append(f"total;dur={self.total() * 1000:.3f}")
+        return ", ".join(entries)
+
+
+class _Stage:
+    """Context manager timing one stage into the active StageTimer"""
+
+    __slots__ = ("name", "timer", "start")
+
+    def __init__(self, name, timer):
+        self.name = name
+        self.timer = timer
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, traceback):
+        self.timer.record(self.name, time.perf_counter() - self.start)
+        return False
+
+
+class _NoopStage:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, traceback):
+        return False
+
+
+_NOOP_STAGE = _NoopStage()
+
+
+def stage(name):
+    """Time the enclosed block as a named stage when debug timing is active"""
+    timer = _current_timer.get()
+    if timer is None:
+        return _NOOP_STAGE
+    if timer.profiler is not None:
+        # Sync handlers run in the thread pool: sample whichever thread does the work
+        timer.profiler.thread_id = threading.get_ident()
+    return _Stage(name, timer)
+
+
+class SamplingProfiler:
+    """Samples one thread's Python stack at a fixed interval from a helper thread"""
+
+    def __init__(self, thread_id, output_path, interval=PROFILE_INTERVAL):
+        self.thread_id = thread_id
+        self.output_path = output_path
+        self.interval = interval
+        self.samples = Counter()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="request-profiler", daemon=True)
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self, timeout=5.0):
+        """Stop sampling and wait (bounded) until the helper thread has written the profile file"""
+        self._stop.set()
+        if self._thread.is_alive():
+            self._thread.join(timeout)
+
+    def _run(self):
+        taken = 0
+        while not self._stop.wait(self.interval) and taken < PROFILE_MAX_SAMPLES:
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is None:
+                continue
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+                frame = frame.f_back
+            self.samples[";".join(reversed(stack))] += 1
+            taken += 1
+        self._write()
+
+    def _write(self):
+        try:
+            os.makedirs(os.path.dirname(self.output_path) or ".", exist_ok=True)
+            with open(self.output_path, "w") as output:
+                for stack, count in self.samples.most_common():
+                    output.write(f"{stack} {count}\n")
+        except OSError:
+            return
+        prune_profiles(os.path.dirname(self.output_path) or ".")
+
+
+def prune_profiles(directory, max_files=PROFILE_MAX_FILES, max_bytes=PROFILE_MAX_BYTES):
+    """Delete the oldest profiles until the directory is within the file count and size limits"""
+    profiles = []
+    try:
+        with os.scandir(directory) as entries:
+            for entry in entries:
+                if entry.name.endswith(PROFILE_SUFFIX) and entry.is_file():
+                    stat = entry.stat()
+                    profiles.append((stat.st_mtime, stat.st_size, entry.path))
+    except OSError:
+        return
+    profiles.sort()
+    count, total = len(profiles), sum(size for _, size, _ in profiles)
+    # The newest profile is kept even when it alone exceeds the size limit: a response names it
+    for _, size, path in profiles[:-1]:
+        if count <= max_files and total <= max_bytes:
+            break
+        try:
+            os.remove(path)
+        except OSError:
+            # Concurrent requests prune too; a file they removed is just as gone
+            pass
+        count -= 1
+        total -= size
+
+
+def _client_is_internal(scope, headers):
+    if DEBUG_TOKEN and headers.get(DEBUG_TOKEN_HEADER, b"").decode("latin-1") == DEBUG_TOKEN:
+        return True
+    client = scope.get("client")
+    if not client:
+        return False
+    try:
+        address = ipaddress.ip_address(client[0])
+    except ValueError:
+        return False
+    return any(address in network for network in ALLOWED_NETWORKS)
+
+
+def requested_debug_mode(scope, headers):
+    """Return the requested debug mode ("timing"/"profile") or None"""
+    mode = headers.get(DEBUG_HEADER, b"").decode("latin-1").strip().lower()
+    if not mode and scope.get("query_string"):
+        mode = parse_qs(scope["query_string"].decode("latin-1")).get("debug", [""])[0].lower()
+    if mode in ("1", "true"):
+        mode = "timing"
+    return mode if mode in DEBUG_MODES else None
+
+
+class DebugTimingMiddleware:
+    """ASGI middleware enabling stage timing / profiling for opted-in internal requests"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        headers = dict(scope["headers"])
+        mode = requested_debug_mode(scope, headers)
+        if mode is None or not _client_is_internal(scope, headers):
+            await self.app(scope, receive, send)
+            return
+
+        timer = StageTimer()
+        profiler = None
+        if mode == "profile":
+            endpoint = scope["path"].strip("/").replace("/", "_") or "root"
+            filename = f"{time.strftime('%Y%m%dT%H%M%S')}_{endpoint}_{uuid.uuid4().hex[:8]}{PROFILE_SUFFIX}"
+            profiler = SamplingProfiler(threading.get_ident(), os.path.join(PROFILE_DIR, filename))
+            timer.profiler = profiler
+            profiler.start()
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                if profiler is not None:
+                    # The header names the file, so it must exist before the response starts
+                    await run_in_threadpool(profiler.stop)
+                extra = [(b"server-timing", timer.server_timing().encode("latin-1"))]
+                if profiler is not None:
+                    extra.append((b"x-profile-path", profiler.output_path.encode("latin-1")))
+                message = dict(message)
+                message["headers"] = list(message.get("headers", [])) + extra
+            await send(message)
+
+        token = _current_timer.set(timer)
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            _current_timer.reset(token)
+            if profiler is not None:
+                await run_in_threadpool(profiler.stop)
@@ -0,0 +1,189 @@
+"""
+Prediction Streaming
+--------------------
+
+Persistent WebSocket sessions for interactive real-time prediction.
+
+A client opens one connection and sends JSON deltas of its scenario (the
+``/ai/real-time-prediction`` request body); the server merges them into the
+session's current scenario and pushes a prediction whenever one completes.
+Bursts are coalesced latest-wins: an update after a quiet period is predicted
+immediately, but predictions start at most once per AI_STREAM_DEBOUNCE_MS
+(default 50) and never overlap, so deltas arriving in between only update the
+scenario and the next prediction covers all of them.
+
+Protocol (one JSON object per text frame):
+    client -> server   {"parameters": {"altitude": 550}}      nested dicts merge,
+                       {"reset": true, ...}                    other values replace,
+                                                               null removes a key
+    server -> client   {"type": "prediction", "seq": 12, "coalesced": 3, "prediction": {...}}
+                       {"type": "error", "status": 422, "detail": ...}
+                       {"type": "error", "status": 503, "retryAfter": 1, ...}
+
+With an admission controller (admission.py), every prediction holds a
+``realtime`` slot while it runs and is answered degraded under pressure,
+exactly like an HTTP request. A refused prediction is reported with 503 and
+retried for the then-latest scenario after ``retryAfter`` seconds.
+
+Each session holds only its scenario (capped at AI_STREAM_MAX_SCENARIO_BYTES)
+and two idle coroutines, so thousands of mostly idle sessions fit in one
+replica; beyond AI_STREAM_MAX_SESSIONS new connections are closed with 1013
+(try again later).
+"""
+
+import asyncio
+import contextlib
+import copy
+import json
+import logging
+import os
+
+from pydantic import ValidationError
+from starlette.concurrency import run_in_threadpool
+from starlette.websockets import WebSocketDisconnect
+
+from metrics import Counter, Gauge
+
+logger = logging.getLogger(__name__)
+
+STREAM_SESSIONS = Gauge("ai_stream_sessions", "Open streaming prediction sessions")
+STREAM_UPDATES = Counter(
+    "ai_stream_updates_total", "Scenario updates received on streaming sessions by outcome", ("outcome",),
+)
+STREAM_REJECTED = Counter("ai_stream_rejected_sessions_total", "Streaming sessions refused at the session limit")
+
+# WebSocket close code for "try again later"
+CLOSE_TRY_AGAIN_LATER = 1013
+
+
+def merge_delta(scenario, delta):
+    """Apply a client delta in place: nested dicts merge, None removes, anything else replaces"""
+    for key, value in delta.items():
+        if value is None:
+            scenario.pop(key, None)
+        elif isinstance(value, dict) and isinstance(scenario.get(key), dict):
+            merge_delta(scenario[key], value)
+        else:
+            scenario[key] = copy.deepcopy(value)
+    return scenario
+
+
+class _Session:
+    def __init__(self):
+        self.scenario = {}
+        self.received = 0  # updates applied so far
+        self.predicted = 0  # value of ``received`` the last prediction covered
+        self.last_started = 0.0  # event-loop time the last prediction started
+        self.changed = asyncio.Event()
+
+
+class PredictionStream:
+    """Session limit and settings shared by all streaming sessions of a replica"""
+
+    def __init__(self, max_sessions=None, debounce_seconds=None, max_scenario_bytes=None, max_history=None,
+                 admission=None):
+        self.max_sessions = max_sessions or int(os.getenv("AI_STREAM_MAX_SESSIONS", "5000"))
+        self.debounce_seconds = (debounce_seconds if debounce_seconds is not None
+                                 else float(os.getenv("AI_STREAM_DEBOUNCE_MS", "50")) / 1000)
+        self.max_scenario_bytes = max_scenario_bytes or int(os.getenv("AI_STREAM_MAX_SCENARIO_BYTES", "65536"))
+        self.max_history = max_history or int(os.getenv("AI_STREAM_MAX_HISTORY", "50"))
+        self.admission = admission
+        self.active = 0
+
+    async def serve(self, websocket, compute):
+        """Run one session until the client disconnects
+
+        ``compute(scenario) -> dict`` runs in the thread pool; it should raise
+        pydantic's ValidationError for incomplete or invalid scenarios.
+        """
+        if self.active >= self.max_sessions:
+            STREAM_REJECTED.inc()
+            await websocket.close(code=CLOSE_TRY_AGAIN_LATER)
+            return
+        await websocket.accept()
+        self.active += 1
+        STREAM_SESSIONS.set(self.active)
+        session = _Session()
+        worker = asyncio.create_task(self._predict_loop(websocket, session, compute))
+        try:
+            while True:
+                message = await websocket.receive_text()
+                error = self._apply(session, message)
+                if error is not None:
+                    STREAM_UPDATES.inc(outcome="rejected")
+                    await websocket.send_json({"type": "error", "status": 422, "detail": error})
+                    continue
+                session.changed.set()
+        except WebSocketDisconnect:
+            pass
+        finally:
+            worker.cancel()
+            self.active -= 1
+            STREAM_SESSIONS.set(self.active)
+
+    def _apply(self, session, message):
+        """Merge one delta into the session scenario; returns an error message or None"""
+        # Frames arrive decoded; the cap is on their UTF-8 size, not on characters
+        if len(message.encode("utf-8")) > self.max_scenario_bytes:
+            return "Update too large"
+        try:
+            delta = json.loads(message)
+        except ValueError:
+            return "Update is not valid JSON"
+        if not isinstance(delta, dict):
+            return "Update must be a JSON object"
+
+        scenario = {} if delta.pop("reset", False) else copy.deepcopy(session.scenario)
+        merge_delta(scenario, delta)
+        history = scenario.get("userHistory")
+        if isinstance(history, list) and len(history) > self.max_history:
+            scenario["userHistory"] = history[-self.max_history:]
+        # ASCII-only (non-ASCII is \u-escaped), so its length is its size in bytes
+        if len(json.dumps(scenario)) > self.max_scenario_bytes:
+            return "Scenario too large"
+        session.scenario = scenario
+        session.received += 1
+        return None
+
+    async def _predict_loop(self, websocket, session, compute):
+        while True:
+            await session.changed.wait()
+            loop = asyncio.get_running_loop()
+            wait = session.last_started + self.debounce_seconds - loop.time()
+            if wait > 0:
+                await asyncio.sleep(wait)
+            session.last_started = loop.time()
+            # Everything received up to here is covered by this prediction
+            session.changed.clear()
+            if self.admission is not None and self.admission.acquire("realtime") is not None:
+                retry_after = self.admission.retry_after_seconds()
+                try:
+                    await websocket.send_json({"type": "error", "status": 503, "seq": session.received,
+                                               "retryAfter": retry_after, "detail": "Service overloaded, retry later"})
+                except (WebSocketDisconnect, RuntimeError):
+                    return
+                await asyncio.sleep(retry_after)
+                session.changed.set()
+                continue
+            seq = session.received
+            coalesced = seq - session.predicted
+            session.predicted = seq
+            STREAM_UPDATES.inc(outcome="computed")
+            if coalesced > 1:
+                STREAM_UPDATES.inc(coalesced - 1, outcome="coalesced")
+
+            with self.admission.hold("realtime") if self.admission is not None else contextlib.nullcontext():
+                try:
+                    # The scenario is replaced (never mutated) on update, so no copy is needed
+                    prediction = await run_in_threadpool(compute, session.scenario)
+                    payload = {"type": "prediction", "seq": seq, "coalesced": coalesced, "prediction": prediction}
+                except ValidationError as e:
+                    payload = {"type": "error", "status": 422, "seq": seq,
+                               "detail": [{"loc": list(error["loc"]), "msg": error["msg"]} for error in e.errors()]}
+                except Exception as e:
+                    logger.error(f"Error processing streamed prediction: {str(e)}")
+                    payload = {"type": "error", "status": 500, "seq": seq, "detail": "Internal server error"}
+            try:
+                await websocket.send_json(payload)
+            except (WebSocketDisconnect, RuntimeError):
+                return
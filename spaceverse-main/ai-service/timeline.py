@@ -0,0 +1,133 @@
+"""
+Scenario Timelines
+------------------
+
+Incremental state updates for a sequence of events (launch, adjustment,
+breakup) starting from one initial simulation state.
+
+Each event's state delta mirrors the simulator route (routes/simulator.js): a
+launch adds ``count`` objects to the regime of its altitude and raises
+congestion 1% per object, a breakup adds ``mass / 100`` debris objects (70% /
+20% / the rest of them in LEO / MEO / GEO, only the event's own regime counts)
+and raises congestion 10%, and an adjustment leaves the state unchanged. An
+event may instead carry an explicit ``stateDelta`` (additive counts and
+congestion). A launch places 1 to ``MAX_LAUNCH_COUNT`` objects. Every
+intermediate state builds on the previous one, so the whole timeline becomes
+one feature matrix scored in a single batched pass.
+"""
+
+import numpy as np
+
+EVENT_TYPES = ("launch", "adjustment", "breakup")
+STATE_KEYS = ("objectsInLEO", "objectsInMEO", "objectsInGEO", "averageCongestion")
+# Same regime boundaries as classifyOrbit in the simulator
+LEO_CEILING_KM = 2000
+GEO_ALTITUDE_KM = 35786
+LAUNCH_CONGESTION_FACTOR = 1.01
+BREAKUP_CONGESTION_FACTOR = 1.1
+DEBRIS_MASS_PER_OBJECT = 100  # kg
+BREAKUP_REGIME_SHARE = {"objectsInLEO": 0.7, "objectsInMEO": 0.2}
+# Most objects one launch event places (several full constellation planes)
+MAX_LAUNCH_COUNT = 10000
+
+
+class TimelineError(ValueError):
+    """Raised for an event that cannot be applied"""
+
+
+def regime_key(altitude):
+    """State key counting objects at ``altitude``"""
+    if altitude < LEO_CEILING_KM:
+        return "objectsInLEO"
+    if altitude < GEO_ALTITUDE_KM:
+        return "objectsInMEO"
+    return "objectsInGEO"
+
+
+def breakup_debris(mass, regime):
+    """Debris added to ``regime`` by a breakup, as the simulator distributes it"""
+    debris = int(mass // DEBRIS_MASS_PER_OBJECT)
+    if regime in BREAKUP_REGIME_SHARE:
+        return int(debris * BREAKUP_REGIME_SHARE[regime])
+    return debris - sum(int(debris * share) for share in BREAKUP_REGIME_SHARE.values())
+
+
+def apply_event(state, event):
+    """State after one event; ``state`` is a dict over STATE_KEYS and is not modified
+
+    ``event`` has ``eventType``, ``parameters`` (altitude, mass, ...), optional
+    ``count`` (objects launched) and optional ``stateDelta``.
+    """
+    after = dict(state)
+    delta = event.get("stateDelta")
+    try:
+        if delta:
+            unknown = set(delta) - set(STATE_KEYS)
+            if unknown:
+                raise TimelineError(f"Unknown stateDelta key(s): {', '.join(sorted(unknown))}")
+            for key, value in delta.items():
+                after[key] += float(value)
+        else:
+            event_type = event["eventType"]
+            parameters = event["parameters"]
+            regime = regime_key(parameters["altitude"])
+            if event_type == "launch":
+                count = event.get("count", 1)
+                if not 1 <= count <= MAX_LAUNCH_COUNT:
+                    raise TimelineError(f"Launch count must be between 1 and {MAX_LAUNCH_COUNT}")
+                after[regime] += count
+                after["averageCongestion"] *= LAUNCH_CONGESTION_FACTOR ** count
+            elif event_type == "breakup":
+                after[regime] += breakup_debris(parameters["mass"], regime)
+                after["averageCongestion"] *= BREAKUP_CONGESTION_FACTOR
+            elif event_type != "adjustment":
+                raise TimelineError(f"Invalid event type: {event_type}")
+    except TimelineError:
+        raise
+    except (ArithmeticError, TypeError, ValueError) as e:
+        raise TimelineError(f"Event cannot be applied: {str(e)}")
+
+    if not all(np.isfinite(after[key]) for key in STATE_KEYS):
+        raise TimelineError("Event leaves the state non-finite")
+    for key in STATE_KEYS[:3]:
+        if after[key] < 0:
+            raise TimelineError(f"Event leaves {key} negative")
+    after["averageCongestion"] = min(1.0, max(0.0, after["averageCongestion"]))
+    return after
+
+
+def timeline_features(initial_state, events):
+    """(states, features): the n + 1 states (initial plus after every event) and
+    their (n + 1, 6) feature matrix
+
+    Each state is scored with the parameters of the event that produced it; the
+    initial state uses the first event's parameters.
+    """
+    if not events:
+        raise TimelineError("Timeline must contain at least one event")
+    states = [{key: initial_state[key] for key in STATE_KEYS}]
+    for event in events:
+        states.append(apply_event(states[-1], event))
+
+    parameters = [events[0]["parameters"]] + [event["parameters"] for event in events]
+    features = np.empty((len(states), 6), dtype=np.float64)
+    features[:, 0] = [p["altitude"] for p in parameters]
+    features[:, 1] = [p["inclination"] for p in parameters]
+    features[:, 2] = [p["velocity"] for p in parameters]
+    features[:, 3] = [p["mass"] for p in parameters]
+    features[:, 4] = [s["objectsInLEO"] + s["objectsInMEO"] + s["objectsInGEO"] for s in states]
+    features[:, 5] = [s["averageCongestion"] for s in states]
+    return states, features
+
+
+def impact_scores(ensemble, debris=None):
+    """Vectorized simulate-impact scaling: (collision %, congestion increase %, debris %)"""
+    ensemble = np.asarray(ensemble, dtype=np.float64)
+    collision = np.clip(np.abs(ensemble[:, 0]) * 100, 0, 100)
+    congestion = np.clip(np.abs(ensemble[:, 1]) * 50, 0, 100)
+    secondary_debris = np.clip(np.abs(ensemble[:, 2]) * 25, 0, 100)
+    if debris is not None:
+        debris = np.asarray(debris, dtype=np.float64)
+        ran = ~np.isnan(debris)
+        secondary_debris[ran] = debris[ran] * 100
+    return collision, congestion, secondary_debris
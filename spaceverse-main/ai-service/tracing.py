@@ -0,0 +1,349 @@
+"""
+Request Tracing
+---------------
+
+Lightweight distributed tracing and asynchronous logging for the AI service.
+
+* The trace ID is taken from the gateway's ``X-Trace-Id`` header or a W3C
+  ``traceparent`` header (a new one is generated otherwise) and echoed back in
+  the ``X-Trace-Id`` response header.
+* Sampling is decided once per request (head sampling): upstream-sampled
+  traces are always kept, others with probability ``AI_TRACE_SAMPLE_RATE``,
+  and a token bucket caps sampled traces at ``AI_TRACE_MAX_PER_SECOND``.
+* Spans (one per stage / model call) and span events of sampled traces are
+  queued and written to daily JSONL files in ``AI_TRACE_DIR`` by a background
+  thread. Unsampled requests pay only a context-variable lookup per span.
+* ``configure_logging()`` moves log output behind a QueueHandler so request
+  handlers never block on log I/O, and tags each record with its trace ID.
+  Records logged while handling a sampled trace are also written to the span
+  JSONL files (as ``log`` records of their span), so they share the traces'
+  head sampling and token bucket rather than having a rate of their own.
+"""
+
+import atexit
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import random
+import threading
+import time
+import uuid
+from contextvars import ContextVar
+
+TRACE_ID_HEADER = b"x-trace-id"
+TRACEPARENT_HEADER = b"traceparent"
+SAMPLED_HEADER = b"x-trace-sampled"
+
+TRACE_DIR = os.getenv("AI_TRACE_DIR", "traces")
+SAMPLE_RATE = float(os.getenv("AI_TRACE_SAMPLE_RATE", "0.01"))
+MAX_TRACES_PER_SECOND = float(os.getenv("AI_TRACE_MAX_PER_SECOND", "20"))
+QUEUE_SIZE = int(os.getenv("AI_TRACE_QUEUE_SIZE", "10000"))
+
+# Trace context of the request currently being handled
+_current_trace: ContextVar = ContextVar("trace_context", default=None)
+
+
+class TraceContext:
+    """Per-request trace state"""
+
+    __slots__ = ("trace_id", "sampled", "span_id")
+
+    def __init__(self, trace_id, sampled, span_id=None):
+        self.trace_id = trace_id
+        self.sampled = sampled
+        self.span_id = span_id
+
+
+class _TokenBucket:
+    """Rate limiter for sampled traces"""
+
+    def __init__(self, rate, burst=None):
+        self.rate = rate
+        self.capacity = burst or max(1.0, rate)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def take(self):
+        with self._lock:
+            now = time.monotonic()
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            if self.tokens >= 1:
+                self.tokens -= 1
+                return True
+            return False
+
+
+class SpanWriter:
+    """Background writer draining finished spans from a bounded queue to JSONL files"""
+
+    def __init__(self, directory=TRACE_DIR, maxsize=QUEUE_SIZE):
+        self.directory = directory
+        self.queue = queue.Queue(maxsize=maxsize)
+        self.dropped = 0
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def submit(self, record):
+        """Enqueue a span record without blocking; drop it if the queue is full"""
+        if self._thread is None:
+            self._start()
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+    def _start(self):
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="span-writer", daemon=True)
+                self._thread.start()
+
+    def _run(self):
+        while True:
+            batch = [self.queue.get()]
+            # Drain whatever else is ready so each flush writes many spans
+            while len(batch) < 1000:
+                try:
+                    batch.append(self.queue.get_nowait())
+                except queue.Empty:
+                    break
+            self._write(batch)
+
+    def _write(self, batch):
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            path = os.path.join(self.directory, f"spans-{time.strftime('%Y%m%d')}.jsonl")
+            with open(path, "a") as output:
+                for record in batch:
+                    output.write(json.dumps(record, default=str) + "\n")
+        except OSError:
+            self.dropped += len(batch)
+
+    def flush(self, timeout=5.0):
+        """Wait (bounded) until queued spans have been written"""
+        deadline = time.monotonic() + timeout
+        while not self.queue.empty() and time.monotonic() < deadline:
+            time.sleep(0.01)
+
+
+_writer = SpanWriter()
+_bucket = _TokenBucket(MAX_TRACES_PER_SECOND)
+
+
+def _new_span_id():
+    return uuid.uuid4().hex[:16]
+
+
+class _Span:
+    """Context manager recording one span of a sampled trace"""
+
+    __slots__ = ("name", "context", "attributes", "events", "span_id", "parent_id", "start", "wall_start", "token")
+
+    def __init__(self, name, context, attributes):
+        self.name = name
+        self.context = context
+        self.attributes = attributes
+        self.events = []
+
+    def __enter__(self):
+        self.span_id = _new_span_id()
+        self.parent_id = self.context.span_id
+        self.wall_start = time.time()
+        self.start = time.perf_counter()
+        self.token = _current_trace.set(TraceContext(self.context.trace_id, True, self.span_id))
+        return self
+
+    def __exit__(self, exc_type, exc, traceback):
+        duration = time.perf_counter() - self.start
+        _current_trace.reset(self.token)
+        if exc_type is not None:
+            self.attributes["error"] = f"{exc_type.__name__}: {exc}"
+        _writer.submit({
+            "traceId": self.context.trace_id,
+            "spanId": self.span_id,
+            "parentSpanId": self.parent_id,
+            "name": self.name,
+            "startTime": self.wall_start,
+            "durationMs": duration * 1000,
+            "attributes": self.attributes,
+            "events": self.events,
+        })
+        return False
+
+    def set_attribute(self, key, value):
+        self.attributes[key] = value
+
+    def add_event(self, name, **attributes):
+        self.events.append({"name": name, "time": time.time(), "attributes": attributes})
+
+
+class _NoopSpan:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, traceback):
+        return False
+
+    def set_attribute(self, key, value):
+        pass
+
+    def add_event(self, name, **attributes):
+        pass
+
+
+_NOOP_SPAN = _NoopSpan()
+
+
+def span(name, **attributes):
+    """Record the enclosed block as a span when the current trace is sampled"""
+    context = _current_trace.get()
+    if context is None or not context.sampled:
+        return _NOOP_SPAN
+    return _Span(name, context, attributes)
+
+
+def trace_event(name, **attributes):
+    """Attach a debug event (e.g. model inputs/outputs) to the current sampled trace.
+
+    Events are written as standalone records; unsampled requests skip all work,
+    including formatting the attributes.
+    """
+    context = _current_trace.get()
+    if context is None or not context.sampled:
+        return
+    _writer.submit({
+        "traceId": context.trace_id,
+        "spanId": context.span_id,
+        "event": name,
+        "time": time.time(),
+        "attributes": attributes,
+    })
+
+
+def is_sampled():
+    context = _current_trace.get()
+    return context is not None and context.sampled
+
+
+def current_trace_id():
+    context = _current_trace.get()
+    return context.trace_id if context is not None else None
+
+
+def _incoming_trace(headers):
+    """Return (trace_id, parent_span_id, upstream_sampled) from request headers"""
+    traceparent = headers.get(TRACEPARENT_HEADER)
+    if traceparent:
+        parts = traceparent.decode("latin-1").strip().split("-")
+        if len(parts) == 4 and len(parts[1]) == 32 and len(parts[2]) == 16:
+            return parts[1], parts[2], parts[3] == "01"
+    trace_id = headers.get(TRACE_ID_HEADER)
+    if trace_id:
+        sampled = headers.get(SAMPLED_HEADER, b"").strip() in (b"1", b"true")
+        # Cap length so a hostile header can't bloat every span record
+        return trace_id.decode("latin-1").strip()[:64], None, sampled
+    return uuid.uuid4().hex, None, False
+
+
+class TracingMiddleware:
+    """ASGI middleware establishing the trace context and root span per request"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        headers = dict(scope["headers"])
+        trace_id, parent_id, upstream_sampled = _incoming_trace(headers)
+        sampled = (upstream_sampled or random.random() < SAMPLE_RATE) and _bucket.take()
+        encoded_trace_id = trace_id.encode("latin-1")
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                message = dict(message)
+                message["headers"] = list(message.get("headers", [])) + [(TRACE_ID_HEADER, encoded_trace_id)]
+                if root is not _NOOP_SPAN:
+                    root.set_attribute("http.status_code", message["status"])
+            await send(message)
+
+        token = _current_trace.set(TraceContext(trace_id, sampled, parent_id))
+        try:
+            root = span(f"{scope['method']} {scope['path']}", **{"http.method": scope["method"],
+                                                                 "http.path": scope["path"]})
+            with root:
+                await self.app(scope, receive, send_wrapper)
+        finally:
+            _current_trace.reset(token)
+
+
+class _TraceIdFilter(logging.Filter):
+    """Tag log records with the trace context of the request that emitted them"""
+
+    def filter(self, record):
+        # Captured here: the queue listener formats records on another thread, outside the request context
+        context = _current_trace.get()
+        record.trace_id = context.trace_id if context is not None else "-"
+        record.trace_span_id = context.span_id if context is not None else None
+        record.trace_sampled = context is not None and context.sampled
+        return True
+
+
+class _SampledTraceLogHandler(logging.Handler):
+    """Write records of sampled traces to the span files next to their spans"""
+
+    def emit(self, record):
+        if not getattr(record, "trace_sampled", False):
+            return
+        _writer.submit({
+            "traceId": record.trace_id,
+            "spanId": record.trace_span_id,
+            "log": {"level": record.levelname, "logger": record.name, "message": record.getMessage()},
+            "time": record.created,
+        })
+
+
+_listener = None
+
+
+def configure_logging(level=logging.INFO):
+    """Route all logging through a non-blocking queue drained by a background thread"""
+    global _listener
+    if _listener is not None:
+        return
+
+    console = logging.StreamHandler()
+    console.setFormatter(logging.Formatter("%(levelname)s:%(name)s:[%(trace_id)s] %(message)s"))
+
+    log_queue = queue.Queue(maxsize=QUEUE_SIZE)
+    queue_handler = _DroppingQueueHandler(log_queue)
+    queue_handler.addFilter(_TraceIdFilter())
+
+    root_logger = logging.getLogger()
+    root_logger.handlers[:] = [queue_handler]
+    root_logger.setLevel(level)
+
+    _listener = logging.handlers.QueueListener(log_queue, console, _SampledTraceLogHandler(),
+                                               respect_handler_level=True)
+    _listener.start()
+    atexit.register(_listener.stop)
+
+
+class _DroppingQueueHandler(logging.handlers.QueueHandler):
+    """QueueHandler that drops records instead of blocking when the queue is full"""
+
+    dropped = 0
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            _DroppingQueueHandler.dropped += 1
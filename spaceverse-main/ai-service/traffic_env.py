@@ -0,0 +1,303 @@
+"""
+Traffic Control Environment
+---------------------------
+
+Reinforcement learning environment and policy export for the traffic-control
+recommendations.
+
+* ``TrafficVecEnv`` steps thousands of traffic states per call with NumPy
+  (same dynamics as the original single ``SimpleTrafficEnv``: reward for
+  staying close to the optimal state, actions raise altitude or adjust
+  inclination, 100-step episodes) and implements Stable-Baselines3's
+  ``VecEnv`` interface, so PPO trains on it directly.
+* ``SubprocTrafficVecEnv`` shards the batch over worker processes for
+  multi-core rollouts.
+* ``train_traffic_policy`` trains PPO on it; the result is exported to a
+  ``traffic_policy.NumpyPolicy`` for serving.
+
+Usage (from the ai-service directory, trains and registers the policy as "ppo"):
+    python traffic_env.py [--timesteps 1000000] [--envs 256] [--processes 4]
+"""
+
+import argparse
+import multiprocessing
+import os
+import sys
+import time
+
+import numpy as np
+
+from traffic_policy import N_ACTIONS, OBSERVATION_SIZE, NumpyPolicy, features_to_observations
+
+try:
+    from gymnasium import spaces
+    from stable_baselines3 import PPO
+    from stable_baselines3.common.vec_env import VecEnv
+    RL_AVAILABLE = True
+except ImportError:
+    VecEnv = object
+    RL_AVAILABLE = False
+    print("Stable-Baselines3 not available, RL training disabled")
+
+EPISODE_LENGTH = 100
+
+
+class _BatchedTrafficState:
+    """Vectorized state and dynamics for a batch of traffic environments"""
+
+    def __init__(self, num_envs, episode_length=EPISODE_LENGTH, seed=None):
+        self.rng = np.random.default_rng(seed)
+        self.episode_length = episode_length
+        self.states = self.rng.random((num_envs, OBSERVATION_SIZE), dtype=np.float32)
+        self.step_counts = np.zeros(num_envs, dtype=np.int64)
+
+    def reset(self):
+        self.states = self.rng.random(self.states.shape, dtype=np.float32)
+        self.step_counts[:] = 0
+        return self.states.copy()
+
+    def step(self, actions):
+        """Advance every environment; finished ones are reset in place
+
+        Returns (observations, rewards, dones, terminal_observations), the last
+        holding the final state of each finished environment.
+        """
+        actions = np.asarray(actions).reshape(-1)
+        # Reward for being close to the optimal state (before the action, as in the original env)
+        rewards = -np.abs(self.states - 0.5).sum(axis=1)
+        self.step_counts += 1
+
+        raise_altitude = actions == 1
+        self.states[raise_altitude, 0] = np.minimum(1.0, self.states[raise_altitude, 0] + 0.1)
+        change_inclination = actions == 2
+        self.states[change_inclination, 1] = np.abs(self.states[change_inclination, 1] - 0.1)
+
+        dones = self.step_counts >= self.episode_length
+        terminal_observations = None
+        if dones.any():
+            terminal_observations = self.states[dones].copy()
+            self.states[dones] = self.rng.random((int(dones.sum()), OBSERVATION_SIZE), dtype=np.float32)
+            self.step_counts[dones] = 0
+        return self.states.copy(), rewards.astype(np.float32), dones, terminal_observations
+
+
+def _build_infos(num_envs, dones, terminal_observations):
+    infos = [{} for _ in range(num_envs)]
+    if terminal_observations is not None:
+        for index, terminal in zip(np.flatnonzero(dones), terminal_observations):
+            # Episodes end on the step limit: a truncation, so PPO bootstraps the value
+            infos[index]["terminal_observation"] = terminal
+            infos[index]["TimeLimit.truncated"] = True
+    return infos
+
+
+class _TrafficVecEnvBase(VecEnv):
+    """Shared VecEnv plumbing; subclasses implement _reset() and _step()"""
+
+    def __init__(self, num_envs):
+        self.render_mode = None
+        if RL_AVAILABLE:
+            super().__init__(
+                num_envs,
+                spaces.Box(low=0, high=1, shape=(OBSERVATION_SIZE,), dtype=np.float32),
+                spaces.Discrete(N_ACTIONS),
+            )
+        else:
+            self.num_envs = num_envs
+        self._actions = None
+
+    def reset(self):
+        return self._reset()
+
+    def step_async(self, actions):
+        self._actions = actions
+
+    def step_wait(self):
+        observations, rewards, dones, terminal_observations = self._step(self._actions)
+        return observations, rewards, dones, _build_infos(self.num_envs, dones, terminal_observations)
+
+    def step(self, actions):
+        self.step_async(actions)
+        return self.step_wait()
+
+    def get_attr(self, attr_name, indices=None):
+        return [getattr(self, attr_name)] * len(self._indices(indices))
+
+    def set_attr(self, attr_name, value, indices=None):
+        setattr(self, attr_name, value)
+
+    def env_method(self, method_name, *method_args, indices=None, **method_kwargs):
+        return [None] * len(self._indices(indices))
+
+    def env_is_wrapped(self, wrapper_class, indices=None):
+        return [False] * len(self._indices(indices))
+
+    def _indices(self, indices):
+        if indices is None:
+            return range(self.num_envs)
+        if isinstance(indices, int):
+            return [indices]
+        return indices
+
+
+class TrafficVecEnv(_TrafficVecEnvBase):
+    """All environments stepped in-process as one NumPy batch"""
+
+    def __init__(self, num_envs=1024, episode_length=EPISODE_LENGTH, seed=None):
+        super().__init__(num_envs)
+        self._state = _BatchedTrafficState(num_envs, episode_length, seed)
+
+    def _reset(self):
+        return self._state.reset()
+
+    def _step(self, actions):
+        return self._state.step(actions)
+
+    def close(self):
+        pass
+
+
+def _shard_worker(connection, num_envs, episode_length, seed):
+    state = _BatchedTrafficState(num_envs, episode_length, seed)
+    try:
+        while True:
+            command, payload = connection.recv()
+            if command == "step":
+                connection.send(state.step(payload))
+            elif command == "reset":
+                connection.send(state.reset())
+            elif command == "close":
+                break
+    finally:
+        connection.close()
+
+
+class SubprocTrafficVecEnv(_TrafficVecEnvBase):
+    """Environments sharded over worker processes, each stepping its shard as a NumPy batch"""
+
+    def __init__(self, num_envs=4096, n_processes=4, episode_length=EPISODE_LENGTH, seed=0):
+        super().__init__(num_envs)
+        self._shards = np.array_split(np.arange(num_envs), n_processes)
+        context = multiprocessing.get_context("spawn")
+        self._connections = []
+        self._processes = []
+        for index, shard in enumerate(self._shards):
+            parent, child = context.Pipe()
+            process = context.Process(target=_shard_worker, args=(child, len(shard), episode_length, seed + index),
+                                      daemon=True)
+            process.start()
+            child.close()
+            self._connections.append(parent)
+            self._processes.append(process)
+
+    def _reset(self):
+        for connection in self._connections:
+            connection.send(("reset", None))
+        return np.concatenate([connection.recv() for connection in self._connections])
+
+    def _step(self, actions):
+        actions = np.asarray(actions).reshape(-1)
+        for connection, shard in zip(self._connections, self._shards):
+            connection.send(("step", actions[shard]))
+        results = [connection.recv() for connection in self._connections]
+        observations = np.concatenate([result[0] for result in results])
+        rewards = np.concatenate([result[1] for result in results])
+        dones = np.concatenate([result[2] for result in results])
+        terminals = [result[3] for result in results if result[3] is not None]
+        return observations, rewards, dones, np.concatenate(terminals) if terminals else None
+
+    def close(self):
+        for connection in self._connections:
+            try:
+                connection.send(("close", None))
+            except (BrokenPipeError, EOFError):
+                pass
+        for process in self._processes:
+            process.join(timeout=5)
+
+
+def make_traffic_vec_env(num_envs=1024, n_processes=1, seed=0):
+    if n_processes > 1:
+        return SubprocTrafficVecEnv(num_envs, n_processes, seed=seed)
+    return TrafficVecEnv(num_envs, seed=seed)
+
+
+def evaluate_policy(predict, num_envs=1024, episodes=1, seed=123):
+    """Mean episode return of ``predict(observations) -> actions`` over a batch of environments"""
+    state = _BatchedTrafficState(num_envs, seed=seed)
+    observations = state.reset()
+    total = np.zeros(num_envs)
+    for _ in range(EPISODE_LENGTH * episodes):
+        observations, rewards, _, _ = state.step(predict(observations))
+        total += rewards
+    return float(total.mean() / episodes)
+
+
+def train_traffic_policy(total_timesteps=1000000, n_envs=256, n_processes=1, seed=0, n_steps=64, verbose=0):
+    """Train PPO on the vectorized environment; returns (model, training seconds)
+
+    Short rollouts over many environments with several epochs per update;
+    gamma 0.95 suits the 100-step episodes (converges within ~1M steps,
+    where gamma 0.99 settles on "do nothing").
+    """
+    if not RL_AVAILABLE:
+        raise RuntimeError("Stable-Baselines3 is required to train the traffic policy")
+    env = make_traffic_vec_env(n_envs, n_processes, seed)
+    try:
+        model = PPO("MlpPolicy", env, n_steps=n_steps, batch_size=min(2048, n_envs * n_steps), n_epochs=10,
+                    learning_rate=1e-3, gamma=0.95, seed=seed, verbose=verbose, device="cpu")
+        start = time.perf_counter()
+        model.learn(total_timesteps=total_timesteps)
+        return model, time.perf_counter() - start
+    finally:
+        env.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--timesteps", type=int, default=1000000)
+    parser.add_argument("--envs", type=int, default=256, help="parallel environments")
+    parser.add_argument("--processes", type=int, default=1, help="rollout worker processes")
+    parser.add_argument("--n-steps", type=int, default=64, help="PPO rollout length per environment")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--no-register", action="store_true", help="train and evaluate only")
+    parser.add_argument("--output", help="write the exported NumPy policy to this file (joblib)")
+    args = parser.parse_args()
+
+    model, seconds = train_traffic_policy(args.timesteps, args.envs, args.processes, args.seed, args.n_steps)
+    policy = NumpyPolicy.from_sb3(model)
+
+    rng = np.random.default_rng(0)
+    learned = evaluate_policy(lambda obs: policy.predict(obs)[0])
+    random_return = evaluate_policy(lambda obs: rng.integers(0, N_ACTIONS, len(obs)))
+    idle_return = evaluate_policy(lambda obs: np.zeros(len(obs), dtype=np.int64))
+    print(f"Trained {args.timesteps} steps in {seconds:.1f}s ({args.timesteps / seconds:,.0f} steps/s)")
+    print(f"Mean episode return: policy {learned:.2f}, random {random_return:.2f}, do-nothing {idle_return:.2f}")
+
+    batch = features_to_observations(np.tile([[500, 45, 7.8, 1000, 5500, 0.5]], (10000, 1)))
+    start = time.perf_counter()
+    policy.predict(batch)
+    print(f"NumPy policy: {(time.perf_counter() - start) * 1e6 / len(batch):.2f} us/observation in a batch of 10000")
+
+    if args.output:
+        import joblib
+
+        joblib.dump(policy, args.output)
+
+    if not args.no_register:
+        from model_registry import ModelRegistry
+
+        registry = ModelRegistry(os.getenv("AI_MODEL_REGISTRY_DIR", "models/registry"))
+        version = registry.register("ppo", policy, {
+            "source": "ppo-training",
+            "timings": {"trainSeconds": seconds},
+            "metrics": {"meanEpisodeReturn": learned, "randomReturn": random_return, "idleReturn": idle_return},
+            "training": {"timesteps": args.timesteps, "envs": args.envs, "processes": args.processes},
+        })
+        registry.promote("ppo", version)
+        print(f"Registered and promoted ppo version {version}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,98 @@
+"""
+Traffic Control Policy
+----------------------
+
+Serving side of the traffic-control reinforcement learning model.
+
+``NumpyPolicy`` is the PPO actor network exported to NumPy: it has the same
+``predict(observation)`` interface as the Stable-Baselines3 model, scores a
+whole batch of observations in one call and needs neither torch nor SB3.
+Training (traffic_env.py) runs in a separate interpreter via
+``train_policy_in_subprocess`` so torch is never loaded next to TensorFlow in
+the service process.
+"""
+
+import importlib.util
+import logging
+import os
+import subprocess
+import sys
+import tempfile
+
+import joblib
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+RL_AVAILABLE = importlib.util.find_spec("stable_baselines3") is not None
+if not RL_AVAILABLE:
+    print("Stable-Baselines3 not available, RL features disabled")
+
+N_ACTIONS = 3  # 0: do nothing, 1: increase altitude, 2: change inclination
+OBSERVATION_SIZE = 6
+# Feature scaling used to turn a feature row into an observation
+OBSERVATION_SCALE = np.array([2000, 180, 15, 10000, 10000, 1])
+
+TRAFFIC_ENV_SCRIPT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "traffic_env.py")
+
+
+def features_to_observations(features):
+    """Normalize (n, 6) feature rows into [0, 1] policy observations"""
+    return np.clip(np.asarray(features, dtype=np.float64) / OBSERVATION_SCALE, 0, 1).astype(np.float32)
+
+
+class NumpyPolicy:
+    """Deterministic PPO actor (MLP + action head) evaluated with NumPy"""
+
+    ACTIVATIONS = {
+        "tanh": np.tanh,
+        "relu": lambda x: np.maximum(x, 0.0),
+    }
+
+    def __init__(self, weights, biases, activation="tanh"):
+        self.weights = weights
+        self.biases = biases
+        self.activation = activation
+
+    @classmethod
+    def from_sb3(cls, model):
+        """Export the actor network of a trained Stable-Baselines3 PPO model"""
+        policy = model.policy
+        state = {key: value.detach().cpu().numpy() for key, value in policy.state_dict().items()}
+        prefix = "mlp_extractor.policy_net."
+        layer_ids = sorted({int(key[len(prefix):].split(".")[0]) for key in state if key.startswith(prefix)})
+        weights = [state[f"{prefix}{i}.weight"].T.astype(np.float64) for i in layer_ids]
+        biases = [state[f"{prefix}{i}.bias"].astype(np.float64) for i in layer_ids]
+        weights.append(state["action_net.weight"].T.astype(np.float64))
+        biases.append(state["action_net.bias"].astype(np.float64))
+        activation = type(policy.activation_fn()).__name__.lower()
+        return cls(weights, biases, activation)
+
+    def action_logits(self, observations):
+        hidden = np.asarray(observations, dtype=np.float64)
+        activate = self.ACTIVATIONS[self.activation]
+        for weights, biases in zip(self.weights[:-1], self.biases[:-1]):
+            hidden = activate(hidden @ weights + biases)
+        return hidden @ self.weights[-1] + self.biases[-1]
+
+    def predict(self, observation, deterministic=True):
+        """SB3-compatible: returns (action(s), None) for one observation or a batch"""
+        observation = np.asarray(observation, dtype=np.float64)
+        single = observation.ndim == 1
+        actions = self.action_logits(observation.reshape(-1, OBSERVATION_SIZE)).argmax(axis=1)
+        return (actions[0] if single else actions), None
+
+
+def train_policy_in_subprocess(total_timesteps, timeout=600):
+    """Train PPO with traffic_env.py in a fresh interpreter and load the exported policy"""
+    with tempfile.TemporaryDirectory(prefix="ai-ppo-") as workdir:
+        output = os.path.join(workdir, "policy.joblib")
+        result = subprocess.run(
+            [sys.executable, TRAFFIC_ENV_SCRIPT, "--timesteps", str(total_timesteps), "--no-register",
+             "--output", output],
+            capture_output=True, text=True, timeout=timeout,
+        )
+        if result.returncode != 0:
+            raise RuntimeError(f"Policy training exited with {result.returncode}: {result.stderr.strip()[-500:]}")
+        logger.info(result.stdout.strip().replace("\n", "; "))
+        return joblib.load(output)
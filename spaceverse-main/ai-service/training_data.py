@@ -0,0 +1,79 @@
+"""
+Synthetic Training Data
+-----------------------
+
+Generator for the synthetic space traffic dataset the service's models are
+bootstrapped on. Kept separate from ai_service.py so tools (registry
+evaluation, benchmarks) can build training/validation sets without loading
+the deep learning stack.
+"""
+
+import numpy as np
+
+# Feature order shared by every model: altitude, inclination, velocity, mass,
+# objects_in_orbit, congestion_level
+FEATURE_NAMES = ("altitude", "inclination", "velocity", "mass", "objectsInOrbit", "averageCongestion")
+TARGET_NAMES = ("collision", "congestion", "debris")
+
+
+def generate_synthetic_training_data(n_samples=1000, seed=42):
+    """Return (X, y) with X of shape (n_samples, 6) and y of shape (n_samples, 3)
+
+    With the default seed this reproduces the dataset the models have always
+    been trained on.
+    """
+    # Local generator: same stream as seeding the global one, without resetting it for everyone else
+    rng = np.random.RandomState(seed)
+
+    # Features: altitude, inclination, velocity, mass, objects_in_orbit, congestion_level
+    altitude = rng.uniform(200, 2000, n_samples)  # km
+    inclination = rng.uniform(0, 180, n_samples)  # degrees
+    velocity = rng.uniform(6, 8, n_samples)  # km/s (typical orbital velocities)
+    mass = rng.uniform(100, 5000, n_samples)  # kg
+
+    # Derived features
+    objects_in_orbit = rng.randint(1000, 5000, n_samples)
+    congestion_level = rng.uniform(0, 1, n_samples)
+
+    # Combine features
+    X = np.column_stack([
+        altitude,
+        inclination,
+        velocity,
+        mass,
+        objects_in_orbit,
+        congestion_level
+    ])
+
+    # Target variables (synthetic but realistic relationships)
+    # Collision risk increases with congestion and mass, decreases with altitude
+    collision_risk = (
+        0.3 * congestion_level +
+        0.2 * (mass / 5000) +
+        0.1 * (1 - altitude / 2000) +
+        0.1 * rng.normal(0, 0.1, n_samples)
+    )
+
+    # Congestion increase depends on objects added and current congestion
+    congestion_increase = (
+        0.4 * (objects_in_orbit / 5000) +
+        0.3 * congestion_level +
+        0.2 * (mass / 5000) +
+        0.1 * rng.normal(0, 0.1, n_samples)
+    )
+
+    # Debris probability increases with mass and velocity (kinetic energy)
+    debris_probability = (
+        0.5 * (mass / 5000) +
+        0.3 * ((velocity - 6) / 2) +
+        0.2 * rng.normal(0, 0.1, n_samples)
+    )
+
+    # Clip to valid ranges
+    y = np.column_stack([
+        np.clip(collision_risk, 0, 1),
+        np.clip(congestion_increase, 0, 1),
+        np.clip(debris_probability, 0, 1)
+    ])
+
+    return X, y
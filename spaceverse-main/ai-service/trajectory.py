@@ -0,0 +1,197 @@
+"""
+Trajectories
+------------
+
+Orbit paths for the 3D visualizations: many objects propagated at once and
+decimated to what is visible on screen, packed as float32 vertex buffers.
+
+Propagation is analytic: Keplerian motion plus the secular J2 drift of the
+node, the argument of perigee and the mean anomaly, evaluated for every
+object at every sample time in one vectorized pass (no step-by-step
+integration, so there is no integration error to accumulate over long
+spans). Drag is left out; over the horizons the views show, its decay stays
+far below a pixel.
+
+Objects are given as orbital elements (``altitude`` for a circular orbit or
+``semiMajorAxis`` / ``eccentricity``, ``inclination``, ``raan``,
+``argumentOfPerigee``, ``trueAnomaly``; km and degrees) or as an ECI state
+(``position`` km, ``velocity`` km/s).
+
+Decimation is driven by curvature. A chord spanning arc length L of a curve
+with curvature k deviates from it by about k L^2 / 8, so a chord stays
+within ``tolerance_km`` while the integral of sqrt(k / (8 tolerance)) along
+it is at most 1. Each vertex is the farthest sample still within that
+budget of the previous one (all objects advance together), which puts
+vertices close together around a tight perigee and far apart on a gentle
+apogee arc. The tolerance comes from the screen: pixels
+of allowed error times kilometres per pixel.
+
+Positions of all objects share one (points, 3) float32 buffer in ECI km;
+per-object offsets and counts index it, so each object is one draw range.
+With delta encoding every point after an object's first is stored as the
+difference from the previous one (summing them in double precision, as
+JavaScript numbers do, restores the positions to float32 accuracy).
+"""
+
+import numpy as np
+
+from optimizer import EARTH_MU, EARTH_RADIUS_KM
+
+J2 = 1.08263e-3
+KEPLER_ITERATIONS = 8
+# Below these, the perigee / node direction is undefined and taken as the reference
+CIRCULAR_ECCENTRICITY = 1e-9
+EQUATORIAL_SINE = 1e-9
+ELEMENT_KEYS = ("semiMajorAxis", "eccentricity", "inclination", "raan", "argumentOfPerigee", "trueAnomaly")
+
+
+class TrajectoryError(ValueError):
+    """Raised for an object or request that cannot be propagated"""
+
+
+def _unit(vectors):
+    return vectors / np.linalg.norm(vectors, axis=-1, keepdims=True)
+
+
+def state_to_elements(position, velocity):
+    """Element arrays (ELEMENT_KEYS order, angles in radians) of (n, 3) ECI states"""
+    h = np.cross(position, velocity)
+    r = np.linalg.norm(position, axis=1)
+    speed2 = np.einsum("ij,ij->i", velocity, velocity)
+    h_unit = _unit(h)
+    # Eccentricity vector, pointing at perigee
+    e_vector = ((speed2 - EARTH_MU / r)[:, None] * position
+                - np.einsum("ij,ij->i", position, velocity)[:, None] * velocity) / EARTH_MU
+    eccentricity = np.linalg.norm(e_vector, axis=1)
+    semi_major_axis = 1 / (2 / r - speed2 / EARTH_MU)
+
+    node = np.column_stack([-h[:, 1], h[:, 0], np.zeros(len(h))])
+    equatorial = np.linalg.norm(node, axis=1) < EQUATORIAL_SINE * np.linalg.norm(h, axis=1)
+    node[equatorial] = (1.0, 0.0, 0.0)
+    node = _unit(node)
+    perigee = np.where((eccentricity < CIRCULAR_ECCENTRICITY)[:, None], node,
+                       e_vector / np.maximum(eccentricity, CIRCULAR_ECCENTRICITY)[:, None])
+
+    def angle(start, end):
+        # Signed angle from start to end about the orbit normal
+        return np.arctan2(np.einsum("ij,ij->i", h_unit, np.cross(start, end)), np.einsum("ij,ij->i", start, end))
+
+    return (semi_major_axis, eccentricity, np.arccos(np.clip(h_unit[:, 2], -1, 1)),
+            np.arctan2(node[:, 1], node[:, 0]), angle(node, perigee), angle(perigee, _unit(position)))
+
+
+def object_elements(objects):
+    """Element arrays (ELEMENT_KEYS order, angles in radians) of object dicts"""
+    elements = np.empty((len(ELEMENT_KEYS), len(objects)))
+    states = []
+    for i, item in enumerate(objects):
+        if item.get("position") is not None or item.get("velocity") is not None:
+            if len(item.get("position") or ()) != 3 or len(item.get("velocity") or ()) != 3:
+                raise TrajectoryError(f"Object {i}: position and velocity must both be [x, y, z]")
+            states.append(i)
+            continue
+        if item.get("semiMajorAxis") is not None:
+            semi_major_axis = item["semiMajorAxis"]
+        elif item.get("altitude") is not None:
+            semi_major_axis = EARTH_RADIUS_KM + item["altitude"]
+        else:
+            raise TrajectoryError(f"Object {i}: give altitude, semiMajorAxis or position and velocity")
+        elements[:, i] = (semi_major_axis, item.get("eccentricity") or 0.0,
+                          *np.radians([item.get(key) or 0.0 for key in ELEMENT_KEYS[2:]]))
+    if states:
+        position = np.array([objects[i]["position"] for i in states], dtype=np.float64)
+        velocity = np.array([objects[i]["velocity"] for i in states], dtype=np.float64)
+        elements[:, states] = state_to_elements(position, velocity)
+
+    semi_major_axis, eccentricity = elements[0], elements[1]
+    for i in np.flatnonzero(~((eccentricity >= 0) & (eccentricity < 1))):
+        raise TrajectoryError(f"Object {i}: only closed orbits can be drawn (eccentricity {eccentricity[i]:.3f})")
+    for i in np.flatnonzero(~(semi_major_axis * (1 - eccentricity) > EARTH_RADIUS_KM)):
+        raise TrajectoryError(f"Object {i}: perigee is below the Earth's surface")
+    return elements
+
+
+def propagate(elements, times):
+    """(n, len(times), 3) ECI positions (km) and curvature (1/km) at ``times`` seconds"""
+    a, e, inclination, raan0, perigee0, anomaly0 = (value[:, None] for value in elements)
+    mean_motion = np.sqrt(EARTH_MU / a ** 3)
+    root = np.sqrt(1 - e ** 2)
+    # Secular J2 rates
+    j2_rate = 1.5 * J2 * mean_motion * (EARTH_RADIUS_KM / (a * root ** 2)) ** 2
+    cos_i = np.cos(inclination)
+    raan = raan0 - j2_rate * cos_i * times
+    perigee = perigee0 + 0.5 * j2_rate * (5 * cos_i ** 2 - 1) * times
+    eccentric0 = 2 * np.arctan(np.sqrt((1 - e) / (1 + e)) * np.tan(anomaly0 / 2))
+    mean_anomaly = (eccentric0 - e * np.sin(eccentric0)
+                    + (mean_motion + 0.5 * j2_rate * root * (3 * cos_i ** 2 - 1)) * times)
+
+    # Kepler's equation by Newton iterations, all objects and times at once
+    eccentric = np.where(e < 0.8, mean_anomaly, np.pi)
+    for _ in range(KEPLER_ITERATIONS):
+        eccentric -= (eccentric - e * np.sin(eccentric) - mean_anomaly) / (1 - e * np.cos(eccentric))
+    x = a * (np.cos(eccentric) - e)
+    y = a * root * np.sin(eccentric)
+
+    cos_raan, sin_raan = np.cos(raan), np.sin(raan)
+    cos_perigee, sin_perigee = np.cos(perigee), np.sin(perigee)
+    sin_i = np.sin(inclination)
+    positions = np.empty(x.shape + (3,))
+    positions[..., 0] = ((cos_raan * cos_perigee - sin_raan * sin_perigee * cos_i) * x
+                         - (cos_raan * sin_perigee + sin_raan * cos_perigee * cos_i) * y)
+    positions[..., 1] = ((sin_raan * cos_perigee + cos_raan * sin_perigee * cos_i) * x
+                         + (cos_raan * cos_perigee * cos_i - sin_raan * sin_perigee) * y)
+    positions[..., 2] = sin_perigee * sin_i * x + cos_perigee * sin_i * y
+
+    # Curvature of the Kepler orbit: mu h / (r^3 v^3)
+    r = a * (1 - e * np.cos(eccentric))
+    speed = np.sqrt(EARTH_MU * (2 / r - 1 / a))
+    curvature = EARTH_MU * np.sqrt(EARTH_MU * a) * root / (r ** 3 * speed ** 3)
+    return positions, curvature
+
+
+def decimate(positions, curvature, tolerance_km):
+    """(n, samples) mask of the samples to keep so chords stay within ``tolerance_km``"""
+    n_objects, n_samples = curvature.shape
+    steps = np.linalg.norm(np.diff(positions, axis=1), axis=2)
+    density = np.sqrt(curvature / (8 * tolerance_km))
+    budget = np.zeros(curvature.shape)
+    np.cumsum(0.5 * (density[:, 1:] + density[:, :-1]) * steps, axis=1, out=budget[:, 1:])
+    # Rows laid end to end, so one search advances every object at once
+    row_span = budget[:, -1].max() + 2
+    flat = (budget + row_span * np.arange(n_objects)[:, None]).ravel()
+    row_start = np.arange(n_objects) * n_samples
+    keep = np.zeros(flat.shape, dtype=bool)
+    current = row_start.copy()
+    keep[current] = True
+    active = np.ones(n_objects, dtype=bool)
+    while active.any():
+        # Farthest sample whose chord from the current vertex is within budget, at least one step on
+        reach = np.searchsorted(flat, flat[current] + 1, side="right") - 1
+        current = np.where(active, np.clip(np.maximum(reach, current + 1), None, row_start + n_samples - 1), current)
+        keep[current[active]] = True
+        active &= current < row_start + n_samples - 1
+    return keep.reshape(n_objects, n_samples)
+
+
+def generate_trajectories(objects, duration, step, tolerance_km, delta=False):
+    """Decimated paths of ``objects`` over ``duration`` seconds sampled every ``step``
+
+    Returns (positions (points, 3) float32, times (points,) float32, offsets,
+    counts, samples per object).
+    """
+    elements = object_elements(objects)
+    times = np.arange(0.0, duration + 0.5 * step, step)
+    positions, curvature = propagate(elements, times)
+    keep = decimate(positions, curvature, tolerance_km)
+    rows, columns = np.nonzero(keep)
+    counts = keep.sum(axis=1)
+    offsets = np.concatenate([[0], np.cumsum(counts)[:-1]])
+
+    kept = positions[rows, columns]
+    if delta:
+        # Within each object: first point absolute, then steps from the previous point
+        deltas = np.diff(kept, axis=0)
+        first = np.zeros(len(kept), dtype=bool)
+        first[offsets] = True
+        kept[~first] = deltas[~first[1:]]
+    return kept.astype(np.float32), times[columns].astype(np.float32), offsets, counts, len(times)
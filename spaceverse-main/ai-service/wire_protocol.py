@@ -0,0 +1,234 @@
+"""
+Wire Protocol
+-------------
+
+Content negotiation for the AI service. Responses are encoded according to
+the caller's ``Accept`` header:
+
+* ``application/json`` (default) - encoded with orjson when installed
+* ``application/msgpack`` - MessagePack, for the Node gateway and batch callers
+* ``application/x-float32`` - raw little-endian float32 matrix, only for
+  array-heavy responses (shape and column names travel in headers)
+
+Request bodies sent as MessagePack are decoded transparently, so every
+existing Pydantic endpoint accepts them without changes. Bodies decoded here
+are refused with 413 beyond ``AI_MAX_BODY_BYTES``, and large ones are decoded
+in the thread pool so the event loop keeps serving other requests.
+"""
+
+import json
+import os
+from contextvars import ContextVar
+
+import numpy as np
+from fastapi import HTTPException, Request
+from fastapi.responses import Response
+from fastapi.routing import APIRoute
+from starlette.concurrency import run_in_threadpool
+
+try:
+    import orjson
+    ORJSON_AVAILABLE = True
+except ImportError:
+    ORJSON_AVAILABLE = False
+    print("orjson not available, falling back to the standard json encoder")
+
+try:
+    import msgpack
+    MSGPACK_AVAILABLE = True
+except ImportError:
+    MSGPACK_AVAILABLE = False
+    print("msgpack not available, MessagePack responses disabled")
+
+JSON_MEDIA_TYPE = "application/json"
+MSGPACK_MEDIA_TYPE = "application/msgpack"
+MSGPACK_MEDIA_TYPES = ("application/msgpack", "application/x-msgpack", "application/vnd.msgpack")
+FLOAT32_MEDIA_TYPE = "application/x-float32"
+
+MAX_BODY_BYTES = int(os.getenv("AI_MAX_BODY_BYTES", str(64 * 1024 * 1024)))
+# Bodies from this size are decoded in the thread pool instead of on the event loop
+THREADPOOL_DECODE_BYTES = 256 * 1024
+
+# Accept header of the request currently being handled (set by NegotiatedRoute)
+_accept_header: ContextVar[str] = ContextVar("accept_header", default="")
+
+
+def negotiate_media_type(accept, allow_float32=False):
+    """Pick the response media type for an Accept header value.
+
+    Entries are tried in descending q-value order; anything unknown or
+    unavailable falls back to JSON.
+    """
+    if not accept:
+        return JSON_MEDIA_TYPE
+
+    candidates = []
+    for position, entry in enumerate(accept.split(",")):
+        parts = entry.strip().split(";")
+        media_type = parts[0].strip().lower()
+        quality = 1.0
+        for param in parts[1:]:
+            name, _, value = param.strip().partition("=")
+            if name == "q":
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+        if quality > 0:
+            candidates.append((-quality, position, media_type))
+
+    for _, _, media_type in sorted(candidates):
+        if media_type in MSGPACK_MEDIA_TYPES and MSGPACK_AVAILABLE:
+            return MSGPACK_MEDIA_TYPE
+        if media_type == FLOAT32_MEDIA_TYPE and allow_float32:
+            return FLOAT32_MEDIA_TYPE
+        if media_type in (JSON_MEDIA_TYPE, "application/*", "*/*"):
+            return JSON_MEDIA_TYPE
+
+    return JSON_MEDIA_TYPE
+
+
+def _default(obj):
+    """Fallback encoder for values the fast encoders don't handle natively"""
+    if isinstance(obj, np.ndarray):
+        return obj.tolist()
+    if isinstance(obj, np.generic):
+        return obj.item()
+    raise TypeError(f"Object of type {type(obj).__name__} is not serializable")
+
+
+def encode_json(content):
+    """Encode content as JSON bytes (orjson when available)"""
+    if ORJSON_AVAILABLE:
+        return orjson.dumps(content, default=_default, option=orjson.OPT_SERIALIZE_NUMPY)
+    return json.dumps(content, default=_default, separators=(",", ":")).encode("utf-8")
+
+
+def decode_json(body):
+    """Decode JSON bytes (orjson when available)"""
+    if ORJSON_AVAILABLE:
+        return orjson.loads(body)
+    return json.loads(body)
+
+
+def encode_msgpack(content):
+    """Encode content as MessagePack bytes"""
+    return msgpack.packb(content, default=_default, use_bin_type=True)
+
+
+def decode_msgpack(body):
+    """Decode MessagePack bytes"""
+    return msgpack.unpackb(body, raw=False)
+
+
+def encode_float32(array):
+    """Encode a 1-D or 2-D array as raw little-endian float32 bytes"""
+    return np.ascontiguousarray(array, dtype="<f4").tobytes()
+
+
+def decode_float32(body, shape=None):
+    """Decode a raw little-endian float32 body back into an array"""
+    array = np.frombuffer(body, dtype="<f4")
+    return array.reshape(shape) if shape is not None else array
+
+
+class NegotiatedResponse(Response):
+    """Response encoded according to the Accept header of the current request.
+
+    Used as the app's default response class, so Pydantic responses are
+    rendered by orjson/msgpack instead of the standard json module. Endpoints
+    with large float outputs can also construct it directly with ``array=``
+    (an ``(n, m)`` matrix) and ``columns=`` to allow raw float32 bodies.
+    """
+
+    media_type = JSON_MEDIA_TYPE
+
+    def __init__(self, content=None, status_code=200, headers=None, media_type=None,
+                 background=None, array=None, columns=None):
+        self.array = array
+        self.columns = columns
+        if media_type is None:
+            media_type = negotiate_media_type(_accept_header.get(), allow_float32=array is not None)
+        self.media_type = media_type
+        super().__init__(content, status_code, headers, media_type, background)
+        if media_type == FLOAT32_MEDIA_TYPE:
+            matrix = np.asarray(array)
+            self.headers["x-array-shape"] = ",".join(str(dim) for dim in matrix.shape)
+            if columns:
+                self.headers["x-array-columns"] = ",".join(columns)
+        self.headers["vary"] = "Accept"
+
+    def render(self, content):
+        if self.media_type == FLOAT32_MEDIA_TYPE:
+            return encode_float32(self.array)
+        if self.media_type == MSGPACK_MEDIA_TYPE:
+            return encode_msgpack(content)
+        return encode_json(content)
+
+
+class NegotiatedRoute(APIRoute):
+    """Route class that records the Accept header and decodes MessagePack bodies"""
+
+    def get_route_handler(self):
+        original_handler = super().get_route_handler()
+
+        async def negotiated_handler(request: Request):
+            content_type = request.headers.get("content-type", "").split(";")[0].strip().lower()
+            if content_type in MSGPACK_MEDIA_TYPES and MSGPACK_AVAILABLE:
+                request = await _as_json_request(request)
+
+            token = _accept_header.set(request.headers.get("accept", ""))
+            try:
+                return await original_handler(request)
+            finally:
+                _accept_header.reset(token)
+
+        return negotiated_handler
+
+
+async def read_body(request, limit=MAX_BODY_BYTES):
+    """Request body, refused with 413 once it exceeds ``limit`` bytes"""
+    if hasattr(request, "_body"):
+        return request._body
+    declared = request.headers.get("content-length", "")
+    if declared.isdigit() and int(declared) > limit:
+        raise HTTPException(status_code=413, detail=f"Request body exceeds {limit} bytes")
+    chunks = []
+    size = 0
+    async for chunk in request.stream():
+        size += len(chunk)
+        if size > limit:
+            raise HTTPException(status_code=413, detail=f"Request body exceeds {limit} bytes")
+        chunks.append(chunk)
+    # Cached where Request.body() looks for it
+    request._body = b"".join(chunks)
+    return request._body
+
+
+async def decode_off_loop(decode, body):
+    """``decode(body)``, in the thread pool when the body is large"""
+    if len(body) >= THREADPOOL_DECODE_BYTES:
+        return await run_in_threadpool(decode, body)
+    return decode(body)
+
+
+async def _as_json_request(request):
+    """Re-wrap a MessagePack request so FastAPI validates it like a JSON body"""
+    body = await read_body(request)
+    scope = dict(request.scope)
+    scope["headers"] = [
+        (name, b"application/json" if name == b"content-type" else value)
+        for name, value in request.scope["headers"]
+    ]
+    json_request = Request(scope, request.receive)
+    json_request._body = body
+    json_request._json = await decode_off_loop(decode_msgpack, body) if body else None
+    return json_request
+
+
+async def decode_request_body(request):
+    """Decode a JSON or MessagePack request body for endpoints that skip Pydantic"""
+    if hasattr(request, "_json"):
+        # Already decoded (e.g. a MessagePack body re-wrapped by NegotiatedRoute)
+        return request._json
+    return await decode_off_loop(decode_json, await read_body(request))
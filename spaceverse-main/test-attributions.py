@@ -0,0 +1,95 @@
+import itertools
+import math
+import os
+import sys
+
+import numpy as np
+from sklearn.ensemble import RandomForestRegressor
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "ai-service"))
+
+from attributions import ForestExplainer
+from model_heads import MultiHeadModel
+from training_data import TARGET_NAMES, generate_synthetic_training_data
+
+TOLERANCE = 1e-6
+
+
+def conditional_expectation(tree, row, known, column):
+    """Path-dependent E[f(x) | x_known]: follow the row on known features, weight children by cover otherwise"""
+    def visit(node):
+        left, right = tree.children_left[node], tree.children_right[node]
+        if left == -1:
+            return tree.value[node, column, 0]
+        feature = tree.feature[node]
+        if feature in known:
+            return visit(left if row[feature] <= tree.threshold[node] else right)
+        weight = tree.weighted_n_node_samples
+        return (weight[left] * visit(left) + weight[right] * visit(right)) / weight[node]
+    return visit(0)
+
+
+def brute_force_shapley(estimator_columns, row):
+    """Exact Shapley values of the path-dependent game, by enumerating every coalition"""
+    n_features = len(row)
+    result = np.zeros((len(estimator_columns), n_features))
+    for output, (model, column) in enumerate(estimator_columns):
+        trees = [estimator.tree_ for estimator in model.estimators_]
+        def value(known):
+            return np.mean([conditional_expectation(tree, row, known, column) for tree in trees])
+        for i in range(n_features):
+            others = [j for j in range(n_features) if j != i]
+            for size in range(n_features):
+                weight = math.factorial(size) * math.factorial(n_features - size - 1) / math.factorial(n_features)
+                for coalition in itertools.combinations(others, size):
+                    known = set(coalition)
+                    result[output, i] += weight * (value(known | {i}) - value(known))
+    return result
+
+
+def check(name, passed, detail):
+    print(f"   {'✅' if passed else '❌'} {name}: {detail}")
+    return passed
+
+
+def test_attributions():
+    print("🧪 Testing TreeSHAP attributions (ai-service/attributions.py)")
+    print("=" * 50)
+    X, y = generate_synthetic_training_data(500, seed=0)
+    X_rows, _ = generate_synthetic_training_data(20, seed=1)
+    # Explanations see the float32 features the trees split on
+    X_rows = X_rows.astype(np.float32).astype(np.float64)
+
+    forest = RandomForestRegressor(n_estimators=5, max_depth=6, random_state=0).fit(X, y)
+    heads = MultiHeadModel({
+        target: RandomForestRegressor(n_estimators=5, max_depth=6, random_state=i).fit(X, y[:, i])
+        for i, target in enumerate(TARGET_NAMES)
+    })
+
+    passed = True
+    for label, model in (("multi-output forest", forest), ("per-target heads", heads)):
+        print(f"\n{label}")
+        explainer = ForestExplainer(model)
+        attributions = explainer.explain(X_rows)
+
+        additivity = np.abs(explainer.base_values + attributions.sum(axis=2) - model.predict(X_rows)).max()
+        passed &= check("additivity", additivity < TOLERANCE, f"max |base + sum - prediction| = {additivity:.2e}")
+
+        if hasattr(model, "estimator_columns"):
+            estimator_columns = model.estimator_columns()
+        else:
+            estimator_columns = [(model, column) for column in range(model.n_outputs_)]
+        exact = np.stack([brute_force_shapley(estimator_columns, row) for row in X_rows[:5]])
+        error = np.abs(attributions[:5] - exact).max()
+        passed &= check("exactness", error < TOLERANCE, f"max |attribution - brute-force Shapley| = {error:.2e}")
+
+        cached = explainer.explain(X_rows)
+        passed &= check("cache", np.array_equal(cached, attributions), "repeated rows return the cached values")
+    return passed
+
+
+if __name__ == "__main__":
+    if not test_attributions():
+        print("\n❌ Attribution checks failed")
+        sys.exit(1)
+    print("\n✅ Attributions are exact")
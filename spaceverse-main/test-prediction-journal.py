@@ -0,0 +1,149 @@
+import os
+import shutil
+import sys
+import tempfile
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "ai-service"))
+
+from prediction_journal import (HEADER_ALIGNMENT, RECORD_DTYPE, PredictionJournal, list_segments,
+                                load_training_data, read_header, read_segment)
+
+TIERS = ("cheap", "cascade", "full", "student")
+VERSIONS_A = {"random_forest_collision": "v1"}
+VERSIONS_B = {"random_forest_collision": "v2"}
+BATCH_ROWS = 20
+
+
+def check(name, passed, detail):
+    print(f"   {'✅' if passed else '❌'} {name}: {detail}")
+    return passed
+
+
+def scored_batch(start, n_rows):
+    """Features numbering the rows, outputs tagging them with their index too"""
+    features = np.zeros((n_rows, 6))
+    features[:, 0] = np.arange(start, start + n_rows)
+    features[:, 1] = 0.5
+    outputs = np.column_stack([np.arange(start, start + n_rows) / 1000, np.full(n_rows, 0.25), np.full(n_rows, 0.125)])
+    return features, outputs
+
+
+def test_round_trip(directory):
+    print("\nRecord, flush, rotate, compact and reload")
+    # Every flush rotates (segment_seconds=0); closed runs merge up to five batches per segment
+    segment_bytes = HEADER_ALIGNMENT + 5 * BATCH_ROWS * RECORD_DTYPE.itemsize
+    journal = PredictionJournal(directory, tiers=TIERS, enabled=True, flush_seconds=3600,
+                                segment_bytes=segment_bytes, segment_seconds=0, max_bytes=2 ** 30)
+    journal.set_model_versions(VERSIONS_A)
+    expected_tiers = []
+    for batch in range(12):
+        if batch == 7:
+            journal.set_model_versions(VERSIONS_B)
+        features, outputs = scored_batch(batch * BATCH_ROWS, BATCH_ROWS)
+        if batch % 2:
+            tiers = np.where(np.arange(BATCH_ROWS) % 4 == 0, "full", "cheap")
+        else:
+            tiers = "cascade"
+        journal.record(features, outputs, tiers)
+        expected_tiers.extend([tiers] * BATCH_ROWS if isinstance(tiers, str) else list(tiers))
+        journal.flush()
+    journal.close()
+    n_rows = 12 * BATCH_ROWS
+
+    passed = True
+    segments = list_segments(directory)
+    passed &= check("compaction", 1 < len(segments) < 12, f"12 flushed segments compacted into {len(segments)}")
+    mixed = []
+    for path in segments:
+        header, records = read_segment(path)
+        expected = VERSIONS_A if records["features"][0, 0] < 7 * BATCH_ROWS else VERSIONS_B
+        if header["modelVersions"] != expected or len(set(records["features"][:, 0] >= 7 * BATCH_ROWS)) > 1:
+            mixed.append(os.path.basename(path))
+        del records
+    passed &= check("one model set per segment", not mixed, f"mixed segments: {mixed or 'none'}")
+
+    X, y, timestamps = load_training_data(directory)
+    passed &= check("all rows in order", len(X) == n_rows and np.array_equal(X[:, 0], np.arange(n_rows)),
+                    f"{len(X)} of {n_rows} rows read back")
+    float32_outputs = scored_batch(0, n_rows)[1].astype(np.float32).astype(np.float64)
+    passed &= check("values", np.array_equal(y, float32_outputs) and np.all(X[:, 1] == 0.5),
+                    "features and outputs round-trip as float32")
+
+    X_full, _, _ = load_training_data(directory, tiers=["full"])
+    expected_full = np.flatnonzero(np.array(expected_tiers) == "full")
+    passed &= check("tier filter", np.array_equal(X_full[:, 0], expected_full),
+                    f"{len(X_full)} full-tier rows of {len(expected_full)}")
+    X_both, _, _ = load_training_data(directory, tiers=["full", "cascade"])
+    expected_both = np.flatnonzero(np.isin(expected_tiers, ["full", "cascade"]))
+    passed &= check("several tiers", np.array_equal(X_both[:, 0], expected_both),
+                    f"{len(X_both)} full or cascade rows of {len(expected_both)}")
+
+    X_recent, _, _ = load_training_data(directory, max_samples=50)
+    passed &= check("most recent rows", np.array_equal(X_recent[:, 0], np.arange(n_rows - 50, n_rows)),
+                    f"{len(X_recent)} newest rows kept")
+    X_since, _, _ = load_training_data(directory, since=timestamps[-1])
+    passed &= check("since", len(X_since) >= BATCH_ROWS and X_since[-1, 0] == n_rows - 1,
+                    f"{len(X_since)} rows from the last timestamp on")
+
+    # A segment cut off mid-record (a crash while appending) still reads up to its last whole record
+    last = segments[-1]
+    _, offset = read_header(last)
+    whole_records = (os.path.getsize(last) - offset) // RECORD_DTYPE.itemsize
+    with open(last, "ab") as segment:
+        segment.write(b"\0" * (RECORD_DTYPE.itemsize // 2))
+    passed &= check("partial record", len(read_segment(last)[1]) == whole_records,
+                    f"{whole_records} whole records read, trailing bytes ignored")
+
+    # An unreadable segment is skipped, not fatal
+    with open(os.path.join(directory, "journal-99999999.seg"), "wb") as foreign:
+        foreign.write(b"not a journal")
+    X_skipped, _, _ = load_training_data(directory)
+    passed &= check("unreadable segment", len(X_skipped) == n_rows, "skipped, the other segments still load")
+    return passed
+
+
+def test_size_limit(directory):
+    print("\nSize limit")
+    segment_bytes = HEADER_ALIGNMENT + BATCH_ROWS * RECORD_DTYPE.itemsize
+    max_bytes = 3 * segment_bytes
+    journal = PredictionJournal(directory, tiers=TIERS, enabled=True, flush_seconds=3600,
+                                segment_bytes=segment_bytes, segment_seconds=0, max_bytes=max_bytes)
+    for batch in range(10):
+        # A version change per batch keeps compaction from merging anything
+        journal.set_model_versions({"random_forest_collision": f"v{batch}"})
+        journal.record(*scored_batch(batch * BATCH_ROWS, BATCH_ROWS), "full")
+        journal.flush()
+    journal.close()
+
+    passed = True
+    segments = list_segments(directory)
+    closed_bytes = sum(os.path.getsize(path) for path in segments[:-1])
+    passed &= check("oldest deleted", closed_bytes <= max_bytes, f"{len(segments)} segments kept, "
+                    f"{closed_bytes} bytes besides the active one (limit {max_bytes})")
+    X, _, _ = load_training_data(directory)
+    passed &= check("newest kept", len(X) > 0 and X[-1, 0] == 10 * BATCH_ROWS - 1 and
+                    np.array_equal(X[:, 0], np.arange(10 * BATCH_ROWS - len(X), 10 * BATCH_ROWS)),
+                    f"rows {int(X[0, 0])}-{int(X[-1, 0])} remain")
+    return passed
+
+
+def test_prediction_journal():
+    print("🧪 Testing the prediction journal (ai-service/prediction_journal.py)")
+    print("=" * 50)
+    passed = True
+    for test in (test_round_trip, test_size_limit):
+        directory = tempfile.mkdtemp(prefix="journal-test-")
+        try:
+            passed &= test(directory)
+        finally:
+            shutil.rmtree(directory, ignore_errors=True)
+    return passed
+
+
+if __name__ == "__main__":
+    if not test_prediction_journal():
+        print("\n❌ Prediction journal checks failed")
+        sys.exit(1)
+    print("\n✅ Prediction journal round-trips")